@@ -1,33 +1,103 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
-import os  
+import os
 
-app = Flask(__name__)
+db = SQLAlchemy()
 
-# [CONFIG]
-app.config.from_pyfile('config.cfg')
+login_manager = LoginManager()
+login_manager.login_view = 'main.login'
 
-uri = os.getenv("DATABASE_URL") 
-if uri and uri.startswith("postgres://"):
-    uri = uri.replace("postgres://", "postgresql://", 1)
 
-app.config['SQLALCHEMY_DATABASE_URI'] = uri or 'sqlite:///ames.db'
+def create_app(config=None):
+    """
+    Build a configured app. Nothing here touches the database or loads the model:
+      - tables are created by an explicit step: flask --app app init-db
+      - the model and the comparables index load on first use, or right away
+        when PRELOAD_MODEL is set (gunicorn.conf.py preloads them in the master)
+    `config` overrides config.cfg, e.g. create_app({'TESTING': True}).
+    """
+    app = Flask(__name__)
 
-db = SQLAlchemy(app)
+    # [CONFIG]
+    app.config.from_pyfile('config.cfg')
+
+    uri = os.getenv("DATABASE_URL")
+    if uri and uri.startswith("postgres://"):
+        uri = uri.replace("postgres://", "postgresql://", 1)
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri or 'sqlite:///ames.db'
+    if config:
+        app.config.update(config)
+
+    # Pool sizing and SQLite pragmas for this database (see DB_PROFILE in config.cfg)
+    from application import dbprofile
+    profile = dbprofile.configure(app)
+    db.init_app(app)
+    with app.app_context():
+        engine = db.engine
+    dbprofile.install_pragmas(engine, profile)
+    login_manager.init_app(app)
+
+    # Per-app components. Each create_app() builds its own and keeps it in
+    # app.extensions; the module-level names (history_writer, ml, metrics...)
+    # are proxies to the one of current_app.
+
+    # Write-behind queue for History rows (see HISTORY_WRITE_MODE in config.cfg)
+    from application.writebehind import HistoryWriter
+    history_writer = HistoryWriter(app)
+
+    # Short-TTL cache of logged-in users for Flask-Login (see IDENTITY_CACHE_TTL)
+    from application.identity import IdentityCache
+    identity_cache = IdentityCache(app)
+
+    # Bounded pool for password hashing (see AUTH_POOL_WORKERS / AUTH_POOL_QUEUE)
+    from application.authpool import KDFPool
+    kdf_pool = KDFPool(app)
+
+    # Stage timers, request histograms and DB query counts for /metrics (see METRICS_ENABLED)
+    from application.metrics import Metrics
+    metrics = Metrics(app)
+    metrics.watch(engine)
+
+    # ETags / 304s, cached static pages and fingerprinted static URLs (see PAGE_CACHE_ENABLED)
+    from application.httpcache import HttpCache
+    http_cache = HttpCache(app)
+
+    # Prediction cache, model manager and comparables index, built on first use
+    from application.services import ModelServices
+    ml = ModelServices(app)
+
+    # Counters of the per-worker components, exported as gauges on /metrics
+    metrics.register_gauges('prediction_cache', ml.cache_stats)
+    metrics.register_gauges('model', ml.model_stats)
+    metrics.register_gauges('history_writer', history_writer.stats)
+    metrics.register_gauges('identity_cache', identity_cache.stats)
+    metrics.register_gauges('auth_pool', kdf_pool.stats)
+    metrics.register_gauges('http_cache', http_cache.stats)
+    metrics.register_gauges('db_pool', lambda: dbprofile.pool_stats(engine))
+
+    # ========================================================
+    from application import models  # noqa: F401  (registers the user_loader)
+    from application.routes import main
+    from application.commands import register_commands
+    app.register_blueprint(main)
+    register_commands(app)
+
+    if app.config.get('PRELOAD_MODEL'):
+        ml.preload()
+    return app
 
-login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'login'
 
-# ========================================================
-# ========================================================
-from application import routes
-from application.models import User, History
+# `from application import app` (app.py, tests, scripts): the default app,
+# created the first time someone asks for it instead of at import time.
+_default_app = None
 
-with app.app_context():
 
-    db.create_all()
-    print("-----------------------------------")
-    print("Database tables created successfully!")
-    print("-----------------------------------")
\ No newline at end of file
+def __getattr__(name):
+    if name == 'app':
+        global _default_app
+        if _default_app is None:
+            _default_app = create_app()
+        return _default_app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,405 @@
+import asyncio
+import contextvars
+import functools
+import importlib.util
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from flask import g, request, session, render_template, flash, jsonify
+from flask_login import current_user
+from sqlalchemy import insert, select
+from sqlalchemy.orm import make_transient_to_detached
+from application import db, routes, userstats
+from application.form import PredictionForm
+from application.history_query import (filtered_query, has_filters, sort_spec, keyset_plan, summary_queries,
+                                       summary_result, stored_summary)
+from application.httpcache import http_cache
+from application.identity import identity_cache, EXCLUDED_COLUMNS
+from application.metrics import metrics
+from application.models import User, History, UserStats
+from application.services import ml
+from application.writebehind import history_writer, HISTORY_COLUMNS
+
+# Sync backend -> async driver that speaks the same database
+ASYNC_DRIVERS = {'sqlite': 'sqlite+aiosqlite', 'postgresql': 'postgresql+asyncpg'}
+
+
+def async_url(url):
+    """The async-driver version of a SQLAlchemy URL, or None if the driver is not installed."""
+    backend = url.get_backend_name()
+    driver = ASYNC_DRIVERS.get(backend)
+    if driver is None or importlib.util.find_spec(driver.split('+')[1]) is None:
+        return None
+    if backend == 'sqlite' and url.database in (None, '', ':memory:'):
+        return None  # a second engine would see its own, empty in-memory database
+    return url.set(drivername=driver)
+
+
+def build_environ(scope, stream, content_length=None):
+    """WSGI environ for an ASGI http scope, reading the body from `stream`."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': stream,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name, value = name.decode('latin-1'), value.decode('latin-1')
+        if name == 'content-type':
+            environ['CONTENT_TYPE'] = value
+        elif name == 'content-length':
+            environ['CONTENT_LENGTH'] = value
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+    if content_length is not None:
+        environ['CONTENT_LENGTH'] = str(content_length)
+    elif 'CONTENT_LENGTH' not in environ:
+        environ['wsgi.input_terminated'] = True  # chunked upload: read until the stream ends
+    return environ
+
+
+class _ReceiveStream(io.RawIOBase):
+    """wsgi.input for the WSGI fallback: pulls body chunks from receive() only when the app reads."""
+
+    def __init__(self, receive, loop):
+        self._receive = receive
+        self._loop = loop
+        self._buffer = b''
+        self._more = True
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer and self._more:
+            message = asyncio.run_coroutine_threadsafe(self._receive(), self._loop).result()
+            self._buffer = message.get('body', b'')
+            self._more = message.get('more_body', False)
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body', False):
+            return b''.join(chunks)
+
+
+class AsgiApp:
+    """
+    ASGI serving mode:  uvicorn asgi:app
+
+    /predict, /api/predict and /history run natively on the event loop:
+    - the request body is read (and the response sent) asynchronously, so a
+      slow client costs a socket, not a worker thread
+    - History inserts, the user lookup and the /history queries go through an
+      async engine (aiosqlite / asyncpg) on the same database
+    - form validation, templates, flash() and the session cookie are plain
+      Flask, in a request context pushed around the handler
+    - model inference, form validation and template rendering run on the
+      ASGI_THREADS pool, off the event loop
+
+    Every other URL, and these three when no async driver is installed (or the
+    user is not logged in, so Flask-Login can redirect), is handed to the Flask
+    WSGI app on its own pool of ASGI_WSGI_THREADS, so fallback traffic (slow
+    uploads, exports) cannot starve the predictions.
+    """
+
+    def __init__(self, flask_app, threads=8, wsgi_threads=8):
+        self.flask_app = flask_app
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='asgi')
+        self.wsgi_executor = ThreadPoolExecutor(max_workers=wsgi_threads, thread_name_prefix='asgi-wsgi')
+        self.engine = None
+        self.sessions = None
+        self._started = False
+        # path -> (handler, allowed methods, login required)
+        self.routes = {
+            '/predict': (self.predict, ('GET', 'POST'), True),
+            '/api/predict': (self.api_predict, ('POST',), False),
+            '/history': (self.history, ('GET',), True),
+        }
+        self.counters = {'native': 0, 'fallback': 0}
+
+    # --- LIFECYCLE ---
+    async def startup(self):
+        if self._started:
+            return
+        self._started = True
+        if not self.flask_app.config.get('ASGI_ASYNC_DB', True):
+            return
+        with self.flask_app.app_context():
+            url = async_url(db.engine.url)
+        if url is None:
+            self.flask_app.logger.warning("ASGI mode: no async driver for %s, serving everything through WSGI",
+                                          db.engine.url.get_backend_name())
+            return
+        from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+        from application.dbprofile import engine_options, install_pragmas
+        profile = self.flask_app.extensions.get('db_profile', {})
+        self.engine = create_async_engine(url, **engine_options(profile, is_async=True))
+        install_pragmas(self.engine, profile)
+        self.flask_app.extensions['metrics'].watch(self.engine)
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+
+    async def shutdown(self):
+        if self.engine is not None:
+            await self.engine.dispose()
+        self.executor.shutdown(wait=False)
+        self.wsgi_executor.shutdown(wait=False)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await self.startup()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    # --- DISPATCH ---
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            return  # no websockets
+        await self.startup()  # servers without lifespan support
+
+        route = self.routes.get(scope['path']) if self.engine is not None else None
+        if route is not None and scope['method'] in route[1]:
+            body = await read_body(receive)
+            response = await self.native(route, build_environ(scope, io.BytesIO(body), len(body)))
+            if response is not None:
+                self.counters['native'] += 1
+                return await self.send_response(send, response)
+            # Not ours after all: replay the body we already read
+            receive = self._replay(body)
+        self.counters['fallback'] += 1
+        await self.wsgi(scope, receive, send)
+
+    @staticmethod
+    def _replay(body):
+        async def receive():
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        return receive
+
+    async def native(self, route, environ):
+        """Run a native handler in a Flask request context; None = let the WSGI app handle it."""
+        handler, _, login_required = route
+        with self.flask_app.request_context(environ):
+            try:
+                rv = self.flask_app.preprocess_request()
+                if rv is None:
+                    user_id = session.get('_user_id')
+                    if user_id is not None:
+                        user = await self.load_user(int(user_id))
+                        if user is None:
+                            return None
+                        g._login_user = user  # what Flask-Login's current_user returns
+                    elif login_required:
+                        return None
+                    rv = await handler()
+                response = self.flask_app.make_response(rv)
+                return self.flask_app.process_response(response)
+            except Exception as error:
+                return self.flask_app.handle_exception(error)
+
+    async def run_sync(self, fn, *args, **kwargs):
+        """fn(*args, **kwargs) on the thread pool, inside this request's Flask context."""
+        ctx = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, functools.partial(ctx.run, fn, *args, **kwargs))
+
+    # --- ASYNC DATABASE ---
+    async def load_user(self, user_id):
+        """The logged-in User (identity cache first, then one async SELECT), attached to db.session."""
+        columns = identity_cache.get(user_id)
+        if columns is None:
+            table = User.__table__
+            stmt = select(*[c for c in table.columns if c.key not in EXCLUDED_COLUMNS]).where(table.c.id == user_id)
+            async with self.engine.connect() as conn:
+                row = (await conn.execute(stmt)).mappings().first()
+            if row is None:
+                return None
+            columns = dict(row)
+            identity_cache.put_columns(columns)
+        user = User(**columns)
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+
+    async def insert_history(self, rows):
+        """
+        Save History rows according to HISTORY_WRITE_MODE: 'batched' hands them to the
+        write-behind queue (a list append), 'sync' commits them with one async INSERT.
+        """
+        if history_writer.mode == 'off' or not rows:
+            return 0
+        if history_writer.mode == 'batched':
+            return history_writer.enqueue(rows)
+        async with self.engine.begin() as conn:
+            await conn.execute(insert(History), rows)
+            for stmt, params in userstats.added_statements(conn.dialect.name, rows):
+                await conn.execute(stmt, params)
+        return len(rows)
+
+    # --- NATIVE HANDLERS (same behaviour as the routes.py views) ---
+    async def predict(self):
+        form = PredictionForm()
+        context = {'prediction': None, 'ranges': None, 'comparables': None}
+
+        with metrics.stage('form_validation'):
+            submitted = await self.run_sync(form.validate_on_submit)
+
+        if submitted:
+            context, entry = await self.run_sync(routes.predict_form, form)
+            if entry is not None:
+                row = {col: getattr(entry, col) for col in HISTORY_COLUMNS}
+                try:
+                    with metrics.stage('history_write'):
+                        await self.insert_history([row])
+                except Exception as error:
+                    flash(f"Database Error: {error}", "danger")
+                else:
+                    flash(f"Success! Estimated Value: ${context['prediction']}", "success")
+            else:
+                flash("Error: AI Model not loaded.", "danger")
+
+        return await self.run_sync(render_template, 'predict.html', form=form, **context)
+
+    async def api_predict(self):
+        if not request.is_json:
+            return jsonify({'error': 'Request must be JSON'}), 415
+
+        records, error = routes.read_batch(request.get_json(silent=True))
+        if error:
+            return error
+
+        predictor = await self.run_sync(ml.model_manager.get)
+        if not predictor:
+            return jsonify({'error': 'AI Model not loaded'}), 503
+
+        k = request.args.get('comparables', 0, type=int)
+        X, ok, predictions, results = await self.run_sync(routes.score_batch, predictor, records, k)
+
+        saved = 0
+        if routes.wants_save(request.args) and current_user.is_authenticated and ok.any():
+            rows = routes.history_rows(X, ok, predictions, predictor.version, current_user.id)
+            try:
+                with metrics.stage('history_write'):
+                    saved = await self.insert_history(rows)
+            except Exception:
+                saved = 0
+
+        return jsonify({
+            'count': len(records),
+            'valid': int(ok.sum()),
+            'saved': saved,
+            'results': results
+        }), 200
+
+    async def history(self):
+        if history_writer.mode == 'batched':
+            await self.run_sync(history_writer.flush, current_user.id)
+
+        # Same queries as routes.history(), executed on the async engine
+        page_size = self.flask_app.config.get('HISTORY_PAGE_SIZE', 50)
+        async with self.sessions() as s:
+            stats = userstats.totals_from_row(await s.get(UserStats, current_user.id))
+        etag = http_cache.etag_for(current_user.id, stats['count'], stats['updated_on'], page_size)
+        cached = http_cache.not_modified(etag, stats['updated_on'])
+        if cached is not None:
+            return cached
+
+        query = filtered_query(current_user.id, request.args)
+        sort_key, column, descending = sort_spec(request.args)
+        page, finish = keyset_plan(query, column, descending,
+                                   after=request.args.get('after'),
+                                   before=request.args.get('before'),
+                                   page_size=page_size)
+        totals, buckets = summary_queries(query)
+
+        with metrics.stage('history_query'):
+            async with self.sessions() as s:
+                rows = (await s.execute(page.statement)).scalars().all()
+                if has_filters(request.args):
+                    totals_row = (await s.execute(totals.statement)).one()
+                    bucket_rows = (await s.execute(buckets.statement)).all() if totals_row[0] else []
+                    summary = summary_result(totals_row, bucket_rows)
+                else:
+                    # Unfiltered: the user's stored stats
+                    bucket_rows = (await s.execute(userstats.buckets_query(current_user.id))).all()
+                    summary = stored_summary(stats, bucket_rows)
+
+        entries, next_cursor, prev_cursor = finish(rows)
+        response = self.flask_app.make_response(
+            await self.run_sync(routes.render_history, entries, summary, next_cursor, prev_cursor))
+        return http_cache.add_validators(response, etag, stats['updated_on'])
+
+    # --- RESPONSES ---
+    @staticmethod
+    async def send_response(send, response):
+        headers = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in response.headers.items()]
+        await send({'type': 'http.response.start', 'status': response.status_code, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': response.get_data()})
+
+    async def wsgi(self, scope, receive, send):
+        """Serve the request with the Flask WSGI app on its own thread pool, streaming both ways."""
+        loop = asyncio.get_running_loop()
+        stream = io.BufferedReader(_ReceiveStream(receive, loop))
+        environ = build_environ(scope, stream)
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+            return lambda data: None
+
+        iterable = await loop.run_in_executor(self.wsgi_executor, self.flask_app, environ, start_response)
+        try:
+            chunks = iter(iterable)
+            chunk = await loop.run_in_executor(self.wsgi_executor, next, chunks, None)
+            await send({'type': 'http.response.start', 'status': started['status'], 'headers': started['headers']})
+            while chunk is not None:
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                chunk = await loop.run_in_executor(self.wsgi_executor, next, chunks, None)
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(iterable, 'close'):
+                await loop.run_in_executor(self.wsgi_executor, iterable.close)
+
+    def stats(self):
+        stats = dict(self.counters)
+        stats['async_db'] = self.engine is not None
+        return stats
+
+
+def create_asgi_app(flask_app=None):
+    """AsgiApp around `flask_app` (the default app, as in app.py, if not given)."""
+    if flask_app is None:
+        from application import app as flask_app
+    asgi_app = AsgiApp(flask_app, threads=flask_app.config.get('ASGI_THREADS', 8),
+                       wsgi_threads=flask_app.config.get('ASGI_WSGI_THREADS', 8))
+    flask_app.extensions['metrics'].register_gauges('asgi', asgi_app.stats)
+    return asgi_app
@@ -0,0 +1,111 @@
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from flask import current_app
+from werkzeug.local import LocalProxy
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class PoolSaturated(Exception):
+    """Every KDF worker is busy and the waiting line is full: answer 429 right away."""
+
+
+class KDFPool:
+    """
+    Bounded executor for password hashing (scrypt/pbkdf2).
+
+    The KDFs are deliberately slow (~100 ms of CPU each). Run inline, a burst of
+    logins occupies every request thread and CPU of a worker, and cheap /predict
+    requests queue up behind them. Here at most AUTH_POOL_WORKERS hashes run at
+    once, at most AUTH_POOL_QUEUE more may wait, and anything beyond that is
+    rejected immediately instead of piling up.
+
+    hashlib releases the GIL while hashing, so threads are enough: the cap is on
+    how much CPU auth can take, not on Python concurrency.
+    AUTH_POOL_WORKERS=0 runs the KDF inline (the old behaviour).
+    """
+
+    def __init__(self, app=None):
+        self.workers = 2
+        self.queue = 8
+        self.timeout = 10.0
+        self._executor = None
+        self._slots = None
+        self._lock = threading.Lock()
+        self.counters = {'completed': 0, 'rejected': 0, 'in_flight': 0, 'wait_seconds_max': 0.0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['kdf_pool'] = self
+        self.workers = int(app.config.get('AUTH_POOL_WORKERS', 2))
+        self.queue = int(app.config.get('AUTH_POOL_QUEUE', 8))
+        self.timeout = float(app.config.get('AUTH_POOL_TIMEOUT', 10.0))
+        with self._lock:
+            old, self._executor = self._executor, None  # (re)created on first use with the new size
+        if old is not None:
+            # Hashes already running finish on the old threads, which then exit
+            old.shutdown(wait=False)
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue) if self.workers > 0 else None
+
+    def _pool(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='kdf')
+        return self._executor
+
+    def run(self, fn, *args):
+        """Run fn(*args) on the pool and wait for it; raises PoolSaturated if there is no room."""
+        slots = self._slots
+        if slots is None:
+            return fn(*args)
+        if not slots.acquire(blocking=False):
+            with self._lock:
+                self.counters['rejected'] += 1
+            raise PoolSaturated()
+
+        with self._lock:
+            self.counters['in_flight'] += 1
+        start = time.perf_counter()
+        # Release the slot of the semaphore it was taken from, even if init_app() replaced it meanwhile
+        done = functools.partial(self._done, slots)
+        try:
+            future = self._pool().submit(fn, *args)
+        except Exception:
+            done(None)
+            raise
+        # The slot is freed when the hash really finishes, even if we stop waiting for it
+        future.add_done_callback(done)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            raise PoolSaturated()
+        finally:
+            with self._lock:
+                self.counters['wait_seconds_max'] = max(self.counters['wait_seconds_max'],
+                                                        time.perf_counter() - start)
+
+    def _done(self, slots, future):
+        slots.release()
+        with self._lock:
+            self.counters['in_flight'] -= 1
+            self.counters['completed'] += 1
+
+    # --- PASSWORDS ---
+    def hash_password(self, password):
+        return self.run(generate_password_hash, password)
+
+    def check_password(self, pwhash, password):
+        return self.run(check_password_hash, pwhash, password)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        stats.update(workers=self.workers, queue=self.queue)
+        return stats
+
+
+# The current app's pool (create_app() gives every app its own)
+kdf_pool = LocalProxy(lambda: current_app.extensions['kdf_pool'])
@@ -0,0 +1,131 @@
+import numpy as np
+from wtforms.validators import NumberRange
+from application.form import PredictionForm
+
+# --- CONFIGURATION ---
+# JSON field names (same as PredictionForm), in predictor.FEATURES order
+FIELDS = ['overall_qual', 'gr_liv_area', 'garage_cars', 'total_bsmt_sf', 'year_built']
+
+
+def _form_bounds():
+    """
+    Read the min/max limits straight from PredictionForm, so the API and the
+    HTML form can never disagree on what a valid house is.
+    """
+    bounds = {}
+    for name in FIELDS:
+        unbound = getattr(PredictionForm, name)
+        lo, hi, message = None, None, None
+
+        for validator in unbound.kwargs.get('validators', []):
+            if isinstance(validator, NumberRange):
+                lo, hi, message = validator.min, validator.max, validator.message
+
+        # SelectField (garage) is limited by its choices instead
+        choices = unbound.kwargs.get('choices')
+        if choices:
+            values = [value for value, _ in choices]
+            lo, hi = min(values), max(values)
+
+        if message is None:
+            if hi is None:
+                message = f"Must be at least {lo}"
+            else:
+                message = f"Must be between {lo} and {hi}"
+        bounds[name] = (lo, hi, message)
+    return bounds
+
+FIELD_BOUNDS = _form_bounds()
+
+
+# --- HELPER FUNCTIONS ---
+def _to_number(value):
+    """Slow path for a single value. Returns NaN if it is not a number."""
+    if isinstance(value, bool) or value is None:
+        return np.nan
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.strip())
+        except ValueError:
+            return np.nan
+    return np.nan
+
+
+def _column(records, name):
+    """Pull one field out of every record as a float64 array (NaN = invalid)."""
+    values = [r.get(name) if isinstance(r, dict) else None for r in records]
+
+    # Fast path: everything is already a plain int/float (the normal case)
+    if {type(v) for v in values} <= {int, float}:
+        return np.asarray(values, dtype=np.float64)
+
+    return np.fromiter((_to_number(v) for v in values), dtype=np.float64, count=len(values))
+
+
+def validate_records(records):
+    """
+    Validate a whole batch at once.
+
+    Returns (X, ok, errors):
+      X      -> float64 array of shape (n, 5) in FEATURES order
+      ok     -> boolean mask of rows that passed every check
+      errors -> {row_index: {field: message}} for the rows that failed
+    """
+    n = len(records)
+    X = np.empty((n, len(FIELDS)), dtype=np.float64)
+    ok = np.ones(n, dtype=bool)
+    errors = {}
+
+    for j, name in enumerate(FIELDS):
+        col = _column(records, name)
+        lo, hi, message = FIELD_BOUNDS[name]
+
+        # Vectorized checks for the whole column
+        missing = np.isnan(col)
+        with np.errstate(invalid='ignore'):
+            # inf/-inf would pass the floor check and overflow int() later on
+            bad = ~missing & ~np.isfinite(col)
+            bad |= ~missing & (col != np.floor(col))
+            bad |= ~missing & (col < lo)
+            if hi is not None:
+                bad |= ~missing & (col > hi)
+
+        X[:, j] = col
+        ok &= ~(missing | bad)
+
+        # Only the failing rows are visited in Python
+        for i in np.flatnonzero(missing):
+            errors.setdefault(int(i), {})[name] = "This field is required and must be a number."
+        for i in np.flatnonzero(bad):
+            errors.setdefault(int(i), {})[name] = message
+
+    return X, ok, errors
+
+
+def score_records(predictor, records):
+    """
+    Validate and score a batch in one matrix multiply.
+    Returns a list of result dicts in the same order as the input.
+    """
+    X, ok, errors = validate_records(records)
+
+    predictions = np.full(len(records), np.nan)
+    bands = {}
+    if ok.any():
+        predictions[ok] = predictor.predict_many(X[ok])
+        # Interval bounds for the whole batch in one vectorized step per level
+        bands = {level: iter(bounds.tolist())
+                 for level, bounds in predictor.interval_many(predictions[ok]).items()}
+
+    results = []
+    for i in range(len(records)):
+        if ok[i]:
+            result = {'index': i, 'prediction': float(predictions[i])}
+            if bands:
+                result['interval'] = {level: next(rows) for level, rows in bands.items()}
+            results.append(result)
+        else:
+            results.append({'index': i, 'errors': errors[i]})
+    return X, ok, predictions, results
@@ -0,0 +1,225 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from application.predictor import Predictor
+
+# predict_many() only looks batches up to this size up in the cache: past that, one
+# matrix multiply is cheaper than a key, a locked dict lookup (and maybe a SQLite
+# round trip) per row
+MAX_CACHED_BATCH = 16
+
+
+class PredictionCache:
+    """
+    Bounded LRU cache with a TTL for model outputs.
+    Keys are (model_version, normalized 5-tuple), so a new model never
+    sees the old model's prices.
+    """
+
+    def __init__(self, maxsize=10000, ttl=3600, shared=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.shared = shared  # optional SharedCacheBackend
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'shared_hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0, 'invalidations': 0}
+
+    @staticmethod
+    def make_key(version, row):
+        # float() makes 7 and 7.0 the same key without truncating 7.5 to 7
+        return (version, tuple(float(v) for v in row))
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                expires_at, value = item
+                if expires_at > now:
+                    self._data.move_to_end(key)
+                    self.counters['hits'] += 1
+                    return value
+                del self._data[key]
+                self.counters['expired'] += 1
+
+        if self.shared is not None:
+            value = self.shared.get(key)
+            if value is not None:
+                self._store(key, value, now)
+                with self._lock:
+                    self.counters['shared_hits'] += 1
+                return value
+
+        with self._lock:
+            self.counters['misses'] += 1
+        return None
+
+    def put(self, key, value):
+        self._store(key, value, time.monotonic())
+        if self.shared is not None:
+            self.shared.put(key, value, self.ttl)
+
+    def _store(self, key, value, now):
+        with self._lock:
+            self._data[key] = (now + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.counters['evictions'] += 1
+
+    def clear(self, shared=True):
+        """
+        Drop the cached prices. shared=False empties only this worker's LRU: the
+        shared entries of other workers stay (keys carry the model version, so
+        they are never served for the wrong model), only the expired ones go.
+        """
+        with self._lock:
+            self._data.clear()
+            self.counters['invalidations'] += 1
+        if self.shared is not None:
+            if shared:
+                self.shared.clear()
+            else:
+                self.shared.purge_expired()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['size'] = len(self._data)
+        stats['maxsize'] = self.maxsize
+        lookups = stats['hits'] + stats['shared_hits'] + stats['misses']
+        stats['hit_ratio'] = (stats['hits'] + stats['shared_hits']) / lookups if lookups else 0.0
+        stats['shared'] = self.shared is not None
+        return stats
+
+
+class SharedCacheBackend:
+    """
+    Second cache level in a local SQLite file, so every gunicorn worker on the
+    same machine can reuse each other's results. WAL mode lets readers and the
+    writer run at the same time.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connect().execute(
+            'CREATE TABLE IF NOT EXISTS prediction_cache '
+            '(key TEXT PRIMARY KEY, value REAL NOT NULL, expires_at REAL NOT NULL)')
+
+    def _connect(self):
+        # One connection per thread (sqlite3 connections are not thread safe),
+        # and never reuse one inherited from the gunicorn master after fork()
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')  # it is only a cache
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _text(key):
+        version, row = key
+        return f"{version}:{','.join(map(str, row))}"
+
+    def get(self, key):
+        try:
+            row = self._connect().execute(
+                'SELECT value FROM prediction_cache WHERE key = ? AND expires_at > ?',
+                (self._text(key), time.time())).fetchone()
+        except sqlite3.Error:
+            return None  # a busy/broken cache must never break a prediction
+        return row[0] if row else None
+
+    def put(self, key, value, ttl):
+        try:
+            self._connect().execute(
+                'INSERT OR REPLACE INTO prediction_cache (key, value, expires_at) VALUES (?, ?, ?)',
+                (self._text(key), float(value), time.time() + ttl))
+        except sqlite3.Error:
+            pass
+
+    def clear(self):
+        try:
+            self._connect().execute('DELETE FROM prediction_cache')
+        except sqlite3.Error:
+            pass
+
+    def purge_expired(self):
+        try:
+            self._connect().execute('DELETE FROM prediction_cache WHERE expires_at <= ?', (time.time(),))
+        except sqlite3.Error:
+            pass
+
+
+class CachedPredictor(Predictor):
+    """
+    Predictor wrapper that checks the cache before running the model.
+    If the wrapped model's version changes (reload), this worker's cached prices are dropped.
+    """
+
+    def __init__(self, inner, cache):
+        self.inner = inner
+        self.cache = cache
+        self.features = inner.features
+        self._seen_version = getattr(inner, 'version', None)
+
+    @property
+    def version(self):
+        return getattr(self.inner, 'version', None)
+
+    @property
+    def intervals(self):
+        return getattr(self.inner, 'intervals', {})
+
+    def swap(self, inner):
+        """Point at a newly loaded model; cached prices of the old one are dropped."""
+        self.inner = inner
+        self.features = inner.features
+        self._check_version()
+
+    def _check_version(self):
+        version = self.version
+        if version != self._seen_version:
+            self.cache.clear(shared=False)
+            self._seen_version = version
+        return version
+
+    def predict_one(self, row):
+        version = self._check_version()
+        key = self.cache.make_key(version, row)
+        value = self.cache.get(key)
+        if value is None:
+            value = self.inner.predict_one(row)
+            self.cache.put(key, value)
+        return value
+
+    def predict_many(self, X):
+        version = self._check_version()
+        X = np.asarray(X, dtype=np.float64)
+        if len(X) > MAX_CACHED_BATCH:
+            return self.inner.predict_many(X)
+        out = np.empty(len(X), dtype=np.float64)
+
+        # Look every row up, then run the model ONCE on just the misses
+        keys = [self.cache.make_key(version, row) for row in X.tolist()]
+        missing = []
+        for i, key in enumerate(keys):
+            value = self.cache.get(key)
+            if value is None:
+                missing.append(i)
+            else:
+                out[i] = value
+
+        if missing:
+            values = self.inner.predict_many(X[missing])
+            out[missing] = values
+            for i, value in zip(missing, values.tolist()):
+                self.cache.put(keys[i], value)
+        return out
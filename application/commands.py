@@ -0,0 +1,131 @@
+import time
+import click
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+from sqlalchemy import inspect
+from application import db
+from application.services import ml
+from application.scoring import guess_format, score_file
+from application.migrations import upgrade_schema
+from application.models import UserStats, QualityStats
+from application.userstats import rebuild as rebuild_stats
+from application.incremental import retrain_incremental
+
+# --- CLI COMMANDS ---
+# Run with: flask --app app <command>
+
+@click.command('score')
+@click.argument('input_file', type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+@click.option('-o', '--output', default='-', help="Where to write NDJSON results ('-' = stdout).")
+@click.option('--format', 'fmt', type=click.Choice(['auto', 'ndjson', 'csv']), default='auto',
+              help="Input format. 'auto' picks CSV for *.csv files, NDJSON otherwise.")
+@click.option('--chunk-size', type=int, default=None, help="Rows scored per chunk.")
+@with_appcontext
+def score_command(input_file, output, fmt, chunk_size):
+    """Score an NDJSON or CSV file offline (same pipeline as /api/predict/stream)."""
+    predictor = ml.model_manager.get()
+    if not predictor:
+        raise click.ClickException("AI Model not loaded.")
+
+    if fmt == 'auto':
+        fmt = guess_format(input_file)
+    chunk_size = chunk_size or current_app.config.get('SCORE_CHUNK_SIZE', 1000)
+
+    start = time.perf_counter()
+    with click.open_file(input_file, 'r', encoding='utf-8') as src, \
+         click.open_file(output, 'w', encoding='utf-8') as dst:
+        total, valid = score_file(predictor, src, dst, fmt, chunk_size)
+    elapsed = time.perf_counter() - start
+
+    # Summary goes to stderr so stdout stays pure NDJSON
+    click.echo(f"Scored {total} rows ({valid} valid, {total - valid} errors) in {elapsed:.2f}s", err=True)
+
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create the tables, or add missing columns and indexes to an existing database (safe to re-run)."""
+    inspector = inspect(db.engine)
+    needs_stats = inspector.has_table('history') and not all(
+        inspector.has_table(model.__tablename__) for model in (UserStats, QualityStats))
+    changes = upgrade_schema(db)
+    if needs_stats:
+        # The stats table is new but History rows already exist: fill it from them
+        users, _ = rebuild_stats(db.session)
+        db.session.commit()
+        changes.append(f"Built prediction stats for {users} user(s)")
+    for change in changes:
+        click.echo(change)
+    click.echo("Database is up to date." if not changes else f"Applied {len(changes)} change(s).")
+
+
+@click.command('rebuild-stats')
+@click.option('--user', 'user_id', type=int, default=None, help="Only this user id.")
+@with_appcontext
+def rebuild_stats_command(user_id):
+    """Recompute the per-user prediction stats from History (fixes any drift)."""
+    start = time.perf_counter()
+    users, drifted = rebuild_stats(db.session, user_id)
+    db.session.commit()
+    elapsed = time.perf_counter() - start
+    click.echo(f"Rebuilt stats for {users} user(s) in {elapsed:.2f}s, {drifted} were out of date.")
+
+
+# --- MODEL REGISTRY ---
+models_cli = AppGroup('models', help="Manage versioned models in the model registry.")
+
+@models_cli.command('list')
+def models_list():
+    """Show every registered version (* = active)."""
+    registry = ml.model_manager.registry
+    active = registry.active_version()
+    for version in registry.versions():
+        meta = registry.metadata(version)
+        metrics = ', '.join(f"{k}={v:.4g}" if isinstance(v, float) else f"{k}={v}"
+                            for k, v in meta.get('metrics', {}).items())
+        click.echo(f"{'*' if version == active else ' '} {version}  {meta['model_type']}  {metrics}")
+
+@models_cli.command('activate')
+@click.argument('version')
+def models_activate(version):
+    """Make VERSION the one all workers serve (picked up without a restart)."""
+    try:
+        ml.model_manager.registry.activate(version)
+    except KeyError as error:
+        raise click.ClickException(str(error))
+    click.echo(f"Activated {version}")
+
+@models_cli.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False), default='housing_model.pkl')
+@click.option('--activate/--no-activate', default=True)
+def models_import(path, activate):
+    """Register an existing pickled model (e.g. housing_model.pkl) as a new version."""
+    import joblib
+    version = ml.model_manager.registry.publish(joblib.load(path), activate=activate,
+                                                extra={'imported_from': path})
+    click.echo(f"Registered {version}" + (" (active)" if activate else ""))
+
+@models_cli.command('retrain')
+@click.option('--chunk-size', type=int, default=None, help="Labelled rows read per chunk.")
+@click.option('--activate/--no-activate', default=True)
+def models_retrain(chunk_size, activate):
+    """Update the active model with the sale prices no version has learned yet."""
+    chunk_size = chunk_size or current_app.config.get('RETRAIN_CHUNK_SIZE', 5000)
+    start = time.perf_counter()
+    try:
+        version, new_rows = retrain_incremental(ml.model_manager.registry, chunk_size, activate)
+    except ValueError as error:
+        raise click.ClickException(str(error))
+    if version is None:
+        click.echo("No sale prices waiting to be learned.")
+        return
+    elapsed = time.perf_counter() - start
+    click.echo(f"Registered {version} with {new_rows} new row(s) in {elapsed:.2f}s"
+               + (" (active)" if activate else ""))
+
+
+def register_commands(app):
+    app.cli.add_command(score_command)
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(rebuild_stats_command)
+    app.cli.add_command(models_cli)
@@ -0,0 +1,118 @@
+import os
+import numpy as np
+from application.predictor import FEATURES, file_checksum
+
+# --- CONFIGURATION ---
+DATA_FILE = 'AmesHousing_Cleaned.csv'
+# Persisted next to housing_model.pkl; rebuilt when the CSV changes
+COMPARABLES_FILE = 'housing_comparables.pkl'
+DEFAULT_K = 5
+MAX_K = 50
+
+# CSV column -> key in the results (same names as the form / API)
+PAYLOAD_COLUMNS = {
+    'OverallQual': 'overall_qual',
+    'GrLivArea': 'gr_liv_area',
+    'GarageCars': 'garage_cars',
+    'TotalBsmtSF': 'total_bsmt_sf',
+    'YearBuilt': 'year_built',
+    'SalePrice': 'sale_price',
+}
+LABEL_COLUMNS = {'Neighborhood': 'neighborhood'}
+
+
+class ComparablesIndex:
+    """
+    The k most similar sold houses for a set of inputs.
+
+    Houses are compared on the 5 model features after standardizing them
+    (otherwise GrLivArea in sq ft would drown out OverallQual). The vectors
+    live in a KD-tree built once, so a lookup is O(log n) instead of a scan
+    of every house: a few microseconds per query even with millions of rows.
+    """
+
+    def __init__(self, X, payload, labels=None, features=FEATURES, checksum=None, leafsize=32):
+        from scipy.spatial import cKDTree
+
+        X = np.asarray(X, dtype=np.float64)
+        self.features = tuple(features)
+        self.mean = X.mean(axis=0)
+        self.scale = X.std(axis=0)
+        self.scale[self.scale == 0] = 1.0
+        # balanced_tree + compact_nodes: slower build, faster queries
+        self.tree = cKDTree((X - self.mean) / self.scale, leafsize=leafsize,
+                            balanced_tree=True, compact_nodes=True)
+        self.payload = {key: np.asarray(values) for key, values in payload.items()}
+        self.labels = {key: np.asarray(values, dtype=object) for key, values in (labels or {}).items()}
+        self.checksum = checksum
+
+    def __len__(self):
+        return self.tree.n
+
+    @classmethod
+    def from_csv(cls, path=DATA_FILE):
+        import pandas as pd
+        df = pd.read_csv(path, usecols=list({*FEATURES, *PAYLOAD_COLUMNS, *LABEL_COLUMNS}))
+        df = df.dropna(subset=FEATURES + ['SalePrice'])
+        return cls(df[FEATURES].to_numpy(dtype=np.float64),
+                   {key: df[column].to_numpy(dtype=np.int64) for column, key in PAYLOAD_COLUMNS.items()},
+                   {key: df[column].fillna('').to_numpy() for column, key in LABEL_COLUMNS.items()},
+                   checksum=file_checksum(path))
+
+    def query(self, X, k=DEFAULT_K):
+        """Vectorized lookup for a 2D array of inputs. Returns (distances, row indices), both (n, k)."""
+        X = np.asarray(X, dtype=np.float64)
+        k = max(1, min(int(k), MAX_K, len(self)))
+        distances, rows = self.tree.query((X - self.mean) / self.scale, k=k)
+        return distances.reshape(len(X), k), rows.reshape(len(X), k)
+
+    def lookup_many(self, X, k=DEFAULT_K):
+        """A list of comparables (list of dicts, closest first) per input row."""
+        distances, rows = self.query(X, k)
+        out = []
+        for dist_row, index_row in zip(distances.tolist(), rows.tolist()):
+            houses = []
+            for distance, i in zip(dist_row, index_row):
+                house = {key: values[i].item() for key, values in self.payload.items()}
+                house.update({key: values[i] for key, values in self.labels.items()})
+                house['distance'] = round(distance, 4)
+                houses.append(house)
+            out.append(houses)
+        return out
+
+    def lookup(self, row, k=DEFAULT_K):
+        return self.lookup_many([row], k)[0]
+
+    def save(self, path=COMPARABLES_FILE):
+        # Written next to the target and renamed, so a reader never sees half a file
+        import joblib
+        tmp = f"{path}.tmp-{os.getpid()}"
+        joblib.dump(self, tmp)
+        os.replace(tmp, path)
+
+
+def load_comparables(path=COMPARABLES_FILE, data_file=DATA_FILE, save=True):
+    """
+    The persisted index, or a freshly built one if it is missing or the CSV changed
+    since it was built (saved for next time when `save` is set). None if there is no data.
+    """
+    import joblib
+    if not os.path.exists(data_file):
+        return joblib.load(path) if os.path.exists(path) else None
+
+    checksum = file_checksum(data_file)
+    if os.path.exists(path):
+        try:
+            index = joblib.load(path)
+            if index.checksum == checksum:
+                return index
+        except Exception:
+            pass  # unreadable/old format: rebuild it
+
+    index = ComparablesIndex.from_csv(data_file)
+    if save:
+        try:
+            index.save(path)
+        except OSError:
+            pass  # read-only deploy: just keep it in memory
+    return index
@@ -0,0 +1,124 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+# --- PROFILES ---
+# none           -> SQLAlchemy defaults, no pragmas (original behaviour)
+# sqlite-wal     -> WAL journal: readers never block the writer and a commit appends to
+#                   the log instead of rewriting pages; synchronous=NORMAL syncs at
+#                   checkpoints only (a power cut can lose the last commits, never corrupt)
+# sqlite-durable -> WAL, but synchronous=FULL: every commit is synced to disk
+# postgres       -> a sized, pre-pinged, recycled pool and a server-side statement timeout;
+#                   the ASGI app (asyncpg) also keeps prepared statements per connection.
+#                   psycopg2 has no prepared statements, so the sync app only gets the rest
+# auto           -> sqlite-wal for SQLite, postgres for PostgreSQL, none for anything else
+PROFILES = {
+    'none': {},
+    'sqlite-wal': {
+        'backend': 'sqlite',
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout_ms': 5000,
+        'mmap_size': 256 * 1024 * 1024,
+    },
+    'sqlite-durable': {
+        'backend': 'sqlite',
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+        'busy_timeout_ms': 5000,
+        'mmap_size': 256 * 1024 * 1024,
+    },
+    'postgres': {
+        'backend': 'postgresql',
+        'pool_size': 10,
+        'max_overflow': 20,
+        'pool_recycle': 1800,
+        'pool_timeout': 10,
+        'pool_pre_ping': True,
+        'statement_timeout_ms': 30000,
+        'statement_cache_size': 500,  # asyncpg only
+    },
+}
+AUTO = {'sqlite': 'sqlite-wal', 'postgresql': 'postgres'}
+
+SQLITE_PRAGMAS = (('journal_mode', 'journal_mode'), ('synchronous', 'synchronous'),
+                  ('busy_timeout_ms', 'busy_timeout'), ('mmap_size', 'mmap_size'))
+POOL_OPTIONS = ('pool_size', 'max_overflow', 'pool_recycle', 'pool_timeout', 'pool_pre_ping')
+
+
+def resolve(name, url, overrides=None):
+    """
+    (profile name, settings) for DB_PROFILE `name` on database `url`.
+    `overrides` (DB_PROFILE_OVERRIDES) replaces single settings of the chosen profile.
+    """
+    backend = make_url(url).get_backend_name()
+    if name == 'auto':
+        name = AUTO.get(backend, 'none')
+    if name not in PROFILES:
+        raise ValueError(f"DB_PROFILE must be 'auto' or one of {tuple(PROFILES)}, got {name!r}")
+    settings = dict(PROFILES[name], **(overrides or {}))
+    if settings.get('backend', backend) != backend:
+        raise ValueError(f"DB_PROFILE {name!r} is for {settings['backend']}, the database is {backend}")
+    return name, settings
+
+
+def engine_options(settings, is_async=False):
+    """create_engine() keyword arguments for a profile (pool sizing, driver connect_args)."""
+    options = {key: settings[key] for key in POOL_OPTIONS if key in settings}
+    if settings.get('backend') != 'postgresql':
+        return options
+
+    connect_args = {}
+    timeout = settings.get('statement_timeout_ms')
+    cache_size = settings.get('statement_cache_size')
+    if is_async:
+        # asyncpg prepares every statement; keep the prepared ones per connection
+        if timeout:
+            connect_args['server_settings'] = {'statement_timeout': str(timeout)}
+        if cache_size:
+            connect_args['prepared_statement_cache_size'] = cache_size
+    elif timeout:
+        connect_args['options'] = f'-c statement_timeout={timeout}'
+    if connect_args:
+        options['connect_args'] = connect_args
+    return options
+
+
+def install_pragmas(engine, settings):
+    """Run the profile's PRAGMAs on every new SQLite connection of `engine` (sync or async)."""
+    pragmas = [(pragma, settings[key]) for key, pragma in SQLITE_PRAGMAS if settings.get(key) is not None]
+    if not pragmas or engine.dialect.name != 'sqlite':
+        return
+    sync_engine = getattr(engine, 'sync_engine', engine)
+
+    @event.listens_for(sync_engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma, value in pragmas:
+            cursor.execute(f'PRAGMA {pragma}={value}')
+        cursor.close()
+
+
+def configure(app):
+    """
+    Apply DB_PROFILE before db.init_app(): merges the pool options into
+    SQLALCHEMY_ENGINE_OPTIONS (explicit options there win) and returns the settings
+    for install_pragmas() once the engine exists.
+    """
+    name, settings = resolve(app.config.get('DB_PROFILE', 'auto'), app.config['SQLALCHEMY_DATABASE_URI'],
+                             app.config.get('DB_PROFILE_OVERRIDES'))
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dict(engine_options(settings),
+                                                   **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    app.config['DB_PROFILE_ACTIVE'] = name
+    app.extensions['db_profile'] = settings
+    return settings
+
+
+def pool_stats(engine):
+    """Connections of the engine's pool, for /metrics (empty for pools that do not count)."""
+    pool = engine.pool
+    stats = {}
+    for name in ('size', 'checkedout', 'checkedin', 'overflow'):
+        counter = getattr(pool, name, None)
+        if callable(counter):
+            stats[name] = counter()
+    return stats
@@ -0,0 +1,111 @@
+import csv
+import io
+import json
+from application.models import History
+
+# --- CONFIGURATION ---
+# Rows fetched from the database per round trip (and written per output chunk)
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_COLUMNS = ['id', 'predicted_on', 'overall_qual', 'gr_liv_area', 'garage_cars',
+                  'total_bsmt_sf', 'year_built', 'prediction']
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'jsonl'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def iter_row_batches(query, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Stream plain tuples (no ORM objects) for an already filtered + sorted query.
+    yield_per() uses a server-side cursor where the driver has one (psycopg2),
+    so only `batch_size` rows are ever in memory.
+    """
+    columns = [getattr(History, name) for name in EXPORT_COLUMNS]
+    rows = query.with_entities(*columns).yield_per(batch_size)
+
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# --- WRITERS ---
+# Each writer turns batches of rows into chunks of bytes for a streamed response.
+def iter_csv(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for batch in batches:
+        for row in batch:
+            writer.writerow((row[0], row[1].isoformat(sep=' '), *row[2:]))
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    # Header only (no rows at all)
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def iter_ndjson(batches):
+    for batch in batches:
+        lines = []
+        for row in batch:
+            record = dict(zip(EXPORT_COLUMNS, row))
+            record['predicted_on'] = record['predicted_on'].isoformat()
+            lines.append(json.dumps(record))
+        yield ('\n'.join(lines) + '\n').encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """File-like object that just collects whatever pyarrow writes, so we can stream it out."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data, self.chunks = b''.join(self.chunks), []
+        return data
+
+
+def iter_parquet(batches):
+    """One Parquet row group per batch (pyarrow is imported here, on the first Parquet export)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ('id', pa.int64()), ('predicted_on', pa.timestamp('us')),
+        ('overall_qual', pa.int32()), ('gr_liv_area', pa.int32()), ('garage_cars', pa.int32()),
+        ('total_bsmt_sf', pa.int32()), ('year_built', pa.int32()), ('prediction', pa.float64()),
+    ])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    for batch in batches:
+        columns = list(zip(*batch))
+        writer.write_table(pa.Table.from_arrays(
+            [pa.array(col, type=field.type) for col, field in zip(columns, schema)], schema=schema))
+        data = sink.drain()
+        if data:
+            yield data
+    writer.close()
+    yield sink.drain()
+
+
+WRITERS = {
+    'csv': iter_csv,
+    'ndjson': iter_ndjson,
+    'parquet': iter_parquet,
+}
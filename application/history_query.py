@@ -0,0 +1,214 @@
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import func, tuple_
+from application.models import History
+
+# --- CONFIGURATION ---
+DEFAULT_PAGE_SIZE = 50
+
+# URL filter params -> History columns
+FILTERS = {
+    'quality': 'overall_qual',
+    'area': 'gr_liv_area',
+    'garage': 'garage_cars',
+    'basement': 'total_bsmt_sf',
+    'year': 'year_built'
+}
+
+# Range filters: <param>_min / <param>_max, e.g. ?year_min=1990&year_max=2000&price_max=200000
+RANGE_FILTERS = dict(FILTERS, price='prediction')
+
+# URL sort keys -> History columns
+# Every one of these has a matching (user_id, column, id) index on History.
+SORT_MAP = {
+    'date': History.predicted_on,
+    'quality': History.overall_qual,
+    'area': History.gr_liv_area,
+    'garage': History.garage_cars,
+    'basement': History.total_bsmt_sf,
+    'year': History.year_built,
+    'price': History.prediction
+}
+DEFAULT_SORT = 'date'
+
+
+# --- QUERY BUILDING ---
+def filtered_query(user_id, args):
+    """Base query for one user's History with the URL filters applied."""
+    query = History.query.filter(History.user_id == user_id)
+
+    for url_param, db_column in FILTERS.items():
+        value = args.get(url_param)
+        if value and value.isdigit():
+            # Exact match filter (e.g. WHERE overall_qual = 5)
+            query = query.filter(getattr(History, db_column) == int(value))
+
+    for url_param, db_column in RANGE_FILTERS.items():
+        column = getattr(History, db_column)
+        low = _number(args.get(f'{url_param}_min'))
+        high = _number(args.get(f'{url_param}_max'))
+        # (user_id, column, id) index turns these into one index range scan
+        if low is not None:
+            query = query.filter(column >= low)
+        if high is not None:
+            query = query.filter(column <= high)
+
+    return query
+
+
+def has_filters(args):
+    """True if filtered_query() would narrow the rows down for these URL args."""
+    return (any((args.get(param) or '').isdigit() for param in FILTERS)
+            or any(_number(args.get(f'{param}_{end}')) is not None
+                   for param in RANGE_FILTERS for end in ('min', 'max')))
+
+
+def _number(value):
+    """Parse a range bound from the URL ('' or junk -> None)."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def sort_spec(args):
+    """Return (sort_key, column, descending) from the URL, defaulting to newest first."""
+    sort_key = args.get('sort', DEFAULT_SORT)
+    if sort_key not in SORT_MAP:
+        sort_key = DEFAULT_SORT
+    descending = args.get('order', 'desc') != 'asc'
+    return sort_key, SORT_MAP[sort_key], descending
+
+
+def apply_sort(query, column, descending):
+    # History.id breaks ties so the order is total (needed for keyset paging)
+    if descending:
+        return query.order_by(column.desc(), History.id.desc())
+    return query.order_by(column.asc(), History.id.asc())
+
+
+# --- KEYSET (CURSOR) PAGINATION ---
+# A cursor is the (sort value, id) of the last row seen. The next page is simply
+# "rows after that pair" in index order, so every page costs the same no matter
+# how deep the user has scrolled (no OFFSET scanning).
+def encode_cursor(column, row):
+    value = getattr(row, column.key)
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, row.id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(column, token):
+    """Return (value, id) or None if the token is missing/garbled (or crafted: wrong value types)."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        value, row_id = json.loads(raw)
+        if column.key == 'predicted_on':
+            if not isinstance(value, str):
+                return None
+            value = datetime.fromisoformat(value)
+        elif isinstance(value, bool) or not isinstance(value, (int, float)):
+            return None
+        return value, int(row_id)
+    except (ValueError, TypeError):
+        return None
+
+
+def keyset_plan(query, column, descending, after=None, before=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    The query for one page, plus finish(rows) -> (rows, next_cursor, prev_cursor).
+    Split in two so the ASGI mode can run the same query on its async engine.
+    """
+    after = decode_cursor(column, after)
+    before = decode_cursor(column, before)
+    key = tuple_(column, History.id)
+
+    if before is not None:
+        # Walk backwards: flip the comparison and the order, then flip the rows back
+        query = query.filter(key > before if descending else key < before)
+
+        def finish(rows):
+            has_prev = len(rows) > page_size
+            rows = rows[:page_size][::-1]
+            prev_cursor = encode_cursor(column, rows[0]) if rows and has_prev else None
+            next_cursor = encode_cursor(column, rows[-1]) if rows else None
+            return rows, next_cursor, prev_cursor
+
+        return apply_sort(query, column, not descending).limit(page_size + 1), finish
+
+    if after is not None:
+        query = query.filter(key < after if descending else key > after)
+
+    def finish(rows):
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(column, rows[-1]) if rows and has_next else None
+        prev_cursor = encode_cursor(column, rows[0]) if rows and after is not None else None
+        return rows, next_cursor, prev_cursor
+
+    return apply_sort(query, column, descending).limit(page_size + 1), finish
+
+
+def keyset_page(query, column, descending, after=None, before=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Fetch one page. `after`/`before` are cursors from a previous page.
+    Returns (rows, next_cursor, prev_cursor); a cursor is None when there is no such page.
+    """
+    query, finish = keyset_plan(query, column, descending, after, before, page_size)
+    return finish(query.all())
+
+
+# --- AGGREGATES ---
+def summary_queries(query):
+    """(totals query, per-quality query) for summarize()."""
+    base = query.order_by(None)
+
+    totals = base.with_entities(
+        func.count(), func.avg(History.prediction), func.min(History.prediction), func.max(History.prediction)
+    )
+
+    buckets = base.with_entities(
+        History.overall_qual, func.count(), func.avg(History.prediction),
+        func.min(History.prediction), func.max(History.prediction)
+    ).group_by(History.overall_qual).order_by(History.overall_qual)
+
+    return totals, buckets
+
+
+def summary_result(totals, buckets):
+    count, mean, low, high = totals
+    return {
+        'count': count,
+        'mean': mean,
+        'min': low,
+        'max': high,
+        'by_quality': [
+            {'quality': qual, 'count': n, 'mean': avg, 'min': lo, 'max': hi}
+            for qual, n, avg, lo, hi in buckets
+        ]
+    }
+
+
+def summarize(query):
+    """
+    Totals for the filtered rows, computed by the database in two queries
+    (never by loading rows into Python):
+      count / mean / min / max price, and the same per overall_qual bucket.
+    """
+    totals, buckets = summary_queries(query)
+    return summary_result(totals.one(), buckets.all())
+
+
+def stored_summary(stored_totals, buckets):
+    """
+    summarize() for an unfiltered query, from the user's stored stats instead of
+    History: userstats.user_totals() and userstats.user_buckets() rows.
+    """
+    totals = tuple(stored_totals[key] for key in ('count', 'mean', 'min', 'max'))
+    return summary_result(totals, buckets if totals[0] else [])
@@ -0,0 +1,183 @@
+import hashlib
+import os
+import threading
+from flask import current_app, request, session, render_template
+from werkzeug.http import is_resource_modified
+from werkzeug.local import LocalProxy
+
+# A year: fingerprinted static URLs change whenever the file does, so they never go stale
+STATIC_MAX_AGE = 365 * 24 * 3600
+
+
+def fingerprint(*parts):
+    """Short, stable hash of some values (ETags, cache keys, static file versions)."""
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:16]
+
+
+class HttpCache:
+    """
+    HTTP caching for repeat visits, per worker:
+
+    - static files: url_for('static', ...) adds ?v=<hash of the file>, and
+      those URLs are served with a year-long, immutable Cache-Control
+    - static pages (index): the rendered HTML is kept per template version
+      and variant, and answered with an ETag (304 when the browser has it)
+    - /history: etag_for() + not_modified() turn the user's stored stats
+      (user_stats) into an ETag + Last-Modified before any query runs, so an
+      unchanged page costs one primary-key lookup and a 304
+
+    Nothing is cached or compared while flash messages are waiting: they are
+    part of the page and must be shown exactly once.
+    PAGE_CACHE_ENABLED=False turns all of it off.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self.static_max_age = STATIC_MAX_AGE
+        self.app = None
+        self._pages = {}         # (template, variant, templates version) -> html
+        self._static = {}        # filename -> (mtime, hash)
+        self._templates = None   # (stat tuple, version)
+        self._lock = threading.Lock()
+        self.counters = {'page_hits': 0, 'page_misses': 0, 'not_modified': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['http_cache'] = self
+        self.enabled = app.config.get('PAGE_CACHE_ENABLED', True)
+        self.static_max_age = int(app.config.get('STATIC_MAX_AGE', STATIC_MAX_AGE))
+        self._pages.clear()
+        self._static.clear()
+        self._templates = None
+        if self.enabled:
+            app.url_defaults(self._static_version)
+            app.after_request(self._static_headers)
+
+    # --- STATIC FILES ---
+    def static_version(self, filename):
+        """Hash of a file in the static folder (re-hashed only when its mtime changes)."""
+        path = os.path.join(self.app.static_folder, filename)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        cached = self._static.get(filename)
+        if cached is None or cached[0] != mtime:
+            with open(path, 'rb') as f:
+                cached = (mtime, hashlib.sha1(f.read()).hexdigest()[:12])
+            self._static[filename] = cached
+        return cached[1]
+
+    def _static_version(self, endpoint, values):
+        if endpoint == 'static' and 'filename' in values and 'v' not in values:
+            version = self.static_version(values['filename'])
+            if version:
+                values['v'] = version
+
+    def _static_headers(self, response):
+        if request.endpoint != 'static' or response.status_code != 200:
+            return response
+        version = request.args.get('v')
+        if version and version == self.static_version(request.view_args.get('filename', '')):
+            response.cache_control.public = True
+            response.cache_control.max_age = self.static_max_age
+            response.cache_control.immutable = True
+        return response
+
+    # --- RENDERED PAGES ---
+    def templates_version(self):
+        """Changes whenever a template file does (checked per call only when templates auto-reload)."""
+        if self._templates is not None and not self.app.jinja_env.auto_reload:
+            return self._templates[1]
+        folder = os.path.join(self.app.root_path, self.app.template_folder)
+        stats = []
+        for root, _, files in os.walk(folder):
+            for name in sorted(files):
+                st = os.stat(os.path.join(root, name))
+                stats.append((os.path.relpath(os.path.join(root, name), folder), st.st_mtime_ns, st.st_size))
+        stats = tuple(sorted(stats))
+        if self._templates is None or self._templates[0] != stats:
+            self._templates = (stats, fingerprint(stats))
+        return self._templates[1]
+
+    @staticmethod
+    def flashes_pending():
+        return bool(session.get('_flashes'))
+
+    def render(self, template, variant=(), **context):
+        """
+        render_template() for a page that only depends on `template` and `variant`
+        (whatever the template reads from the session/user). Returns a response
+        with an ETag, 304 if the browser already has this version.
+        """
+        if not self.enabled or self.flashes_pending():
+            return self.app.make_response(render_template(template, **context))
+
+        key = (template, variant, self.templates_version())
+        html = self._pages.get(key)
+        if html is None:
+            html = render_template(template, **context)
+            with self._lock:
+                self._pages[key] = html
+                self.counters['page_misses'] += 1
+        else:
+            with self._lock:
+                self.counters['page_hits'] += 1
+        response = self.app.make_response(html)
+        response.set_etag(fingerprint(*key))
+        response.cache_control.no_cache = True
+        response.vary.add('Cookie')
+        response.make_conditional(request)
+        if response.status_code == 304:
+            with self._lock:
+                self.counters['not_modified'] += 1
+        return response
+
+    # --- CONDITIONAL GET ---
+    def etag_for(self, *parts):
+        """
+        ETag for a private page built from `parts` (plus the current templates), or
+        None when it must not be cached: caching is off or flash messages are waiting.
+        Call it before rendering (rendering consumes the flashes).
+        """
+        if not self.enabled or self.flashes_pending():
+            return None
+        return fingerprint(self.templates_version(), *parts)
+
+    def not_modified(self, etag, last_modified=None):
+        """
+        A 304 response if the browser already has this version of the page, else None.
+        Only the ETag decides: Last-Modified has 1 s resolution, two changes within
+        the same second would look unchanged to If-Modified-Since.
+        """
+        if etag is None or request.method != 'GET':
+            return None
+        if is_resource_modified(request.environ, etag=etag):
+            return None
+        with self._lock:
+            self.counters['not_modified'] += 1
+        return self.add_validators(self.app.response_class(status=304), etag, last_modified)
+
+    def add_validators(self, response, etag, last_modified=None):
+        """Let the browser revalidate the page with If-None-Match / If-Modified-Since."""
+        if etag is None or response.status_code not in (200, 304):
+            return response
+        response.set_etag(etag)
+        if last_modified is not None:
+            response.last_modified = last_modified
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        response.vary.add('Cookie')
+        return response
+
+    # --- STATS ---
+    def stats(self):
+        stats = dict(self.counters)
+        stats['pages'] = len(self._pages)
+        return stats
+
+
+# The current app's cache (create_app() gives every app its own)
+http_cache = LocalProxy(lambda: current_app.extensions['http_cache'])
@@ -0,0 +1,117 @@
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+from werkzeug.local import LocalProxy
+
+# Never kept in memory: loaded from the database only if something reads it
+# (login/register query the user themselves, account() only ever overwrites it)
+EXCLUDED_COLUMNS = ('password',)
+
+
+class IdentityCache:
+    """
+    Short-TTL cache of the logged-in user's row, so Flask-Login's user_loader
+    does not run a SELECT on every authenticated request.
+
+    Only plain column values are cached (never ORM objects, which belong to one
+    session/thread). On a hit the User is rebuilt and attached to the request's
+    session without touching the database, so routes can still modify or delete
+    current_user as usual.
+
+    Each worker process has its own cache: account() and delete_account()
+    invalidate it in the worker that handled them, and the TTL bounds how long
+    any other worker can serve the old row.
+    """
+
+    def __init__(self, app=None):
+        self.ttl = 10.0
+        self.maxsize = 10000
+        self._data = OrderedDict()  # user id -> (expires_at, {column: value})
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'expired': 0, 'invalidations': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['identity_cache'] = self
+        self.ttl = float(app.config.get('IDENTITY_CACHE_TTL', 10.0))
+        self.maxsize = int(app.config.get('IDENTITY_CACHE_SIZE', 10000))
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def load(self, session, model, user_id):
+        """The user with this id, attached to `session`: from the cache, else db.session.get()."""
+        if self.enabled:
+            columns = self._get(user_id)
+            if columns is not None:
+                instance = model(**columns)
+                # Mark it as an already-persisted row, then hand it to the session
+                # without a SELECT (merge(load=False) trusts the given state)
+                make_transient_to_detached(instance)
+                return session.merge(instance, load=False)
+
+        instance = session.get(model, user_id)
+        if instance is not None:
+            self.put(instance)
+        return instance
+
+    def _get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(user_id)
+            if item is not None:
+                expires_at, columns = item
+                if expires_at > now:
+                    self._data.move_to_end(user_id)
+                    self.counters['hits'] += 1
+                    return columns
+                del self._data[user_id]
+                self.counters['expired'] += 1
+            self.counters['misses'] += 1
+        return None
+
+    def get(self, user_id):
+        """Cached column values of one user, or None (used by the ASGI mode's async loader)."""
+        return self._get(user_id) if self.enabled else None
+
+    def put(self, instance):
+        if not self.enabled:
+            return
+        mapper = inspect(instance).mapper
+        self.put_columns({attr.key: getattr(instance, attr.key) for attr in mapper.column_attrs
+                          if attr.key not in EXCLUDED_COLUMNS})
+
+    def put_columns(self, columns):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._data[columns['id']] = (time.monotonic() + self.ttl, columns)
+            self._data.move_to_end(columns['id'])
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard(self, user_id):
+        """Forget one user (after their row was changed or deleted)."""
+        with self._lock:
+            if self._data.pop(user_id, None) is not None:
+                self.counters['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['size'] = len(self._data)
+        stats['ttl'] = self.ttl
+        return stats
+
+
+# The current app's cache (create_app() gives every app its own)
+identity_cache = LocalProxy(lambda: current_app.extensions['identity_cache'])
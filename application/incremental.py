@@ -0,0 +1,169 @@
+import numpy as np
+from application import db
+from application.models import History
+from application.predictor import FEATURES, normal_intervals
+
+# --- CONFIGURATION ---
+RETRAIN_CHUNK_SIZE = 5000
+STATS_ARTIFACT = 'stats'
+
+# History columns in FEATURES order
+FEATURE_COLUMNS = ['overall_qual', 'gr_liv_area', 'garage_cars', 'total_bsmt_sf', 'year_built']
+
+
+class SufficientStats:
+    """
+    Everything ordinary least squares needs, in O(features^2) memory:
+    the row count, the means and the centered X^T X, X^T y and y^T y.
+
+    Centering (instead of raw X^T X) keeps the numbers small, so the solve stays
+    accurate even with columns like YearBuilt ~ 2000. Chunks are merged with the
+    parallel-variance formula, so adding k rows costs O(k) no matter how many
+    rows the model has already seen.
+    """
+
+    def __init__(self, n_features=len(FEATURES)):
+        self.n = 0
+        self.mean_x = np.zeros(n_features)
+        self.mean_y = 0.0
+        self.sxx = np.zeros((n_features, n_features))
+        self.sxy = np.zeros(n_features)
+        self.syy = 0.0
+
+    def update(self, X, y):
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64).reshape(-1)
+        k = len(y)
+        if k == 0:
+            return self
+
+        mean_x, mean_y = X.mean(axis=0), y.mean()
+        Xc, yc = X - mean_x, y - mean_y
+        n = self.n + k
+        dx, dy = mean_x - self.mean_x, mean_y - self.mean_y
+        weight = self.n * k / n
+
+        self.sxx += Xc.T @ Xc + weight * np.outer(dx, dx)
+        self.sxy += Xc.T @ yc + weight * dx * dy
+        self.syy += float(yc @ yc) + weight * dy * dy
+        self.mean_x += dx * k / n
+        self.mean_y += dy * k / n
+        self.n = n
+        return self
+
+    def solve(self):
+        """(coef, intercept) of the least-squares fit with an intercept, like LinearRegression."""
+        coef = np.linalg.lstsq(self.sxx, self.sxy, rcond=None)[0]
+        return coef, float(self.mean_y - self.mean_x @ coef)
+
+    def metrics(self, coef):
+        """In-sample RMSE and R2 of `coef`, without going back to the rows."""
+        sse = max(self.syy - 2 * coef @ self.sxy + coef @ self.sxx @ coef, 0.0)
+        return {'rmse': float(np.sqrt(sse / self.n)) if self.n else 0.0,
+                'r2': float(1 - sse / self.syy) if self.syy else 0.0,
+                'n_train': int(self.n)}
+
+    # --- STORAGE (saved as a registry artifact next to the model) ---
+    def to_arrays(self):
+        return {'n': np.array(self.n), 'mean_x': self.mean_x, 'mean_y': np.array(self.mean_y),
+                'sxx': self.sxx, 'sxy': self.sxy, 'syy': np.array(self.syy)}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        stats = cls(len(arrays['mean_x']))
+        stats.n = int(arrays['n'])
+        stats.mean_x = np.array(arrays['mean_x'], dtype=np.float64)
+        stats.mean_y = float(arrays['mean_y'])
+        stats.sxx = np.array(arrays['sxx'], dtype=np.float64)
+        stats.sxy = np.array(arrays['sxy'], dtype=np.float64)
+        stats.syy = float(arrays['syy'])
+        return stats
+
+
+def linear_model(coef, intercept, features=FEATURES):
+    """A fitted sklearn LinearRegression with the given weights (so it can be published as usual)."""
+    from sklearn.linear_model import LinearRegression
+    model = LinearRegression()
+    model.coef_ = np.asarray(coef, dtype=np.float64)
+    model.intercept_ = float(intercept)
+    model.n_features_in_ = len(features)
+    model.feature_names_in_ = np.asarray(features, dtype=object)
+    return model
+
+
+# --- INGESTION ---
+def labelled_chunks(chunk_size=RETRAIN_CHUNK_SIZE):
+    """
+    Yield (X, y, ids) for the History rows whose sale price no model has learned yet.
+    Each chunk is its own keyset query on id, so only one chunk is in memory at a time.
+
+    A recorded_on watermark would miss a sale whose transaction commits after a
+    retrain has read past its timestamp; the sale_learned flag cannot.
+    """
+    columns = [getattr(History, name) for name in FEATURE_COLUMNS]
+    base = (History.query
+            .with_entities(History.id, *columns, History.sale_price)
+            .filter(History.sale_learned.is_(False))
+            .order_by(History.id))
+
+    after = None
+    while True:
+        query = base.filter(History.id > after) if after is not None else base
+        rows = query.limit(chunk_size).all()
+        if not rows:
+            return
+        data = np.array([row[1:] for row in rows], dtype=np.float64)
+        ids = [row[0] for row in rows]
+        after = ids[-1]
+        yield data[:, :-1], data[:, -1], ids
+        if len(rows) < chunk_size:
+            return
+
+
+def mark_learned(ids, chunk_size=RETRAIN_CHUNK_SIZE):
+    """Flag History rows as learned (in the current transaction; the caller commits)."""
+    for i in range(0, len(ids), chunk_size):
+        (db.session.query(History).filter(History.id.in_(ids[i:i + chunk_size]))
+         .update({History.sale_learned: True}, synchronize_session=False))
+
+
+def retrain_incremental(registry, chunk_size=RETRAIN_CHUNK_SIZE, activate=True):
+    """
+    Update the active linear model with the sale prices no version has learned yet.
+
+    Starts from the X^T X / X^T y statistics saved with the active version, folds
+    in the new labelled History rows chunk by chunk and publishes the result as a
+    new version. Returns (version, new_rows); version is None if nothing was new.
+    """
+    active = registry.active_version()
+    if active is None:
+        raise ValueError("No active model version to update")
+    meta = registry.metadata(active)
+    if meta['features'] != FEATURES:
+        raise ValueError(f"Active model uses features {meta['features']}, expected {FEATURES}")
+
+    if STATS_ARTIFACT not in meta.get('artifacts', {}):
+        raise ValueError(f"Model {active} has no saved training statistics; retrain it with model.py first")
+    stats = SufficientStats.from_arrays(registry.load_artifact(active, STATS_ARTIFACT))
+
+    learned = []
+    for X, y, ids in labelled_chunks(chunk_size):
+        stats.update(X, y)
+        learned.extend(ids)
+    if not learned:
+        return None, 0
+
+    coef, intercept = stats.solve()
+    metrics = stats.metrics(coef)
+    # No held-out rows here, so the intervals come from the in-sample error size
+    version = registry.publish(
+        linear_model(coef, intercept), metrics=metrics, features=FEATURES, activate=False,
+        artifacts={STATS_ARTIFACT: stats.to_arrays()},
+        extra={'incremental': {'base_version': active, 'new_rows': len(learned)},
+               'intervals': normal_intervals(metrics['rmse'])})
+    # Only serve the new version once its rows are flagged, so none is ever learned twice
+    mark_learned(learned, chunk_size)
+    db.session.commit()
+    if activate:
+        registry.activate(version)
+    return version, len(learned)
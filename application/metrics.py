@@ -0,0 +1,233 @@
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from flask import current_app, g, request, before_render_template, template_rendered
+from sqlalchemy import event
+from werkzeug.local import LocalProxy
+
+# --- CONFIGURATION ---
+# Histogram bucket upper bounds in seconds (Prometheus "le" labels)
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+_BOUNDS_NS = [int(b * 1e9) for b in BUCKETS]
+
+
+class _Shard:
+    """One thread's private counters. Only its own thread writes to it, so no locks."""
+    __slots__ = ('histograms', 'counters')
+
+    def __init__(self):
+        self.histograms = {}  # (metric, label) -> [bucket counts..., +Inf count, sum_ns]
+        self.counters = {}    # metric -> int
+
+    def merge(self, histograms, counters):
+        """Add this shard's numbers to the given totals."""
+        for key, values in list(self.histograms.items()):
+            total = histograms.setdefault(key, [0] * len(values))
+            for i, value in enumerate(values):
+                total[i] += value
+        for metric, value in list(self.counters.items()):
+            counters[metric] = counters.get(metric, 0) + value
+
+
+class _Owner:
+    """Lives only in a thread's thread-local storage: collected when the thread ends."""
+    __slots__ = ('__weakref__',)
+
+
+class _Timer:
+    """`with metrics.stage('model_predict'):` -- two perf_counter_ns() calls and a bucket lookup."""
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe_ns('app_stage_seconds', self.name, time.perf_counter_ns() - self.start)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Metrics:
+    """
+    Low-overhead request instrumentation for one worker process.
+
+    - Stage timers use the monotonic perf_counter_ns() clock.
+    - Every thread writes to its own shard (thread-local), so recording never
+      takes a lock; /metrics merges the shards when it is scraped. When a thread
+      ends its shard is folded into one retired shard, so thread-per-request
+      servers do not pile up shards.
+    - Request latency per endpoint, Jinja render time and DB statement counts
+      are recorded automatically; routes wrap their own phases in stage().
+
+    Like /api/stats the numbers are per gunicorn worker (each worker is one
+    scrape target's worth of counters).
+    """
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self._local = threading.local()
+        self._shards = set()                  # shards of live threads
+        self._retired = _Shard()              # totals of the threads that have ended
+        self._shards_lock = threading.Lock()  # only taken when a thread starts or ends, and on scrapes
+        self._gauges = {}  # prefix -> stats()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['metrics'] = self
+        self.enabled = bool(app.config.get('METRICS_ENABLED', True))
+        if not self.enabled:
+            return
+
+        app.before_request(self._request_started)
+        app.after_request(self._response_status)
+        # Teardown also runs when a view raises, so 5xx and slow failures are counted too
+        app.teardown_request(self._request_finished)
+        before_render_template.connect(self._render_started, app)
+        template_rendered.connect(self._render_finished, app)
+
+    def watch(self, engine):
+        """Count the statements of one of this app's engines (sync, or async via its sync_engine)."""
+        if self.enabled:
+            event.listen(getattr(engine, 'sync_engine', engine), 'before_cursor_execute', self._query_executed)
+
+    # --- RECORDING ---
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            owner = self._local.owner = _Owner()
+            with self._shards_lock:
+                self._shards.add(shard)
+            # The thread's locals are dropped when it ends: fold its shard in then
+            weakref.finalize(owner, self._retire, shard)
+        return shard
+
+    def _retire(self, shard):
+        with self._shards_lock:
+            if shard in self._shards:
+                self._shards.discard(shard)
+                shard.merge(self._retired.histograms, self._retired.counters)
+
+    def observe_ns(self, metric, label, elapsed_ns):
+        if not self.enabled:
+            return
+        histograms = self._shard().histograms
+        key = (metric, label)
+        values = histograms.get(key)
+        if values is None:
+            values = histograms[key] = [0] * (len(BUCKETS) + 2)
+        values[bisect_left(_BOUNDS_NS, elapsed_ns)] += 1
+        values[-1] += elapsed_ns
+
+    def inc(self, metric, amount=1):
+        if not self.enabled:
+            return
+        counters = self._shard().counters
+        counters[metric] = counters.get(metric, 0) + amount
+
+    def stage(self, name):
+        """Context manager timing one phase of a request."""
+        return _Timer(self, name) if self.enabled else _NULL_TIMER
+
+    def register_gauges(self, prefix, stats):
+        """Export the numeric values of stats() (a dict) as app_<prefix>_<key> gauges on every scrape."""
+        self._gauges[prefix] = stats
+
+    # --- HOOKS ---
+    def _request_started(self):
+        g._metrics_start = time.perf_counter_ns()
+
+    def _response_status(self, response):
+        g._metrics_status = response.status_code
+        return response
+
+    def _request_finished(self, exc):
+        start = g.pop('_metrics_start', None)
+        if start is not None:
+            status = 500 if exc is not None else g.pop('_metrics_status', 500)
+            self.observe_ns('app_request_seconds', request.endpoint or 'unknown', time.perf_counter_ns() - start)
+            self.inc(f'app_responses_total|{status // 100}xx')
+
+    def _render_started(self, sender, template, context, **extra):
+        g._metrics_render_start = time.perf_counter_ns()
+
+    def _render_finished(self, sender, template, context, **extra):
+        start = g.pop('_metrics_render_start', None)
+        if start is not None:
+            self.observe_ns('app_stage_seconds', 'render', time.perf_counter_ns() - start)
+
+    def _query_executed(self, conn, cursor, statement, parameters, context, executemany):
+        self.inc('app_db_queries_total')
+
+    # --- EXPORT ---
+    def collect(self):
+        """Merge every thread's shard: ({(metric, label): values}, {metric: count})."""
+        histograms, counters = {}, {}
+        with self._shards_lock:
+            shards = list(self._shards)
+            self._retired.merge(histograms, counters)
+        for shard in shards:
+            shard.merge(histograms, counters)
+        return histograms, counters
+
+    def render_prometheus(self):
+        """Everything in the Prometheus text exposition format (version 0.0.4)."""
+        histograms, counters = self.collect()
+        lines = []
+
+        label_names = {'app_stage_seconds': 'stage', 'app_request_seconds': 'endpoint'}
+        for metric in sorted({metric for metric, _ in histograms}):
+            lines.append(f'# TYPE {metric} histogram')
+            label_name = label_names.get(metric, 'name')
+            for (name, label), values in sorted(histograms.items()):
+                if name != metric:
+                    continue
+                cumulative = 0
+                for bound, count in zip(BUCKETS, values):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{{label_name}="{label}",le="{bound}"}} {cumulative}')
+                cumulative += values[len(BUCKETS)]
+                lines.append(f'{metric}_bucket{{{label_name}="{label}",le="+Inf"}} {cumulative}')
+                lines.append(f'{metric}_sum{{{label_name}="{label}"}} {values[-1] / 1e9:.9f}')
+                lines.append(f'{metric}_count{{{label_name}="{label}"}} {cumulative}')
+
+        # "name|label" counters carry a status label, plain names have none
+        for metric in sorted({key.split('|')[0] for key in counters}):
+            lines.append(f'# TYPE {metric} counter')
+            for key, value in sorted(counters.items()):
+                name, _, label = key.partition('|')
+                if name == metric:
+                    lines.append(f'{metric}{{status="{label}"}} {value}' if label else f'{metric} {value}')
+
+        for prefix, stats in list(self._gauges.items()):
+            for key, value in sorted(stats().items()):
+                if isinstance(value, bool):
+                    value = int(value)
+                if isinstance(value, (int, float)):
+                    lines.append(f'# TYPE app_{prefix}_{key} gauge')
+                    lines.append(f'app_{prefix}_{key} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+
+# The current app's metrics (create_app() gives every app its own)
+metrics = LocalProxy(lambda: current_app.extensions['metrics'])
@@ -0,0 +1,35 @@
+from sqlalchemy import inspect, text
+
+# --- SCHEMA UPGRADES ---
+# db.create_all() only creates MISSING TABLES. It never touches a table that
+# already exists, so databases created by an older version of the app would
+# miss new columns and indexes. upgrade_schema() fills in the gaps without losing data.
+
+def upgrade_schema(db):
+    """
+    Bring an existing database up to date with the models.
+    Returns a list of the changes that were made (empty if already up to date).
+    """
+    changes = []
+    db.create_all()
+
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        # New NULLABLE columns can be added in place (old rows just get NULL)
+        columns = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in columns:
+                if not column.nullable:
+                    raise RuntimeError(f"Cannot add NOT NULL column {table.name}.{column.name} automatically")
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                with db.engine.begin() as conn:
+                    conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+                changes.append(f"Added column {column.name} to {table.name}")
+
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=db.engine)
+                changes.append(f"Created index {index.name} on {table.name}")
+
+    return changes
@@ -1,11 +1,14 @@
 from application import db, login_manager
+from application.identity import identity_cache
 from flask_login import UserMixin
 from datetime import datetime
 
 # [CRITICAL FIX] This function allows Flask-Login to load a user from the database
+# Runs on EVERY authenticated request, so it goes through the identity cache
+# (no SELECT while the cached row is fresh) and db.session.get() otherwise.
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return identity_cache.load(db.session, User, int(user_id))
 
 # User Table
 class User(db.Model, UserMixin):
@@ -16,6 +19,23 @@ class User(db.Model, UserMixin):
 
 # History Table
 class History(db.Model):
+    # Composite indexes for /history: WHERE user_id = ? ORDER BY <column>, id
+    # One per sortable column, so every sort + keyset page is a single index range scan.
+    # Existing databases get these with: flask --app app init-db
+    __table_args__ = (
+        db.Index('ix_history_user_predicted_on', 'user_id', 'predicted_on', 'id'),
+        db.Index('ix_history_user_prediction', 'user_id', 'prediction', 'id'),
+        db.Index('ix_history_user_overall_qual', 'user_id', 'overall_qual', 'id'),
+        db.Index('ix_history_user_gr_liv_area', 'user_id', 'gr_liv_area', 'id'),
+        db.Index('ix_history_user_garage_cars', 'user_id', 'garage_cars', 'id'),
+        db.Index('ix_history_user_total_bsmt_sf', 'user_id', 'total_bsmt_sf', 'id'),
+        db.Index('ix_history_user_year_built', 'user_id', 'year_built', 'id'),
+        # Covering index for the per-quality price summary (GROUP BY overall_qual)
+        db.Index('ix_history_user_qual_prediction', 'user_id', 'overall_qual', 'prediction'),
+        # Incremental retraining reads the sale prices it has not learned yet
+        db.Index('ix_history_sale_learned', 'sale_learned', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     predicted_on = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     
@@ -28,6 +48,46 @@ class History(db.Model):
     
     # The Result
     prediction = db.Column(db.Float, nullable=False)
+    # Which registry version produced it (NULL for rows saved before the registry existed)
+    model_version = db.Column(db.String(64), nullable=True)
+
+    # The price the house actually sold for, once known (training data for the model)
+    sale_price = db.Column(db.Float, nullable=True)
+    sale_recorded_on = db.Column(db.DateTime, nullable=True)
+    # NULL: no sale price; False: recorded, not in a model yet; True: set by the retrain that learned it
+    sale_learned = db.Column(db.Boolean, nullable=True)
     
     # Link back to User
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
\ No newline at end of file
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+
+
+# Per-user totals of History, kept up to date by application/userstats.py on every
+# insert/delete, so pages read them with one primary-key lookup.
+# Rebuilt from History with: flask --app app rebuild-stats
+class UserStats(db.Model):
+    __tablename__ = 'user_stats'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    prediction_count = db.Column(db.Integer, nullable=False, default=0)
+    prediction_total = db.Column(db.Float, nullable=False, default=0.0)
+    prediction_min = db.Column(db.Float, nullable=True)
+    prediction_max = db.Column(db.Float, nullable=True)
+    # The most recent prediction (by predicted_on, then id)
+    last_prediction = db.Column(db.Float, nullable=True)
+    last_predicted_on = db.Column(db.DateTime, nullable=True)
+    # When any of the above last changed (UTC): Last-Modified / ETag of /history
+    updated_on = db.Column(db.DateTime, nullable=True)
+
+
+# The same totals per (user, overall_qual): the "by quality" table of an unfiltered
+# /history, read with one primary-key range scan instead of a GROUP BY over History.
+# Maintained and rebuilt together with UserStats.
+class QualityStats(db.Model):
+    __tablename__ = 'user_quality_stats'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    overall_qual = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    prediction_count = db.Column(db.Integer, nullable=False, default=0)
+    prediction_total = db.Column(db.Float, nullable=False, default=0.0)
+    prediction_min = db.Column(db.Float, nullable=True)
+    prediction_max = db.Column(db.Float, nullable=True)
@@ -0,0 +1,225 @@
+import abc
+import hashlib
+import json
+import os
+import numpy as np
+
+# --- CONFIGURATION ---
+MODEL_FILE = 'housing_model.pkl'
+
+# Order of the inputs everywhere in the app (form -> model).
+# MUST match the column order the model was trained with.
+FEATURES = ['OverallQual', 'GrLivArea', 'GarageCars', 'TotalBsmtSF', 'YearBuilt']
+
+# Coverage of the prediction intervals stored with a model (percent)
+INTERVAL_LEVELS = (80, 95)
+
+
+class Predictor(abc.ABC):
+    """
+    Interface used by the routes to score houses.
+    Rows are always given in FEATURES order.
+    """
+    features = tuple(FEATURES)
+    # Identifies the model that produced a price (used as part of cache keys)
+    version = None
+    # {"80": [low, high], ...}: offsets added to a price to get its interval,
+    # precomputed at training time (empty if the model has none)
+    intervals = {}
+
+    @abc.abstractmethod
+    def predict_one(self, row):
+        """Score a single row (sequence of 5 numbers) and return a float."""
+
+    @abc.abstractmethod
+    def predict_many(self, X):
+        """Score a 2D array of shape (n, 5) and return a 1D float array."""
+
+    def interval_one(self, price):
+        """{"80": (low, high), ...} around one predicted price: two additions per level."""
+        return {level: (price + low, price + high) for level, (low, high) in self.intervals.items()}
+
+    def interval_many(self, prices):
+        """{"80": array of shape (n, 2), ...} for a whole batch of predicted prices at once."""
+        prices = np.asarray(prices, dtype=np.float64)[:, None]
+        return {level: prices + np.asarray(offsets) for level, offsets in self.intervals.items()}
+
+
+class LinearPredictor(Predictor):
+    """
+    Inference for a fitted LinearRegression without pandas or sklearn
+    on the hot path. Built from the model's coefficients, or straight from
+    a coef.npy file in the registry (memory-mapped, no unpickling at all).
+    """
+
+    # Above this many coefficients a Python list copy is not worth it
+    SMALL_MODEL = 64
+
+    def __init__(self, coef, intercept, features=FEATURES):
+        self.features = tuple(features)
+        coef = np.asarray(coef, dtype=np.float64).reshape(-1)
+        if coef.flags.writeable:
+            # Read-only copy, so workers can never mutate the weights
+            coef = coef.copy()
+            coef.setflags(write=False)
+        # (A memory-mapped array is already read-only and is used as-is: the
+        #  pages come from the OS page cache and are shared by every worker.)
+        self.coef = coef
+        self.intercept = float(intercept)
+
+        if self.coef.shape[0] != len(self.features):
+            raise ValueError(f"Model has {self.coef.shape[0]} coefficients, expected {len(self.features)}")
+
+        # Plain Python floats are faster than NumPy for a 5-term dot product
+        self._coef_list = self.coef.tolist() if self.coef.shape[0] <= self.SMALL_MODEL else None
+
+    @classmethod
+    def from_model(cls, model, features=FEATURES):
+        check_feature_order(model, features)
+        coef, intercept = linear_weights(model)
+        return cls(coef, intercept, features)
+
+    def predict_one(self, row):
+        if self._coef_list is None:
+            return float(np.dot(np.asarray(row, dtype=np.float64), self.coef)) + self.intercept
+        total = 0.0
+        for x, w in zip(row, self._coef_list):
+            total += x * w
+        return total + self.intercept
+
+    def predict_many(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != len(self.features):
+            raise ValueError(f"Expected shape (n, {len(self.features)}), got {X.shape}")
+        return X @ self.coef + self.intercept
+
+
+class ModelPredictor(Predictor):
+    """
+    Fallback for any other fitted estimator (gradient boosting, forests, pipelines...).
+    Slower than LinearPredictor, but still never builds a DataFrame per request.
+    """
+
+    def __init__(self, model, features=FEATURES):
+        check_feature_order(model, features)
+        self.model = model
+        self.features = tuple(features)
+        # Fitted on a DataFrame -> sklearn expects column names
+        self._needs_names = getattr(model, 'feature_names_in_', None) is not None
+
+    def _prepare(self, X):
+        if self._needs_names:
+            import pandas as pd
+            return pd.DataFrame(X, columns=list(self.features))
+        return X
+
+    def predict_one(self, row):
+        X = np.asarray([row], dtype=np.float64)
+        return float(self.model.predict(self._prepare(X))[0])
+
+    def predict_many(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != len(self.features):
+            raise ValueError(f"Expected shape (n, {len(self.features)}), got {X.shape}")
+        return np.asarray(self.model.predict(self._prepare(X)), dtype=np.float64)
+
+
+# --- HELPER FUNCTIONS ---
+def linear_weights(model):
+    """
+    (coef, intercept) of a linear model as plain arrays, or None if it is not linear.
+    A StandardScaler -> Ridge/Lasso/LinearRegression pipeline is folded into a single
+    set of weights, so it can use the fast LinearPredictor too.
+    """
+    if hasattr(model, 'coef_') and hasattr(model, 'intercept_'):
+        coef = np.asarray(model.coef_, dtype=np.float64).reshape(-1)
+        intercept = float(np.asarray(model.intercept_, dtype=np.float64).reshape(-1)[0])
+        return coef, intercept
+
+    steps = getattr(model, 'steps', None)
+    if steps and len(steps) == 2 and type(steps[0][1]).__name__ == 'StandardScaler':
+        scaler, inner = steps[0][1], steps[1][1]
+        weights = linear_weights(inner)
+        if weights is None:
+            return None
+        coef, intercept = weights
+        scale = scaler.scale_ if scaler.scale_ is not None else np.ones_like(coef)
+        mean = scaler.mean_ if scaler.mean_ is not None else np.zeros_like(coef)
+        # w * (x - mean) / scale + b  ==  (w / scale) * x + (b - sum(w * mean / scale))
+        folded = coef / scale
+        return folded, intercept - float(np.dot(folded, mean))
+
+    return None
+
+
+def residual_intervals(residuals, levels=INTERVAL_LEVELS):
+    """
+    Interval offsets from held-out residuals (actual - predicted): the central
+    `level`% of the errors the model made on houses it did not train on.
+    """
+    residuals = np.asarray(residuals, dtype=np.float64)
+    out = {}
+    for level in levels:
+        tail = (100 - level) / 2
+        low, high = np.percentile(residuals, [tail, 100 - tail])
+        out[str(level)] = [float(low), float(high)]
+    return out
+
+
+def normal_intervals(rmse, levels=INTERVAL_LEVELS):
+    """Symmetric offsets +/- z * rmse, for when only the error size is known."""
+    from statistics import NormalDist
+    return {str(level): [-z * rmse, z * rmse]
+            for level, z in ((level, NormalDist().inv_cdf(0.5 + level / 200)) for level in levels)}
+
+
+def check_feature_order(model, features=FEATURES):
+    """Raise ValueError if the model was trained on different/reordered columns."""
+    n_features = getattr(model, 'n_features_in_', None)
+    if n_features is not None and n_features != len(features):
+        raise ValueError(f"Model expects {n_features} inputs, expected {len(features)} ({list(features)})")
+    trained = getattr(model, 'feature_names_in_', None)
+    if trained is None:
+        # Model was fitted on a bare array, nothing more to compare against
+        return
+    if list(trained) != list(features):
+        raise ValueError(f"Model feature order {list(trained)} does not match expected {list(features)}")
+
+
+def make_predictor(model, features=FEATURES):
+    """Wrap a fitted estimator in the fastest Predictor that supports it."""
+    if linear_weights(model) is not None:
+        return LinearPredictor.from_model(model, features)
+    return ModelPredictor(model, features)
+
+
+def file_checksum(path):
+    """sha256 of a file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def sidecar_path(path=MODEL_FILE):
+    """housing_model.pkl -> housing_model.json (metadata written next to the pickle)."""
+    return os.path.splitext(path)[0] + '.json'
+
+
+def load_predictor(path=MODEL_FILE, features=FEATURES):
+    """Unpickle the model ONCE and return a Predictor for it."""
+    import joblib
+    model = joblib.load(path)
+    predictor = make_predictor(model, features)
+    checksum = file_checksum(path)
+    predictor.version = checksum[:12]
+    try:
+        with open(sidecar_path(path)) as f:
+            meta = json.load(f)
+        # Only trust metadata written for THIS pickle
+        if meta.get('checksum') == checksum:
+            predictor.intervals = meta.get('intervals', {})
+    except FileNotFoundError:
+        pass
+    return predictor
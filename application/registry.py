@@ -0,0 +1,283 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+import numpy as np
+from application.predictor import (FEATURES, MODEL_FILE, LinearPredictor, make_predictor,
+                                   check_feature_order, file_checksum, linear_weights)
+
+# --- CONFIGURATION ---
+REGISTRY_DIR = 'models'
+ACTIVE_FILE = 'ACTIVE'
+ARTIFACT_FILE = 'model.pkl'
+COEF_FILE = 'coef.npy'
+META_FILE = 'meta.json'
+
+# Registry layout on disk:
+#   models/
+#     ACTIVE                          <- name of the version workers should serve
+#     20261018120000-1a2b3c4d/
+#       model.pkl                     <- the fitted estimator
+#       coef.npy                      <- linear models only: raw float64 coefficients
+#       meta.json                     <- features, training metrics, checksum, ...
+#       stats.npz                     <- optional extra arrays ("artifacts"), e.g. the
+#                                        X^T X / X^T y statistics for incremental retraining
+#
+# Loading is memory-mapped by default: coef.npy (or the NumPy arrays inside
+# model.pkl) are mapped read-only instead of copied, so every gunicorn worker
+# on the machine shares the same physical pages.
+
+
+def _write_atomic(path, text):
+    """Write a small file so readers see either the old or the new content, never half."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    with os.fdopen(fd, 'w') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def check_serving_features(features, version=None):
+    """Raise ValueError unless `features` is exactly FEATURES, the order rows are built in."""
+    if list(features) != FEATURES:
+        model = f"Model {version}" if version else "Model"
+        raise ValueError(f"{model} uses features {list(features)}, the app serves {FEATURES}")
+
+
+class ModelRegistry:
+    """Versioned model artifacts + a pointer to the active one."""
+
+    def __init__(self, root=REGISTRY_DIR, mmap=True):
+        self.root = root
+        self.mmap = mmap
+
+    def _dir(self, version):
+        return os.path.join(self.root, version)
+
+    # --- PUBLISHING ---
+    def publish(self, model, metrics=None, features=FEATURES, activate=True, extra=None, artifacts=None):
+        """
+        Save a fitted model as a new version. Returns the version name.
+        The artifact is written to a temp folder first and renamed into place,
+        so a half-written version can never be activated.
+        `artifacts` maps a name to a dict of NumPy arrays saved next to the model.
+        Only models on FEATURES, in that order, can be published: the routes build
+        every row in that order, and any version may be activated and hot-reloaded.
+        """
+        check_serving_features(features)
+        check_feature_order(model, features)
+        os.makedirs(self.root, exist_ok=True)
+
+        staging = tempfile.mkdtemp(dir=self.root, prefix='.staging-')
+        try:
+            artifact = os.path.join(staging, ARTIFACT_FILE)
+            import joblib
+            joblib.dump(model, artifact)
+            checksum = file_checksum(artifact)
+            version = f"{datetime.now(timezone.utc):%Y%m%d%H%M%S}-{checksum[:8]}"
+
+            meta = {
+                'version': version,
+                'created_at': datetime.now(timezone.utc).isoformat(),
+                'model_type': type(model).__name__,
+                'features': list(features),
+                'metrics': metrics or {},
+                'checksum': checksum,
+            }
+
+            # Raw coefficient store for linear models: loading it needs no pickle/sklearn
+            weights = linear_weights(model)
+            if weights is not None:
+                coef_path = os.path.join(staging, COEF_FILE)
+                np.save(coef_path, weights[0])
+                meta['coef_file'] = COEF_FILE
+                meta['coef_checksum'] = file_checksum(coef_path)
+                meta['intercept'] = weights[1]
+
+            for name, arrays in (artifacts or {}).items():
+                path = os.path.join(staging, name + '.npz')
+                np.savez(path, **arrays)
+                meta.setdefault('artifacts', {})[name] = {'file': name + '.npz', 'checksum': file_checksum(path)}
+
+            meta.update(extra or {})
+            with open(os.path.join(staging, META_FILE), 'w') as f:
+                json.dump(meta, f, indent=2)
+
+            os.replace(staging, self._dir(version))
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        if activate:
+            self.activate(version)
+        return version
+
+    def activate(self, version):
+        if not os.path.exists(os.path.join(self._dir(version), META_FILE)):
+            raise KeyError(f"Unknown model version: {version}")
+        _write_atomic(os.path.join(self.root, ACTIVE_FILE), version + '\n')
+
+    # --- READING ---
+    def active_version(self):
+        try:
+            with open(os.path.join(self.root, ACTIVE_FILE)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def versions(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root)
+                      if os.path.exists(os.path.join(self.root, name, META_FILE)))
+
+    def metadata(self, version):
+        with open(os.path.join(self._dir(version), META_FILE)) as f:
+            return json.load(f)
+
+    def _verify(self, version, filename, checksum):
+        path = os.path.join(self._dir(version), filename)
+        if file_checksum(path) != checksum:
+            raise ValueError(f"Checksum mismatch for {filename} of model {version}, refusing to load it")
+        return path
+
+    def load_model(self, version):
+        """Unpickle a version after checking its checksum. Returns (model, meta)."""
+        meta = self.metadata(version)
+        artifact = self._verify(version, ARTIFACT_FILE, meta['checksum'])
+        import joblib
+        return joblib.load(artifact, mmap_mode='r' if self.mmap else None), meta
+
+    def load_artifact(self, version, name):
+        """The dict of arrays published with a version under `name`."""
+        entry = self.metadata(version)['artifacts'][name]
+        path = os.path.join(self._dir(version), entry['file'])
+        if file_checksum(path) != entry['checksum']:
+            raise ValueError(f"Checksum mismatch for {name} of model {version}")
+        with np.load(path) as data:
+            return {key: data[key] for key in data.files}
+
+    def load(self, version):
+        """Load a version as a ready-to-serve Predictor."""
+        meta = self.metadata(version)
+        # A failed load keeps the old model serving, a wrong column order would not
+        check_serving_features(meta['features'], version)
+
+        if meta.get('coef_file'):
+            # Fast path: map the coefficients, never unpickle. The pickle is still
+            # checked: a version whose model.pkl is damaged is not served either way.
+            self._verify(version, ARTIFACT_FILE, meta['checksum'])
+            coef_path = self._verify(version, meta['coef_file'], meta['coef_checksum'])
+            coef = np.load(coef_path, mmap_mode='r' if self.mmap else None)
+            predictor = LinearPredictor(coef, meta['intercept'], meta['features'])
+        else:
+            model, meta = self.load_model(version)
+            predictor = make_predictor(model, meta['features'])
+
+        predictor.version = version
+        predictor.intervals = meta.get('intervals', {})
+        return predictor
+
+
+class ModelManager:
+    """
+    Holds the predictor a worker is serving and swaps it when ACTIVE changes.
+
+    - A request grabs the current predictor ONCE (get()) and uses that object
+      to the end, so a swap never affects a request that is already running.
+    - The new model is fully loaded before the swap; the swap itself is a single
+      attribute assignment. At most two models exist at once (old + new), and
+      the old one is freed as soon as its last request finishes.
+    - Only one thread reloads at a time; everyone else keeps serving the old model.
+    """
+
+    def __init__(self, registry, legacy_path=MODEL_FILE, cache=None, check_interval=5.0):
+        self.registry = registry
+        self.legacy_path = legacy_path
+        self.cache = cache
+        self.check_interval = check_interval
+
+        self._current = None
+        self._reload_lock = threading.Lock()
+        self._last_check = float('-inf')
+        self._active_stamp = None
+        self.counters = {'reloads': 0, 'reload_errors': 0, 'reload_seconds_last': 0.0, 'reload_seconds_max': 0.0}
+        self.last_error = None
+
+    def get(self):
+        """The predictor to use for this request (None if no model could be loaded)."""
+        # Nothing loaded yet: wait for the load in progress instead of answering without a model
+        if self._current is None or time.monotonic() - self._last_check >= self.check_interval:
+            self.maybe_reload()
+        return self._current
+
+    @property
+    def version(self):
+        return self._current.version if self._current is not None else None
+
+    def _stamp(self):
+        # Cheap change detection: stat() the ACTIVE pointer instead of reading it
+        try:
+            st = os.stat(os.path.join(self.registry.root, ACTIVE_FILE))
+            return (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            return None
+
+    def maybe_reload(self, force=False):
+        """Reload if the ACTIVE version changed. Returns True if a new model was swapped in."""
+        if not self._reload_lock.acquire(blocking=self._current is None):
+            return False  # someone else is already reloading, keep serving
+        try:
+            self._last_check = time.monotonic()
+            stamp = self._stamp()
+            if not force and self._current is not None and stamp == self._active_stamp:
+                return False
+            self._active_stamp = stamp
+
+            version = self.registry.active_version()
+            if not force and self._current is not None and version == self._current.version:
+                return False
+
+            start = time.perf_counter()
+            try:
+                new = self._load(version)
+            except Exception as error:
+                # Keep serving the old model if the new one is broken
+                self.counters['reload_errors'] += 1
+                self.last_error = str(error)
+                return False
+            elapsed = time.perf_counter() - start
+
+            if self.cache is not None:
+                from application.cache import CachedPredictor
+                if self._current is not None and new.version != self._current.version:
+                    # Keys carry the version, so this only frees the old model's entries in
+                    # this worker; the shared cache of the other workers is left alone
+                    self.cache.clear(shared=False)
+                new = CachedPredictor(new, self.cache)
+
+            self._current = new  # the atomic swap
+            self.counters['reloads'] += 1
+            self.counters['reload_seconds_last'] = elapsed
+            self.counters['reload_seconds_max'] = max(self.counters['reload_seconds_max'], elapsed)
+            return True
+        finally:
+            self._reload_lock.release()
+
+    def _load(self, version):
+        if version:
+            return self.registry.load(version)
+        # No registry yet: serve the original housing_model.pkl
+        from application.predictor import load_predictor
+        return load_predictor(self.legacy_path)
+
+    def stats(self):
+        stats = dict(self.counters)
+        stats['active_version'] = self.version
+        stats['last_error'] = self.last_error
+        return stats
@@ -1,34 +1,49 @@
-import pandas as pd
-import joblib
-from application import app, db
-from flask import render_template, request, redirect, url_for, flash, jsonify
+from application import db, userstats
+from flask import Blueprint, abort, current_app, render_template, make_response, request, session, redirect, url_for, flash, jsonify, Response, stream_with_context
 from application.form import PredictionForm, LoginForm, RegisterForm, UpdateAccountForm
 from application.models import History, User
+from application.comparables import DEFAULT_K, MAX_K
+from application.services import ml
+from application.writebehind import history_writer
+from application.identity import identity_cache
+from application.authpool import kdf_pool, PoolSaturated
+from application.metrics import metrics
+from application.httpcache import http_cache
+from application.history_query import filtered_query, has_filters, sort_spec, keyset_page, summarize, stored_summary, apply_sort
+from application.export import FORMATS, WRITERS, iter_row_batches
+from application.batch import score_records
+from application.scoring import guess_format, iter_records, score_stream, ndjson_lines
 from datetime import datetime
-from werkzeug.security import generate_password_hash ,check_password_hash
+from functools import wraps
+import hmac
 from flask_login import login_user, current_user, logout_user, login_required
 
-# --- LOAD AI MODEL ---
-try:
-    model = joblib.load('housing_model.pkl')
-except:
-    model = None
+# All pages and API routes; registered on the app by create_app()
+main = Blueprint('main', __name__)
 
 # --- HELPER FUNCTIONS ---
 def add_entry(new_entry):
+    # Saved according to HISTORY_WRITE_MODE (sync / batched / off)
     try:
-        db.session.add(new_entry)
-        db.session.commit()
-        return new_entry.id
+        history_writer.submit([new_entry])
+        return new_entry.id  # None if the row was only queued
     except Exception as error:
         db.session.rollback()
         flash(f"Database Error: {error}", "danger")
         return 0
 
+def add_entries(entries):
+    # Bulk version of add_entry() for the API: one commit for the whole batch, no flash()
+    try:
+        return history_writer.submit(entries)
+    except Exception:
+        db.session.rollback()
+        return 0
+
 def remove_entry(id):
     try:
         # [FIX] Use History instead of Entry
-        entry = History.query.get(id)
+        entry = db.session.get(History, id)
         if entry:
             # [SECURITY] Ensure user can only delete their own history
             if entry.author != current_user:
@@ -36,6 +51,7 @@ def remove_entry(id):
                 return
             
             db.session.delete(entry)
+            userstats.record_removed(db.session, entry)
             db.session.commit()
             flash("Record deleted successfully.", "success")
         else:
@@ -44,41 +60,62 @@ def remove_entry(id):
         db.session.rollback()
         flash(f"Error: {error}", "danger")
 
+def auth_busy(template, form, **context):
+    # Every password-hashing slot is taken (see AUTH_POOL_*): fail fast with 429
+    # instead of queueing more slow KDF work in front of everyone else's requests
+    flash("Too many sign-in attempts right now. Please try again in a moment.", "warning")
+    return render_template(template, form=form, **context), 429, {'Retry-After': '1'}
+
+def monitoring_only(view):
+    # /metrics and /api/stats expose internals (error strings, queue sizes): they answer
+    # only "Authorization: Bearer <METRICS_TOKEN>", and 404 when no token is configured
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        token = current_app.config.get('METRICS_TOKEN')
+        sent = request.headers.get('Authorization', '')
+        if not token or not hmac.compare_digest(sent.encode(), f'Bearer {token}'.encode()):
+            abort(404)
+        return view(*args, **kwargs)
+    return wrapped
+
 # --- ROUTES ---
 
-@app.route('/')
-@app.route('/index')
-@app.route('/home')
+@main.route('/')
+@main.route('/index')
+@main.route('/home')
 def index():
-    return render_template("index.html")
+    # Same HTML for everyone (per logged-in flag): rendered once per worker, 304 on repeat visits
+    return http_cache.render("index.html", variant=(bool(session.get('user')),))
 
-@app.route('/register', methods=['GET', 'POST'])
+@main.route('/register', methods=['GET', 'POST'])
 def register():
     if current_user.is_authenticated:
-        return redirect(url_for('predict'))
+        return redirect(url_for('main.predict'))
         
     form = RegisterForm()
     if form.validate_on_submit():
         try:
-            # Create new user
-            hashed_pw = generate_password_hash(form.password.data)
+            # Create new user (the slow KDF runs on the bounded auth pool)
+            hashed_pw = kdf_pool.hash_password(form.password.data)
             new_user = User(username=form.username.data, password=hashed_pw)
             db.session.add(new_user)
             db.session.commit()
             
             flash(f"Account created for {form.username.data}! Please login.", "success")
-            return redirect(url_for('login'))
-            
+            return redirect(url_for('main.login'))
+
+        except PoolSaturated:
+            return auth_busy('register.html', form)
         except Exception as e:
             db.session.rollback()
             flash(f"Error: {e}", "danger")
             
     return render_template('register.html', form=form)
 
-@app.route('/login', methods=['GET', 'POST'])
+@main.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
-        return redirect(url_for('predict'))
+        return redirect(url_for('main.predict'))
 
     form = LoginForm()
     if form.validate_on_submit():
@@ -87,29 +124,36 @@ def login():
         
         user = User.query.filter_by(username=username).first()
 
-        if user and check_password_hash(user.password, password):
+        try:
+            valid = user is not None and kdf_pool.check_password(user.password, password)
+        except PoolSaturated:
+            return auth_busy('login.html', form)
+
+        if valid:
             # [FIX] Use official Flask-Login function
             login_user(user)
+            # Fresh row from the query above: the next requests will not need one
+            identity_cache.put(user)
             flash(f"Welcome back, {user.username}!", "success")
             
             # Handle "next" page redirect
             next_page = request.args.get('next')
-            return redirect(next_page) if next_page else redirect(url_for('predict'))
+            return redirect(next_page) if next_page else redirect(url_for('main.predict'))
         else:
             flash("Invalid Username or Password", "danger")
             
     return render_template('login.html', form=form)
 
-@app.route('/logout')
+@main.route('/logout')
 @login_required
 def logout():
     # [FIX] Use official Flask-Login logout
     logout_user()
     flash("You have been logged out.", "info")
-    return redirect(url_for('login'))
+    return redirect(url_for('main.login'))
 
 
-@app.route('/account', methods=['GET', 'POST'])
+@main.route('/account', methods=['GET', 'POST'])
 @login_required
 def account():
     form = UpdateAccountForm()
@@ -121,166 +165,337 @@ def account():
         # Update Password (ONLY if they typed something)
         if form.password.data:
             # [FIX] Hash the new password before saving it to the database
-            hashed_pw = generate_password_hash(form.password.data)
+            try:
+                hashed_pw = kdf_pool.hash_password(form.password.data)
+            except PoolSaturated:
+                return auth_busy('account.html', form, title='Account')
             current_user.password = hashed_pw
             
         db.session.commit()
+        identity_cache.discard(current_user.id)
         flash('Your account has been updated!', 'success')
-        return redirect(url_for('account'))
+        return redirect(url_for('main.account'))
         
     elif request.method == 'GET':
         # Pre-fill the form with current data
         form.username.data = current_user.username
 
-    return render_template('account.html', title='Account', form=form)
+    if history_writer.mode == 'batched':
+        history_writer.flush(current_user.id)
+    stats = userstats.user_totals(db.session, current_user.id)
+    return render_template('account.html', title='Account', form=form, stats=stats)
 
 
-@app.route("/account/delete", methods=['POST'])
+@main.route("/account/delete", methods=['POST'])
 @login_required
 def delete_account():
     user = current_user
     try:
+        user_id = user.id
+        userstats.forget_user(db.session, user_id)
         db.session.delete(user)
         db.session.commit()
+        identity_cache.discard(user_id)
         flash('Your account has been deleted.', 'success')
-        return redirect(url_for('register'))
+        return redirect(url_for('main.register'))
     except Exception as e:
         db.session.rollback()
         flash(f"Error deleting account: {e}", "danger")
-        return redirect(url_for('account'))
-
-@app.route('/predict', methods=['GET', 'POST'])
+        return redirect(url_for('main.account'))
+
+def predict_form(form):
+    """
+    Score a validated PredictionForm. No database I/O here, so the ASGI mode can
+    run it off the event loop. Returns (template context, History row to save),
+    the row being None if no model is loaded.
+    """
+    context = {'prediction': None, 'ranges': None, 'comparables': None}
+
+    # 1. Get Data
+    qual = form.overall_qual.data
+    area = form.gr_liv_area.data
+    cars = form.garage_cars.data
+    bsmt = form.total_bsmt_sf.data
+    year = form.year_built.data
+
+    # 2. Predict (same order as predictor.FEATURES)
+    predictor = ml.model_manager.get()
+    if not predictor:
+        return context, None
+    with metrics.stage('model_predict'):
+        pred_value = predictor.predict_one([qual, area, cars, bsmt, year])
+        context['prediction'] = f"{pred_value:,.2f}"
+        # e.g. {"80": "$170,000 - $242,000"}: two additions per level
+        context['ranges'] = {level: f"${max(low, 0):,.0f} - ${high:,.0f}"
+                             for level, (low, high) in predictor.interval_one(pred_value).items()}
+    if ml.comparables is not None:
+        k = current_app.config.get('COMPARABLES_K', DEFAULT_K)
+        with metrics.stage('comparables'):
+            context['comparables'] = ml.comparables.lookup([qual, area, cars, bsmt, year], k)
+
+    # 3. The row to SAVE TO DB (Updated for new Relational DB)
+    entry = History(
+        # [FIX] Removed 'username=' because database handles it via author
+        overall_qual=qual,
+        gr_liv_area=area,
+        garage_cars=cars,
+        total_bsmt_sf=bsmt,
+        year_built=year,
+        prediction=pred_value,
+        model_version=predictor.version,
+        predicted_on=datetime.now(),
+        # Link by id, NOT author=current_user: the backref would cascade the
+        # row into the session and commit it behind the write-behind queue's back
+        user_id=current_user.id
+    )
+    return context, entry
+
+@main.route('/predict', methods=['GET', 'POST'])
 @login_required  # [FIX] Protect this route
 def predict():
     form = PredictionForm()
-    prediction_text = None
-    
-    if form.validate_on_submit():
-        # 1. Get Data
-        qual = form.overall_qual.data
-        area = form.gr_liv_area.data
-        cars = form.garage_cars.data
-        bsmt = form.total_bsmt_sf.data
-        year = form.year_built.data
-        
-        # 2. Predict
-        input_df = pd.DataFrame([[qual, area, cars, bsmt, year]], 
-                                columns=['OverallQual', 'GrLivArea', 'GarageCars', 'TotalBsmtSF', 'YearBuilt'])
-        
-        if model:
-            pred_value = float(model.predict(input_df)[0])
-            prediction_text = f"{pred_value:,.2f}"
-            
-            # 3. SAVE TO DB (Updated for new Relational DB)
-            entry = History(
-                # [FIX] Removed 'username=' because database handles it via author
-                overall_qual=qual,
-                gr_liv_area=area,
-                garage_cars=cars,
-                total_bsmt_sf=bsmt,
-                year_built=year,
-                prediction=pred_value,
-                predicted_on=datetime.now(),
-                author=current_user  # [FIX] Link to the logged-in user
-            )
-            add_entry(entry)
-            
-            flash(f"Success! Estimated Value: ${prediction_text}", "success")
+    context = {'prediction': None, 'ranges': None, 'comparables': None}
+
+    with metrics.stage('form_validation'):
+        submitted = form.validate_on_submit()
+
+    if submitted:
+        context, entry = predict_form(form)
+        if entry is not None:
+            with metrics.stage('history_write'):
+                add_entry(entry)
+            flash(f"Success! Estimated Value: ${context['prediction']}", "success")
         else:
             flash("Error: AI Model not loaded.", "danger")
 
-    return render_template('predict.html', form=form, prediction=prediction_text)
+    return render_template('predict.html', form=form, **context)
 
-@app.route('/history')
+@main.route('/history')
 @login_required
 def history():
-    # 1. Base Query
-    query = History.query.filter_by(author=current_user)
-
-    # --- FILTERING LOGIC ---
-    # We loop through all possible filters dynamically
-    filters = {
-        'quality': 'overall_qual',
-        'area': 'gr_liv_area',
-        'garage': 'garage_cars',
-        'basement': 'total_bsmt_sf',
-        'year': 'year_built'
-    }
-
-    for url_param, db_column in filters.items():
-        value = request.args.get(url_param)
-        if value and value.isdigit():
-            # Apply exact match filter (e.g. WHERE overall_qual = 5)
-            # getattr(History, db_column) gets the actual column object
-            query = query.filter(getattr(History, db_column) == int(value))
-
-    # --- SORTING LOGIC ---
-    sort_col = request.args.get('sort', 'date') # Default to date
-    sort_dir = request.args.get('order', 'desc') # Default to desc
-
-    # Map URL sort keys to Database Columns
-    sort_map = {
-        'date': History.predicted_on,
-        'quality': History.overall_qual,
-        'area': History.gr_liv_area,
-        'garage': History.garage_cars,
-        'basement': History.total_bsmt_sf,
-        'year': History.year_built,
-        'price': History.prediction
-    }
-
-    # Apply Sort
-    if sort_col in sort_map:
-        column = sort_map[sort_col]
-        if sort_dir == 'asc':
-            query = query.order_by(column.asc())
+    # Write out this user's queued predictions first, so they always see their latest ones
+    if history_writer.mode == 'batched':
+        history_writer.flush(current_user.id)
+
+    # 0. Nothing changed since the browser's copy (same stored stats): 304 without any query
+    page_size = current_app.config.get('HISTORY_PAGE_SIZE', 50)
+    stats = userstats.user_totals(db.session, current_user.id)
+    etag = http_cache.etag_for(current_user.id, stats['count'], stats['updated_on'], page_size)
+    cached = http_cache.not_modified(etag, stats['updated_on'])
+    if cached is not None:
+        return cached
+
+    # 1. Base Query + Filters (see history_query.FILTERS)
+    query = filtered_query(current_user.id, request.args)
+
+    # 2. Sort + one page of results (keyset pagination, no OFFSET)
+    sort_key, column, descending = sort_spec(request.args)
+    with metrics.stage('history_query'):
+        entries, next_cursor, prev_cursor = keyset_page(
+            query, column, descending,
+            after=request.args.get('after'),
+            before=request.args.get('before'),
+            page_size=page_size
+        )
+
+        # 3. Summary of ALL matching rows (computed in SQL, not from the page);
+        #    without filters it is the user's stored stats (no scan of History)
+        if has_filters(request.args):
+            summary = summarize(query)
         else:
-            query = query.order_by(column.desc())
+            summary = stored_summary(stats, userstats.user_buckets(db.session, current_user.id))
 
-    # Execute
-    entries = query.all()
-    
-    return render_template('history.html', history=entries)
+    response = make_response(render_history(entries, summary, next_cursor, prev_cursor))
+    return http_cache.add_validators(response, etag, stats['updated_on'])
+
+def render_history(entries, summary, next_cursor, prev_cursor):
+    # Current URL params without the cursor, used to build Newer/Older links
+    page_args = {k: v for k, v in request.args.items() if k not in ('after', 'before')}
+
+    range_active = any(k.endswith(('_min', '_max')) and v for k, v in request.args.items())
 
-@app.route('/delete_history/<int:id>')
+    return render_template('history.html', history=entries, summary=summary, range_active=range_active,
+                           next_cursor=next_cursor, prev_cursor=prev_cursor, page_args=page_args)
+
+@main.route('/history/export')
+@login_required
+def history_export():
+    """
+    Download the user's history with the SAME filters and sort as /history.
+    ?format=csv (default), ndjson or parquet. Rows are streamed in batches straight
+    from the database cursor, so huge exports never sit in memory.
+    """
+    fmt = request.args.get('format', 'csv')
+    if fmt not in FORMATS:
+        return jsonify({'error': f"Unknown format '{fmt}', use one of {list(FORMATS)}"}), 400
+
+    if history_writer.mode == 'batched':
+        history_writer.flush(current_user.id)
+
+    query = filtered_query(current_user.id, request.args)
+    sort_key, column, descending = sort_spec(request.args)
+    query = apply_sort(query, column, descending)
+
+    batch_size = current_app.config.get('EXPORT_BATCH_SIZE', 1000)
+    body = WRITERS[fmt](iter_row_batches(query, batch_size))
+
+    mimetype, extension = FORMATS[fmt]
+    filename = f"history_{datetime.now():%Y%m%d_%H%M%S}.{extension}"
+    return Response(stream_with_context(body), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+@main.route('/delete_history/<int:id>')
 @login_required
 def delete_history(id):
     remove_entry(id)
-    return redirect(url_for('history'))
-
-# --- API ROUTE (Optional) ---
-@app.route('/api/predict', methods=['POST'])
+    return redirect(url_for('main.history'))
+
+# --- API ROUTE ---
+def read_batch(payload):
+    """
+    The records of an /api/predict body (ONE house object or a LIST of them).
+    Returns (records, None), or (None, (error JSON, status)).
+    """
+    if isinstance(payload, dict):
+        records = [payload]
+    elif isinstance(payload, list):
+        records = payload
+    else:
+        return None, (jsonify({'error': 'Body must be a JSON object or an array of objects'}), 400)
+
+    max_batch = current_app.config.get('API_MAX_BATCH', 5000)
+    if len(records) > max_batch:
+        return None, (jsonify({'error': f'Batch too large: {len(records)} records (max {max_batch})'}), 413)
+    return records, None
+
+def score_batch(predictor, records, k=0):
+    """Validate + score the whole batch, with the k most similar sold houses if k > 0."""
+    with metrics.stage('api_score'):
+        X, ok, predictions, results = score_records(predictor, records)
+
+    if k > 0 and ml.comparables is not None and ok.any():
+        # One vectorized tree query for the whole batch
+        with metrics.stage('comparables'):
+            similar = iter(ml.comparables.lookup_many(X[ok], min(k, MAX_K)))
+        for result in results:
+            if 'prediction' in result:
+                result['comparables'] = next(similar)
+    return X, ok, predictions, results
+
+def history_rows(X, ok, predictions, version, user_id):
+    """History column values for every valid row of a scored batch."""
+    now = datetime.now()
+    return [
+        {'overall_qual': int(row[0]), 'gr_liv_area': int(row[1]), 'garage_cars': int(row[2]),
+         'total_bsmt_sf': int(row[3]), 'year_built': int(row[4]), 'prediction': float(pred),
+         'model_version': version, 'predicted_on': now, 'user_id': user_id}
+        for row, pred in zip(X[ok], predictions[ok])
+    ]
+
+def wants_save(args):
+    return args.get('save', '1').lower() not in ('0', 'false', 'no')
+
+@main.route('/api/predict', methods=['POST'])
 def api_predict():
-    if request.is_json:
-        # Placeholder for API logic
-        return jsonify({'status': 'API Working'}), 200
-    return jsonify({'error': 'Request must be JSON'}), 415
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-# [TEMPORARY FIX] Paste this at the bottom of routes.py
-@app.route('/fix_db')
-def fix_db():
-    from application import db
-    from application.models import User, History
-    
-    # 1. Create the tables
-    db.create_all()
-    
-    # 2. Check if it worked
-    try:
-        user_count = User.query.count()
-        return f"<h1>SUCCESS!</h1><p>Database tables created. Current users: {user_count}</p><p><a href='/register'>Go to Register</a></p>"
-    except Exception as e:
-        return f"<h1>Error</h1><p>{e}</p>"
\ No newline at end of file
+    """
+    Accepts ONE house object or a LIST of them (same fields as PredictionForm).
+    The whole batch is validated and scored at once; results come back in input order.
+    Add ?save=0 to skip writing History rows (only logged-in users get History anyway).
+    Add ?comparables=K to get the K most similar sold houses with every prediction.
+    """
+    if not request.is_json:
+        return jsonify({'error': 'Request must be JSON'}), 415
+
+    records, error = read_batch(request.get_json(silent=True))
+    if error:
+        return error
+
+    # One model for the whole batch, even if a new version is activated meanwhile
+    predictor = ml.model_manager.get()
+    if not predictor:
+        return jsonify({'error': 'AI Model not loaded'}), 503
+
+    X, ok, predictions, results = score_batch(predictor, records, request.args.get('comparables', 0, type=int))
+
+    saved = 0
+    if wants_save(request.args) and current_user.is_authenticated and ok.any():
+        entries = [History(**row) for row in history_rows(X, ok, predictions, predictor.version, current_user.id)]
+        with metrics.stage('history_write'):
+            saved = add_entries(entries)
+
+    return jsonify({
+        'count': len(records),
+        'valid': int(ok.sum()),
+        'saved': saved,
+        'results': results
+    }), 200
+
+@main.route('/api/predict/stream', methods=['POST'])
+def api_predict_stream():
+    """
+    Bulk scoring for very large files. The body is NDJSON (one house per line)
+    or CSV (Content-Type: text/csv, columns like AmesHousing_Cleaned.csv).
+    Rows are read and scored in chunks, and NDJSON results are streamed back
+    as they are ready, so memory stays flat no matter how big the upload is.
+    Nothing is written to History.
+    """
+    predictor = ml.model_manager.get()
+    if not predictor:
+        return jsonify({'error': 'AI Model not loaded'}), 503
+
+    fmt = request.args.get('format') or guess_format(None, request.content_type)
+    chunk_size = request.args.get('chunk_size', type=int) or current_app.config.get('SCORE_CHUNK_SIZE', 1000)
+    chunk_size = max(1, min(chunk_size, current_app.config.get('API_MAX_BATCH', 5000)))
+
+    stream = request.stream
+    lines = (line.decode('utf-8') for line in stream)
+    results = score_stream(predictor, iter_records(lines, fmt), chunk_size)
+
+    return Response(stream_with_context(ndjson_lines(results)), mimetype='application/x-ndjson')
+
+@main.route('/api/history/<int:id>/sale', methods=['POST'])
+def api_record_sale(id):
+    """
+    Record the price a predicted house actually sold for: {"sale_price": 215000}.
+    These labelled rows are what "flask models retrain" learns from.
+    """
+    if not current_user.is_authenticated:
+        return jsonify({'error': 'Login required'}), 401
+
+    payload = request.get_json(silent=True) or {}
+    price = payload.get('sale_price')
+    if isinstance(price, bool) or not isinstance(price, (int, float)) or not 0 < price < 1e9:
+        return jsonify({'error': 'sale_price must be a positive number'}), 400
+
+    entry = db.session.get(History, id)
+    # [SECURITY] Someone else's row looks the same as a missing one
+    if entry is None or entry.user_id != current_user.id:
+        return jsonify({'error': 'Entry not found'}), 404
+    if entry.sale_price is not None:
+        # Already (possibly) learned from, so it cannot be changed afterwards
+        return jsonify({'error': 'Sale price already recorded'}), 409
+
+    entry.sale_price = float(price)
+    entry.sale_recorded_on = datetime.utcnow()
+    entry.sale_learned = False
+    db.session.commit()
+    return jsonify({'id': entry.id, 'sale_price': entry.sale_price}), 200
+
+@main.route('/api/stats')
+@monitoring_only
+def api_stats():
+    # Per-worker counters, used to tune HISTORY_BATCH_SIZE / HISTORY_FLUSH_INTERVAL
+    return jsonify({
+        'history_writer': history_writer.stats(),
+        'prediction_cache': ml.prediction_cache.stats(),
+        'model': ml.model_manager.stats()
+    }), 200
+
+@main.route('/metrics')
+@monitoring_only
+def metrics_endpoint():
+    """
+    Prometheus scrape target: per-stage and per-endpoint latency histograms,
+    DB statement counts and the cache/pool counters of this worker.
+    """
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
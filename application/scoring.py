@@ -0,0 +1,97 @@
+import csv
+import json
+from itertools import islice
+from application.batch import FIELDS, score_records
+from application.predictor import FEATURES
+
+# --- CONFIGURATION ---
+DEFAULT_CHUNK_SIZE = 1000
+
+# CSV files can use either the form names (overall_qual) or the
+# dataset names (OverallQual, like AmesHousing_Cleaned.csv)
+CSV_ALIASES = dict(zip(FEATURES, FIELDS))
+
+
+# --- READERS ---
+# Each reader takes an iterable of text lines and yields one record (dict) at a time,
+# so nothing is ever read further ahead than the current line.
+def iter_ndjson(lines):
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            # Bad line -> None, which is reported as a per-row error
+            yield None
+
+
+def iter_csv(lines):
+    for row in csv.DictReader(lines):
+        record = {CSV_ALIASES.get(key, key): value for key, value in row.items()}
+        yield record
+
+
+def guess_format(name, content_type=None):
+    """Pick 'csv' or 'ndjson' from a filename and/or content type."""
+    if content_type and 'csv' in content_type:
+        return 'csv'
+    if name and name.lower().endswith('.csv'):
+        return 'csv'
+    return 'ndjson'
+
+
+def iter_records(lines, fmt):
+    return iter_csv(lines) if fmt == 'csv' else iter_ndjson(lines)
+
+
+# --- PIPELINE ---
+def chunked(iterable, size):
+    """Yield lists of at most `size` items without materializing the input."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def score_stream(predictor, records, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Score an iterable of records in fixed-size chunks.
+    Only one chunk is held in memory at a time. Yields result dicts in input order;
+    'index' is the position in the whole stream, and an 'id' field is echoed back if present.
+    """
+    offset = 0
+    for chunk in chunked(records, chunk_size):
+        _, _, _, results = score_records(predictor, chunk)
+
+        for record, result in zip(chunk, results):
+            result['index'] += offset
+            if record is None:
+                result['errors'] = {'record': 'Invalid JSON line'}
+            elif isinstance(record, dict) and 'id' in record:
+                result['id'] = record['id']
+            yield result
+
+        offset += len(chunk)
+
+
+def ndjson_lines(results):
+    for result in results:
+        yield json.dumps(result) + '\n'
+
+
+def score_file(predictor, src, dst, fmt='ndjson', chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Score every record from the text file object `src` and write NDJSON results to `dst`.
+    Returns (total_rows, valid_rows).
+    """
+    total, valid = 0, 0
+    for result in score_stream(predictor, iter_records(src, fmt), chunk_size):
+        dst.write(json.dumps(result) + '\n')
+        total += 1
+        if 'prediction' in result:
+            valid += 1
+    return total, valid
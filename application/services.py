@@ -0,0 +1,110 @@
+import os
+import threading
+from flask import current_app
+from werkzeug.local import LocalProxy
+from application.predictor import MODEL_FILE
+
+# Marks "not built yet" (comparables may legitimately be None when COMPARABLES_K=0)
+_UNSET = object()
+
+
+class ModelServices:
+    """
+    The prediction cache, the model manager and the comparables index.
+
+    Nothing is built when the app is created: each one is made from the app
+    config the first time a request (or CLI command) needs it, so importing the
+    app, running tests or a CLI command never unpickles a model it does not use.
+    preload() builds everything up front, on purpose: create_app() calls it when
+    PRELOAD_MODEL is set, and gunicorn.conf.py calls it in the master so forked
+    workers share the loaded model.
+    """
+
+    def __init__(self, app=None):
+        self.config = {}
+        self.instance_path = None
+        self._lock = threading.RLock()
+        self._reset()
+        if app is not None:
+            self.init_app(app)
+
+    def _reset(self):
+        self._prediction_cache = None
+        self._model_manager = None
+        self._comparables = _UNSET
+
+    def init_app(self, app):
+        app.extensions['ml'] = self
+        self.config = app.config
+        self.instance_path = app.instance_path
+        self._reset()
+
+    # --- PREDICTION CACHE ---
+    # Same 5 inputs -> same price, so repeated houses skip the model entirely.
+    # PREDICTION_CACHE_SHARED=True adds a SQLite file that all gunicorn workers share.
+    @property
+    def prediction_cache(self):
+        if self._prediction_cache is None:
+            with self._lock:
+                if self._prediction_cache is None:
+                    from application.cache import PredictionCache, SharedCacheBackend
+                    shared = None
+                    if self.config.get('PREDICTION_CACHE_SHARED'):
+                        shared = SharedCacheBackend(self.config.get('PREDICTION_CACHE_PATH')
+                                                    or os.path.join(self.instance_path, 'prediction_cache.db'))
+                    self._prediction_cache = PredictionCache(maxsize=self.config.get('PREDICTION_CACHE_SIZE', 10000),
+                                                             ttl=self.config.get('PREDICTION_CACHE_TTL', 3600),
+                                                             shared=shared)
+        return self._prediction_cache
+
+    # --- AI MODEL ---
+    # The active version from the model registry (models/ACTIVE), or housing_model.pkl
+    # if nothing has been published yet. The predictor keeps the coefficients as a NumPy
+    # array, so a request never has to build a pandas DataFrame or go through sklearn.
+    # Workers notice a newly activated version within MODEL_RELOAD_INTERVAL seconds
+    # and swap it in without a restart.
+    @property
+    def model_manager(self):
+        if self._model_manager is None:
+            with self._lock:
+                if self._model_manager is None:
+                    from application.registry import ModelRegistry, ModelManager
+                    cache_size = self.config.get('PREDICTION_CACHE_SIZE', 10000)
+                    self._model_manager = ModelManager(
+                        ModelRegistry(self.config.get('MODEL_REGISTRY_DIR', 'models'),
+                                      mmap=self.config.get('MODEL_MMAP', True)),
+                        legacy_path=MODEL_FILE,
+                        cache=self.prediction_cache if cache_size > 0 else None,
+                        check_interval=self.config.get('MODEL_RELOAD_INTERVAL', 5.0)
+                    )
+        return self._model_manager
+
+    # --- COMPARABLE SALES ---
+    # KD-tree over the houses in AmesHousing_Cleaned.csv, loaded from housing_comparables.pkl
+    # (built and saved on first use, or again whenever the CSV changes). None if COMPARABLES_K=0.
+    @property
+    def comparables(self):
+        if self._comparables is _UNSET:
+            with self._lock:
+                if self._comparables is _UNSET:
+                    from application.comparables import load_comparables, DEFAULT_K
+                    self._comparables = (load_comparables() if self.config.get('COMPARABLES_K', DEFAULT_K) > 0
+                                         else None)
+        return self._comparables
+
+    def preload(self):
+        """Load the model and the comparables index now instead of on the first request."""
+        self.model_manager.get()
+        self.comparables
+
+    # --- STATS (exported on /metrics, see create_app) ---
+    # A scrape reports what has been built so far; it never loads anything itself.
+    def cache_stats(self):
+        return self._prediction_cache.stats() if self._prediction_cache is not None else {}
+
+    def model_stats(self):
+        return self._model_manager.stats() if self._model_manager is not None else {}
+
+
+# The current app's services (create_app() gives every app its own)
+ml = LocalProxy(lambda: current_app.extensions['ml'])
@@ -0,0 +1,303 @@
+from datetime import datetime
+from sqlalchemy import case, delete, func, insert, select
+from application.models import History, UserStats, QualityStats
+
+# --- INCREMENTAL UPDATES ---
+# Every write path to History also updates the user's UserStats row and the
+# QualityStats row of the house's overall_qual, in the same transaction:
+#   add:    count/total/min/max(/last) are merged in with one upsert per table per batch
+#   remove: count/total are decremented; min/max/last are looked up again only if
+#           the removed row was one of them (index seeks, never a scan)
+#   delete account: the rows go with the user
+# Anything that still drifts (rows written by other tools, float rounding after
+# many deletes) is fixed by rebuild() / "flask rebuild-stats".
+
+EMPTY = {'count': 0, 'mean': None, 'min': None, 'max': None,
+         'last_prediction': None, 'last_predicted_on': None, 'updated_on': None}
+
+
+def added_params(rows):
+    """One parameter set per user for the upsert: the batch's totals for that user."""
+    users, now = {}, datetime.utcnow()
+    for row in rows:
+        price = row['prediction']
+        when = row.get('predicted_on') or datetime.now()
+        p = users.get(row['user_id'])
+        if p is None:
+            users[row['user_id']] = {'user_id': row['user_id'], 'prediction_count': 1, 'prediction_total': price,
+                                     'prediction_min': price, 'prediction_max': price,
+                                     'last_prediction': price, 'last_predicted_on': when, 'updated_on': now}
+            continue
+        p['prediction_count'] += 1
+        p['prediction_total'] += price
+        p['prediction_min'] = min(p['prediction_min'], price)
+        p['prediction_max'] = max(p['prediction_max'], price)
+        if when >= p['last_predicted_on']:
+            p['last_prediction'], p['last_predicted_on'] = price, when
+    return list(users.values())
+
+
+def quality_params(rows):
+    """One parameter set per (user, overall_qual) for the QualityStats upsert."""
+    buckets = {}
+    for row in rows:
+        key = (row['user_id'], row['overall_qual'])
+        price = row['prediction']
+        p = buckets.get(key)
+        if p is None:
+            buckets[key] = {'user_id': key[0], 'overall_qual': key[1], 'prediction_count': 1,
+                            'prediction_total': price, 'prediction_min': price, 'prediction_max': price}
+            continue
+        p['prediction_count'] += 1
+        p['prediction_total'] += price
+        p['prediction_min'] = min(p['prediction_min'], price)
+        p['prediction_max'] = max(p['prediction_max'], price)
+    return list(buckets.values())
+
+
+def _dialect_insert(dialect_name):
+    if dialect_name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as upsert
+    elif dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as upsert
+    else:
+        return None
+    return upsert
+
+
+def _merged_totals(old, new):
+    """SET clause adding a batch's count/total/min/max to the stored ones."""
+    return {
+        'prediction_count': old.prediction_count + new.prediction_count,
+        'prediction_total': old.prediction_total + new.prediction_total,
+        'prediction_min': case((old.prediction_min.is_(None) | (new.prediction_min < old.prediction_min),
+                                new.prediction_min), else_=old.prediction_min),
+        'prediction_max': case((old.prediction_max.is_(None) | (new.prediction_max > old.prediction_max),
+                                new.prediction_max), else_=old.prediction_max),
+    }
+
+
+def upsert_statement(dialect_name):
+    """
+    INSERT ... ON CONFLICT (user_id) DO UPDATE that adds a batch to the stored totals
+    in the database itself, so concurrent writers never overwrite each other.
+    None for databases without ON CONFLICT (record_added() then merges in Python under a row lock).
+    """
+    upsert = _dialect_insert(dialect_name)
+    if upsert is None:
+        return None
+    stmt = upsert(UserStats)
+    old, new = UserStats, stmt.excluded
+    newer = (old.last_predicted_on.is_(None)) | (new.last_predicted_on >= old.last_predicted_on)
+    return stmt.on_conflict_do_update(index_elements=[UserStats.user_id], set_=dict(
+        _merged_totals(old, new),
+        last_prediction=case((newer, new.last_prediction), else_=old.last_prediction),
+        last_predicted_on=case((newer, new.last_predicted_on), else_=old.last_predicted_on),
+        updated_on=new.updated_on,
+    ))
+
+
+def quality_upsert_statement(dialect_name):
+    """Same as upsert_statement() for the per-quality rows."""
+    upsert = _dialect_insert(dialect_name)
+    if upsert is None:
+        return None
+    stmt = upsert(QualityStats)
+    return stmt.on_conflict_do_update(index_elements=[QualityStats.user_id, QualityStats.overall_qual],
+                                      set_=_merged_totals(QualityStats, stmt.excluded))
+
+
+def added_statements(dialect_name, rows):
+    """
+    The (statement, parameters) pairs that add History rows (dicts of column values)
+    to the stored stats, for a session or a (sync or async) connection.
+    None for databases without ON CONFLICT.
+    """
+    if _dialect_insert(dialect_name) is None:
+        return None
+    return [(upsert_statement(dialect_name), added_params(rows)),
+            (quality_upsert_statement(dialect_name), quality_params(rows))]
+
+
+def record_added(session, rows):
+    """Add History rows (dicts of column values) to their users' stats. Call before the commit."""
+    if not rows:
+        return
+    statements = added_statements(session.get_bind().dialect.name, rows)
+    if statements is not None:
+        for stmt, params in statements:
+            session.execute(stmt, params)
+        return
+    for p in added_params(rows):
+        stats = session.get(UserStats, p['user_id'], with_for_update=True)
+        if stats is None:
+            session.add(UserStats(**p))
+            continue
+        _merge_totals(stats, p)
+        if stats.last_predicted_on is None or p['last_predicted_on'] >= stats.last_predicted_on:
+            stats.last_prediction, stats.last_predicted_on = p['last_prediction'], p['last_predicted_on']
+        stats.updated_on = p['updated_on']
+    for p in quality_params(rows):
+        bucket = session.get(QualityStats, (p['user_id'], p['overall_qual']), with_for_update=True)
+        if bucket is None:
+            session.add(QualityStats(**p))
+        else:
+            _merge_totals(bucket, p)
+
+
+def _merge_totals(stats, p):
+    stats.prediction_count += p['prediction_count']
+    stats.prediction_total += p['prediction_total']
+    stats.prediction_min = min(x for x in (stats.prediction_min, p['prediction_min']) if x is not None)
+    stats.prediction_max = max(x for x in (stats.prediction_max, p['prediction_max']) if x is not None)
+
+
+def record_removed(session, entry):
+    """Take one History row (about to be or just deleted, same transaction) out of its user's stats."""
+    stats = session.get(UserStats, entry.user_id)
+    if stats is None:
+        return
+    stats.prediction_count = UserStats.prediction_count - 1
+    stats.prediction_total = UserStats.prediction_total - entry.prediction
+    stats.updated_on = datetime.utcnow()
+    stale = (entry.prediction in (stats.prediction_min, stats.prediction_max)
+             or entry.predicted_on == stats.last_predicted_on)
+
+    bucket = session.get(QualityStats, (entry.user_id, entry.overall_qual))
+    if bucket is not None:
+        bucket_stale = entry.prediction in (bucket.prediction_min, bucket.prediction_max)
+        bucket.prediction_count = QualityStats.prediction_count - 1
+        bucket.prediction_total = QualityStats.prediction_total - entry.prediction
+
+    session.flush()  # runs the DELETE of the entry and the decrements above
+    if stale:
+        refresh_extremes(session, stats)
+    if bucket is not None:
+        if bucket.prediction_count <= 0:
+            session.delete(bucket)  # the last house of that quality
+        elif bucket_stale:
+            refresh_bucket(session, bucket)
+
+
+def refresh_extremes(session, stats):
+    """Look up min, max and last again for one user (three index seeks)."""
+    mine = History.user_id == stats.user_id
+    stats.prediction_min = session.scalar(select(func.min(History.prediction)).where(mine))
+    stats.prediction_max = session.scalar(select(func.max(History.prediction)).where(mine))
+    last = session.execute(select(History.prediction, History.predicted_on).where(mine)
+                           .order_by(History.predicted_on.desc(), History.id.desc()).limit(1)).first()
+    stats.last_prediction, stats.last_predicted_on = last if last else (None, None)
+
+
+def refresh_bucket(session, bucket):
+    """Look up min and max of one user's houses of one quality (two seeks on ix_history_user_qual_prediction)."""
+    mine = (History.user_id == bucket.user_id) & (History.overall_qual == bucket.overall_qual)
+    bucket.prediction_min = session.scalar(select(func.min(History.prediction)).where(mine))
+    bucket.prediction_max = session.scalar(select(func.max(History.prediction)).where(mine))
+
+
+def forget_user(session, user_id):
+    """Drop a user's stats (their account is being deleted)."""
+    session.execute(delete(UserStats).where(UserStats.user_id == user_id))
+    session.execute(delete(QualityStats).where(QualityStats.user_id == user_id))
+
+
+# --- READING ---
+def totals_from_row(row):
+    """Template-ready totals from a UserStats row (or None: no predictions yet)."""
+    if row is None or not row.prediction_count:
+        return dict(EMPTY, updated_on=row.updated_on if row is not None else None)
+    return {'count': row.prediction_count, 'mean': row.prediction_total / row.prediction_count,
+            'min': row.prediction_min, 'max': row.prediction_max,
+            'last_prediction': row.last_prediction, 'last_predicted_on': row.last_predicted_on,
+            'updated_on': row.updated_on}
+
+
+def user_totals(session, user_id):
+    """count / mean / min / max / last prediction of one user: one primary-key lookup."""
+    return totals_from_row(session.get(UserStats, user_id))
+
+
+def buckets_query(user_id):
+    """
+    (overall_qual, count, mean, min, max) per quality of one user, like the GROUP BY
+    of history_query.summary_queries() but from QualityStats: one primary-key range scan.
+    """
+    q = QualityStats
+    return (select(q.overall_qual, q.prediction_count, q.prediction_total / q.prediction_count,
+                   q.prediction_min, q.prediction_max)
+            .where(q.user_id == user_id, q.prediction_count > 0).order_by(q.overall_qual))
+
+
+def user_buckets(session, user_id):
+    return session.execute(buckets_query(user_id)).all()
+
+
+# --- REBUILD ---
+def computed_stats(user_id=None):
+    """The stats every user (or just `user_id`) should have, computed from History."""
+    aggregates = select(History.user_id, func.count().label('prediction_count'),
+                        func.sum(History.prediction).label('prediction_total'),
+                        func.min(History.prediction).label('prediction_min'),
+                        func.max(History.prediction).label('prediction_max')).group_by(History.user_id)
+    if user_id is not None:
+        aggregates = aggregates.where(History.user_id == user_id)
+    aggregates = aggregates.subquery()
+
+    latest = (select(History.prediction, History.predicted_on)
+              .where(History.user_id == aggregates.c.user_id)
+              .order_by(History.predicted_on.desc(), History.id.desc()).limit(1))
+    return select(aggregates,
+                  latest.with_only_columns(History.prediction).scalar_subquery().label('last_prediction'),
+                  latest.with_only_columns(History.predicted_on).scalar_subquery().label('last_predicted_on'))
+
+
+def computed_quality_stats(user_id=None):
+    """The QualityStats rows every user (or just `user_id`) should have."""
+    stmt = select(History.user_id, History.overall_qual, func.count().label('prediction_count'),
+                  func.sum(History.prediction).label('prediction_total'),
+                  func.min(History.prediction).label('prediction_min'),
+                  func.max(History.prediction).label('prediction_max')
+                  ).group_by(History.user_id, History.overall_qual)
+    if user_id is not None:
+        stmt = stmt.where(History.user_id == user_id)
+    return stmt
+
+
+def rebuild(session, user_id=None, tolerance=1e-6):
+    """
+    Recompute the stats from History and replace the stored rows.
+    Returns (users with stats, users whose stored stats were wrong or missing). Does not commit.
+    """
+    now = datetime.utcnow()
+    users, drifted = 0, set()
+    for model, computed, key in ((UserStats, computed_stats, ('user_id',)),
+                                 (QualityStats, computed_quality_stats, ('user_id', 'overall_qual'))):
+        expected = {tuple(getattr(row, k) for k in key): row._asdict() for row in session.execute(computed(user_id))}
+        stored = select(model)
+        if user_id is not None:
+            stored = stored.where(model.user_id == user_id)
+        current = {tuple(getattr(row, k) for k in key): row for row in session.execute(stored).scalars()}
+        if model is UserStats:
+            users = len(expected)
+
+        for pk in expected.keys() | current.keys():
+            want, have = expected.get(pk), current.get(pk)
+            if want is None or have is None or any(
+                    _differs(getattr(have, name), value, tolerance) for name, value in want.items()):
+                drifted.add(pk[0])
+
+        wipe = delete(model)
+        if user_id is not None:
+            wipe = wipe.where(model.user_id == user_id)
+        session.execute(wipe)
+        if expected:
+            rows = [dict(row, updated_on=now) if model is UserStats else row for row in expected.values()]
+            session.execute(insert(model), rows)
+    return users, len(drifted)
+
+
+def _differs(have, want, tolerance):
+    if isinstance(want, float) and isinstance(have, float):
+        return abs(have - want) > tolerance * max(1.0, abs(want))
+    return have != want
@@ -0,0 +1,212 @@
+import atexit
+import threading
+import time
+from flask import current_app
+from sqlalchemy import insert
+from werkzeug.local import LocalProxy
+
+# --- DURABILITY MODES ---
+# sync    -> commit every prediction before the response is sent (original behaviour)
+# batched -> queue rows in memory, a background thread bulk-inserts them by size or time
+# off     -> do not store predictions at all
+MODES = ('sync', 'batched', 'off')
+
+# Columns copied from a History object into a bulk INSERT row
+HISTORY_COLUMNS = ('predicted_on', 'overall_qual', 'gr_liv_area', 'garage_cars',
+                   'total_bsmt_sf', 'year_built', 'prediction', 'model_version', 'user_id')
+
+
+class HistoryWriter:
+    """
+    Write-behind buffer for History rows.
+    In 'batched' mode a request only appends to a list; the rows are written with
+    one executemany INSERT + one commit per flush instead of one commit per prediction.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.mode = 'sync'
+        self.batch_size = 200
+        self.flush_interval = 1.0
+
+        self._buffer = []
+        self._lock = threading.Lock()        # protects _buffer and counters
+        self._flush_lock = threading.Lock()  # only one flush at a time
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = None
+        self._close_at_exit = False
+
+        self.counters = {
+            'enqueued': 0,
+            'written': 0,
+            'dropped': 0,
+            'failed': 0,
+            'flushes': 0,
+            'flush_seconds_total': 0.0,
+            'flush_seconds_last': 0.0,
+            'flush_seconds_max': 0.0,
+        }
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['history_writer'] = self
+        self.mode = app.config.get('HISTORY_WRITE_MODE', 'sync')
+        self.batch_size = int(app.config.get('HISTORY_BATCH_SIZE', 200))
+        self.flush_interval = float(app.config.get('HISTORY_FLUSH_INTERVAL', 1.0))
+
+        if self.mode not in MODES:
+            raise ValueError(f"HISTORY_WRITE_MODE must be one of {MODES}, got {self.mode!r}")
+
+        # Never lose queued rows on a clean shutdown (gunicorn worker exit, Ctrl+C).
+        # Once per writer, however often init_app() runs.
+        if not self._close_at_exit:
+            atexit.register(self.close)
+            self._close_at_exit = True
+
+    # --- WRITING ---
+    def submit(self, entries):
+        """
+        Store a list of History objects according to the durability mode.
+        Returns the number of rows accepted (written or queued).
+        """
+        if self.mode == 'off':
+            with self._lock:
+                self.counters['dropped'] += len(entries)
+            return 0
+
+        if self.mode == 'sync':
+            from application import db
+            from application.userstats import record_added
+            db.session.add_all(entries)
+            record_added(db.session, [{col: getattr(entry, col) for col in HISTORY_COLUMNS} for entry in entries])
+            db.session.commit()
+            with self._lock:
+                self.counters['written'] += len(entries)
+            return len(entries)
+
+        return self.enqueue([{col: getattr(entry, col) for col in HISTORY_COLUMNS} for entry in entries])
+
+    def enqueue(self, rows):
+        """Queue row dicts (HISTORY_COLUMNS keys) for the background thread. Returns the number queued."""
+        with self._lock:
+            self._buffer.extend(rows)
+            depth = len(self._buffer)
+            self.counters['enqueued'] += len(rows)
+
+        self._ensure_thread()
+        if depth >= self.batch_size:
+            self._wakeup.set()
+        return len(rows)
+
+    def flush(self, user_id=None):
+        """
+        Write everything currently queued in one bulk INSERT. Returns rows written.
+        With `user_id`, only that user's queued rows are written (a page view should
+        not pay for everyone's batch); the others stay queued for the background thread.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if user_id is None:
+                    rows, self._buffer = self._buffer, []
+                else:
+                    rows = [row for row in self._buffer if row['user_id'] == user_id]
+                    if rows:
+                        self._buffer = [row for row in self._buffer if row['user_id'] != user_id]
+            if not rows:
+                return 0
+
+            from application import db
+
+            start = time.perf_counter()
+            with self.app.app_context():
+                try:
+                    written = self._write(db.session, rows)
+                finally:
+                    db.session.remove()
+            elapsed = time.perf_counter() - start
+
+            with self._lock:
+                self.counters['written'] += written
+                self.counters['failed'] += len(rows) - written
+                self.counters['flushes'] += 1
+                self.counters['flush_seconds_total'] += elapsed
+                self.counters['flush_seconds_last'] = elapsed
+                self.counters['flush_seconds_max'] = max(self.counters['flush_seconds_max'], elapsed)
+            return written
+
+    def _write(self, session, rows):
+        """One bulk INSERT; if it fails, insert row by row so only the bad rows are lost."""
+        from application.models import History
+        from application.userstats import record_added
+
+        try:
+            session.execute(insert(History), rows)
+            record_added(session, rows)
+            session.commit()
+            return len(rows)
+        except Exception as error:
+            session.rollback()
+            if len(rows) == 1:
+                self.app.logger.error(f"History flush failed, 1 row lost: {error}")
+                return 0
+            self.app.logger.warning(f"History bulk insert of {len(rows)} rows failed, retrying one by one: {error}")
+
+        written = 0
+        for row in rows:
+            try:
+                session.execute(insert(History), [row])
+                record_added(session, [row])
+                session.commit()
+                written += 1
+            except Exception as error:
+                session.rollback()
+                self.app.logger.error(f"History row of user {row['user_id']} lost: {error}")
+        return written
+
+    def close(self):
+        """Stop the background thread and flush whatever is left."""
+        self._stopped = True
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        if self.app is not None:
+            self.flush()
+
+    # --- STATS ---
+    def queue_depth(self):
+        return len(self._buffer)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        stats['mode'] = self.mode
+        stats['queue_depth'] = self.queue_depth()
+        flushes = stats['flushes']
+        stats['flush_seconds_avg'] = stats['flush_seconds_total'] / flushes if flushes else 0.0
+        return stats
+
+    # --- BACKGROUND FLUSHER ---
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._stopped = False
+                    self._thread = threading.Thread(target=self._run, name='history-writer', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while not self._stopped:
+            # Wake up when the batch is full, or every flush_interval seconds
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if self._stopped:
+                break
+            self.flush()
+
+
+# The current app's writer (create_app() gives every app its own)
+history_writer = LocalProxy(lambda: current_app.extensions['history_writer'])
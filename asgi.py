@@ -0,0 +1,5 @@
+# ASGI entry point (async /predict, /api/predict and /history)
+# Run with: uvicorn asgi:app
+from application.asgi import create_asgi_app
+
+app = create_asgi_app()
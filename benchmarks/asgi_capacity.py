@@ -0,0 +1,189 @@
+"""
+Concurrent-connection capacity: the WSGI path vs the ASGI mode.
+
+--slow clients each open a connection to /api/predict and upload their body
+over --upload seconds (a phone on a bad network), over and over. Meanwhile a
+probe sends normal /api/predict requests one after another and records their
+latency. Servers, each in its own forked process on a fresh SQLite file:
+  wsgi  -> the Flask app on a WSGI server with --threads request threads
+           (like one gunicorn gthread worker: a slow upload holds a thread)
+  asgi  -> asgi:app on uvicorn, one worker (the upload is read on the event loop)
+
+Run from the project root (needs uvicorn + aiosqlite):
+    python -m benchmarks.asgi_capacity --slow 8,64,256 --seconds 10
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing as mp
+import os
+import socket
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.report import summarize
+
+HOUSE = json.dumps({'overall_qual': 7, 'gr_liv_area': 1500, 'garage_cars': 2,
+                    'total_bsmt_sf': 1000, 'year_built': 2000}).encode()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def serve(mode, port, threads, db_path, ready):
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    from application import create_app, db
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+
+    if mode == 'asgi':
+        import uvicorn
+        from application.asgi import create_asgi_app
+        config = uvicorn.Config(create_asgi_app(app), host='127.0.0.1', port=port, log_level='warning',
+                                backlog=4096, timeout_keep_alive=60)
+        server = uvicorn.Server(config)
+        ready.set()
+        server.run()
+        return
+
+    from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    class PooledWSGIServer(BaseWSGIServer):
+        """A fixed number of request threads; further connections wait in line."""
+        request_queue_size = 4096
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.pool = ThreadPoolExecutor(max_workers=threads)
+
+        def process_request(self, request, client_address):
+            self.pool.submit(self._handle, request, client_address)
+
+        def _handle(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    server = PooledWSGIServer('127.0.0.1', port, app, handler=QuietHandler)
+    ready.set()
+    server.serve_forever()
+
+
+async def post(port, body, upload_seconds=0.0):
+    """One POST /api/predict?save=0 on a new connection; the body trickles in over upload_seconds."""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        writer.write(b'POST /api/predict?save=0 HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n'
+                     b'Content-Type: application/json\r\nContent-Length: ' + str(len(body)).encode() + b'\r\n\r\n')
+        if upload_seconds:
+            pieces = 10
+            step = max(1, len(body) // pieces)
+            for i in range(0, len(body), step):
+                writer.write(body[i:i + step])
+                await writer.drain()
+                await asyncio.sleep(upload_seconds / pieces)
+        else:
+            writer.write(body)
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        await reader.read()
+        return status
+    finally:
+        writer.close()
+
+
+async def load(port, args, slow):
+    stop = asyncio.Event()
+    slow_done = {'ok': 0, 'failed': 0}
+
+    async def slow_client():
+        while not stop.is_set():
+            try:
+                ok = await post(port, HOUSE, args.upload) == 200
+            except (OSError, ValueError, IndexError):
+                ok = False
+            slow_done['ok' if ok else 'failed'] += 1
+
+    clients = [asyncio.create_task(slow_client()) for _ in range(slow)]
+    await asyncio.sleep(args.upload)  # let every slow connection get going
+
+    latencies, failed = [], 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < args.seconds:
+        t0 = time.perf_counter()
+        try:
+            if await asyncio.wait_for(post(port, HOUSE), timeout=args.timeout) != 200:
+                failed += 1
+        except (asyncio.TimeoutError, OSError, ValueError, IndexError):
+            failed += 1
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await asyncio.wait(clients, timeout=args.upload + args.timeout)
+    for task in clients:
+        task.cancel()
+    return dict(summarize(latencies, elapsed), probe_failed=failed,
+                slow_ok=slow_done['ok'], slow_failed=slow_done['failed'])
+
+
+def run(mode, slow, args):
+    ctx = mp.get_context('fork')
+    with tempfile.TemporaryDirectory() as tmp:
+        port, ready = free_port(), ctx.Event()
+        proc = ctx.Process(target=serve, args=(mode, port, args.threads, os.path.join(tmp, 'bench.db'), ready),
+                           daemon=True)
+        proc.start()
+        ready.wait(60)
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        try:
+            result = asyncio.run(load(port, args, slow))
+        finally:
+            proc.terminate()
+            proc.join()
+    return dict(result, name=f'{mode} slow={slow}', mode=mode, slow=slow)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--slow', default='8,64,256', help="Numbers of slow uploading clients to try")
+    parser.add_argument('--upload', type=float, default=2.0, help="Seconds each slow client takes to upload")
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--threads', type=int, default=8, help="Request threads of the WSGI server")
+    parser.add_argument('--timeout', type=float, default=10.0, help="Probe requests slower than this count as failed")
+    parser.add_argument('--json', action='store_true', help="Print JSON instead of a table")
+    args = parser.parse_args()
+
+    results = [run(mode, int(slow), args) for slow in args.slow.split(',') for mode in ('wsgi', 'asgi')]
+
+    if args.json:
+        print(json.dumps({'upload_seconds': args.upload, 'threads': args.threads, 'results': results}, indent=2))
+        return
+
+    print(f"probe latency with slow clients uploading over {args.upload:g}s, WSGI threads: {args.threads}")
+    print(f"{'server':<20}{'probes':>8}{'failed':>8}{'p50 (ms)':>10}{'p99 (ms)':>10}{'slow ok':>10}")
+    for r in results:
+        print(f"{r['name']:<20}{r['requests']:>8}{r['probe_failed']:>8}{r['p50_ms']:>10.1f}{r['p99_ms']:>10.1f}"
+              f"{r['slow_ok']:>10}")
+
+
+if __name__ == '__main__':
+    main()
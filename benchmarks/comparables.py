@@ -0,0 +1,76 @@
+"""
+Comparable-sales lookup latency as the reference set grows.
+
+Builds the KD-tree over N synthetic houses (same ranges as the form) and
+times single lookups (what /predict does) and one vectorized batch query
+(what /api/predict?comparables=K does), next to a brute-force NumPy scan.
+
+Run from the project root:
+    python -m benchmarks.comparables --sizes 10000 100000 1000000
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from application.comparables import ComparablesIndex
+
+
+def houses(n, rng):
+    return np.column_stack([rng.integers(1, 11, n), rng.integers(300, 5000, n), rng.integers(0, 5, n),
+                            rng.integers(0, 3000, n), rng.integers(1872, 2011, n)]).astype(np.float64)
+
+
+def run_size(n, k, queries, rng):
+    X = houses(n, rng)
+    start = time.perf_counter()
+    index = ComparablesIndex(X, {'sale_price': rng.integers(30000, 700000, n)})
+    build = time.perf_counter() - start
+
+    Q = houses(queries, rng)
+    start = time.perf_counter()
+    for row in Q:
+        index.query(row[None, :], k)
+    single = (time.perf_counter() - start) / queries
+
+    start = time.perf_counter()
+    index.query(Q, k)
+    batch = (time.perf_counter() - start) / queries
+
+    # What a scan per request would cost (only a few rows, it is slow)
+    Z = (X - index.mean) / index.scale
+    start = time.perf_counter()
+    for row in Q[:5]:
+        d = (((row - index.mean) / index.scale - Z) ** 2).sum(axis=1)
+        np.argpartition(d, k)[:k]
+    brute = (time.perf_counter() - start) / 5
+
+    return {'rows': n, 'build_s': build, 'lookup_us': single * 1e6,
+            'batch_us_per_row': batch * 1e6, 'brute_force_us': brute * 1e6}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('-k', type=int, default=5)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--json', action='store_true', help="Print JSON instead of a table")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    results = [run_size(n, args.k, args.queries, rng) for n in args.sizes]
+
+    if args.json:
+        print(json.dumps({'k': args.k, 'results': results}, indent=2))
+        return
+
+    print(f"k={args.k}, {args.queries} queries per size")
+    print(f"{'rows':>10}{'build (s)':>12}{'lookup (us)':>14}{'batch (us/row)':>17}{'brute force (us)':>19}")
+    for r in results:
+        print(f"{r['rows']:>10}{r['build_s']:>12.2f}{r['lookup_us']:>14.1f}"
+              f"{r['batch_us_per_row']:>17.1f}{r['brute_force_us']:>19.0f}")
+
+
+if __name__ == '__main__':
+    main()
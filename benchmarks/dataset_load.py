@@ -0,0 +1,102 @@
+"""
+Load time and memory of the training data: pd.read_csv vs the columnar cache.
+
+Every mode runs in a fresh forked process, so one mode's pages and allocator
+state never leak into the next measurement:
+  read_csv        -> pd.read_csv(path), the old behaviour
+  read_csv_cols   -> pd.read_csv(path, usecols=...) for the 6 training columns
+  cache_build     -> first load_frame(): parses the CSV once and writes the cache
+  cache_all       -> load_frame() of every column from an existing cache
+  cache_cols      -> load_frame() of the 6 training columns only
+
+--scale N concatenates the CSV N times, to see how it grows with bigger
+(regional) datasets.
+
+Run from the project root:
+    python -m benchmarks.dataset_load --scale 20
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+from benchmarks.model_memory import memory_kb
+from data_loader import load_frame
+
+DATA_FILE = 'AmesHousing_Cleaned.csv'
+COLUMNS = ['OverallQual', 'GrLivArea', 'GarageCars', 'TotalBsmtSF', 'YearBuilt', 'SalePrice']
+MODES = ['read_csv', 'read_csv_cols', 'cache_build', 'cache_all', 'cache_cols']
+
+
+def load(mode, path, cache_dir):
+    if mode == 'read_csv':
+        return pd.read_csv(path)
+    if mode == 'read_csv_cols':
+        return pd.read_csv(path, usecols=COLUMNS)
+    columns = COLUMNS if mode == 'cache_cols' else None
+    return load_frame(path, columns=columns, cache_dir=cache_dir)
+
+
+def worker(mode, path, cache_dir, results):
+    rss_before = memory_kb()[0]
+    tracemalloc.start()
+    start = time.perf_counter()
+    df = load(mode, path, cache_dir)
+    df[[c for c in COLUMNS if c in df]].to_numpy(dtype=float)  # what training does with it
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    results.put({'mode': mode, 'seconds': elapsed, 'rows': len(df), 'columns': df.shape[1],
+                 'peak_alloc_mb': peak / 1e6, 'rss_growth_mb': (memory_kb()[0] - rss_before) / 1024})
+
+
+def run_mode(mode, path, cache_dir, repeat):
+    ctx = mp.get_context('fork')
+    runs = []
+    for _ in range(repeat):
+        if mode == 'cache_build':
+            shutil.rmtree(cache_dir, ignore_errors=True)
+        results = ctx.Queue()
+        proc = ctx.Process(target=worker, args=(mode, path, cache_dir, results))
+        proc.start()
+        runs.append(results.get(timeout=600))
+        proc.join()
+    best = min(runs, key=lambda r: r['seconds'])
+    best['ms'] = 1000 * best.pop('seconds')
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, default=1, help="Concatenate the CSV this many times")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per mode (best is reported)")
+    parser.add_argument('--json', action='store_true', help="Print JSON instead of a table")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'data.csv')
+        df = pd.read_csv(DATA_FILE)
+        pd.concat([df] * args.scale, ignore_index=True).to_csv(path, index=False)
+        size = os.path.getsize(path)
+        cache_dir = os.path.join(tmp, 'cache')
+
+        results = [run_mode(mode, path, cache_dir, args.repeat) for mode in MODES]
+
+    if args.json:
+        print(json.dumps({'csv_mb': size / 1e6, 'scale': args.scale, 'results': results}, indent=2))
+        return
+
+    print(f"CSV: {size / 1e6:.1f} MB, {results[0]['rows']} rows x {results[0]['columns']} columns")
+    print(f"{'mode':<16}{'load (ms)':>12}{'peak alloc (MB)':>18}{'RSS growth (MB)':>18}")
+    for r in results:
+        print(f"{r['mode']:<16}{r['ms']:>12.1f}{r['peak_alloc_mb']:>18.1f}{r['rss_growth_mb']:>18.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Sustained concurrent write throughput of the database profiles (DB_PROFILE).
+
+--writers threads each run, for --seconds, transactions that read the History
+count and insert one History row (the shape of a saved prediction), on their
+own pooled connection. Every profile gets a fresh SQLite file; "database is
+locked" and other errors are counted, not raised.
+
+Run from the project root:
+    python -m benchmarks.db_write --writers 1,4,16 --seconds 5
+    python -m benchmarks.db_write --profiles none,sqlite-wal --out db-new.json
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine, insert, func, select
+
+from benchmarks.report import summarize, environment, dumps, save, print_table
+
+PROFILES = ('none', 'sqlite-wal', 'sqlite-durable')
+ROW = {'overall_qual': 7, 'gr_liv_area': 1500, 'garage_cars': 2, 'total_bsmt_sf': 1000,
+       'year_built': 2000, 'prediction': 200000.0, 'user_id': 1}
+
+
+def run(profile, writers, seconds, tmp):
+    from application import db, dbprofile
+    from application.models import History
+
+    url = f"sqlite:///{os.path.join(tmp, f'{profile}-{writers}.db')}"
+    _, settings = dbprofile.resolve(profile, url)
+    engine = create_engine(url, **dbprofile.engine_options(settings))
+    dbprofile.install_pragmas(engine, settings)
+    db.metadata.create_all(engine)
+    table = History.__table__
+
+    latencies, errors, lock = [], [0], threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def writer():
+        mine, failed = [], 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                with engine.begin() as conn:
+                    conn.execute(select(func.count()).select_from(table)).scalar()
+                    conn.execute(insert(table), ROW)
+                mine.append(time.perf_counter() - start)
+            except Exception:
+                failed += 1
+        with lock:
+            latencies.extend(mine)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=writer) for _ in range(writers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    engine.dispose()
+    return dict(summarize(latencies, elapsed), name=f'{profile} writers={writers}', errors=errors[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profiles', default=','.join(PROFILES), help="DB_PROFILE names to compare")
+    parser.add_argument('--writers', default='1,4,16', help="Numbers of concurrent writer threads")
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--out', help="Save the results to this JSON file")
+    parser.add_argument('--json', action='store_true', help="Print JSON instead of a table")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = [run(profile, int(writers), args.seconds, tmp)
+                   for writers in args.writers.split(',') for profile in args.profiles.split(',')]
+
+    payload = {'suite': 'db_write', 'environment': environment(), 'results': results}
+    if args.out:
+        save(args.out, payload)
+    if args.json:
+        print(dumps(payload))
+        return
+    print_table(results)
+    for r in results:
+        if r['errors']:
+            print(f"{r['name']}: {r['errors']} failed transactions")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+"""
+Load generator: replays a JSONL traffic file against the app.
+
+Each line of the traffic file is one request:
+    {"method": "POST", "path": "/api/predict", "json": {...}}
+    {"method": "POST", "path": "/predict", "form": {...}}     (CSRF token added automatically)
+    {"method": "GET", "path": "/history?sort=price"}
+--clients virtual users each register + log in as their own user, then replay
+the file in a loop (each starting at a different line) for --seconds.
+
+Targets (all local, no network):
+  inprocess   -> Flask test clients in this process, on a fresh SQLite file
+  --url URL   -> an app that is already running, e.g. http://127.0.0.1:5000
+  --gunicorn N-> starts "gunicorn -c gunicorn.conf.py app:app" with N workers
+                 on a fresh SQLite file, and stops it afterwards
+
+Run from the project root:
+    python -m benchmarks.loadgen --clients 8 --seconds 20 --out load-new.json
+    python -m benchmarks.report load-old.json load-new.json
+"""
+import argparse
+import http.client
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+from benchmarks.report import summarize, environment, dumps, save, print_table
+
+TRAFFIC_FILE = os.path.join(os.path.dirname(__file__), 'traffic.jsonl')
+CSRF_RE = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+
+
+def read_traffic(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# --- CLIENTS ---
+class InProcessClient:
+    """Flask test client (keeps its own cookies)."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None, headers=None):
+        response = self.client.open(path, method=method, data=body, headers=headers or {})
+        return response.status_code, response.get_data(as_text=True)
+
+
+class HttpClient:
+    """Keep-alive HTTP connection with a minimal cookie jar (just the session cookie)."""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.cookies = {}
+        self.conn = None
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+        for attempt in (1, 2):  # reconnect once if the server closed the keep-alive connection
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                self.conn.request(method, path, body=body, headers=headers)
+                response = self.conn.getresponse()
+                text = response.read().decode('utf-8', 'replace')
+                break
+            except (http.client.HTTPException, OSError):
+                self.conn.close()
+                self.conn = None
+                if attempt == 2:
+                    raise
+        for header in response.headers.get_all('Set-Cookie') or []:
+            name, _, value = header.split(';', 1)[0].partition('=')
+            self.cookies[name] = value
+        return response.status, text
+
+
+# --- VIRTUAL USER ---
+def login(client, username):
+    """Register + log in; returns the CSRF token for later form posts."""
+    for path, data in (('/register', {'username': username, 'password': 'pw', 'confirm_password': 'pw'}),
+                       ('/login', {'username': username, 'password': 'pw'})):
+        _, page = client.request('GET', path)
+        match = CSRF_RE.search(page)
+        data['csrf_token'] = match.group(1) if match else ''
+        client.request('POST', path, urlencode(data), {'Content-Type': 'application/x-www-form-urlencoded'})
+    _, page = client.request('GET', '/predict')
+    match = CSRF_RE.search(page)
+    return match.group(1) if match else ''
+
+
+def encode(item, csrf_token):
+    if 'json' in item:
+        return json.dumps(item['json']), {'Content-Type': 'application/json'}
+    if 'form' in item:
+        return urlencode(dict(item['form'], csrf_token=csrf_token)), \
+            {'Content-Type': 'application/x-www-form-urlencoded'}
+    return None, {}
+
+
+def replay(client, username, traffic, offset, deadline, samples, statuses, lock):
+    token = login(client, username)
+    requests = [(item['method'], item['path'], *encode(item, token)) for item in traffic]
+    i = offset
+    mine = []
+    while time.perf_counter() < deadline:
+        method, path, body, headers = requests[i % len(requests)]
+        start = time.perf_counter()
+        try:
+            status, _ = client.request(method, path, body, headers)
+        except (http.client.HTTPException, OSError):
+            status = 'error'
+        mine.append((f'{method} {path.split("?")[0]}', time.perf_counter() - start, status))
+        i += 1
+    with lock:
+        samples.extend(mine)
+        for _, _, status in mine:
+            statuses[status] = statuses.get(status, 0) + 1
+
+
+def run_load(make_client, traffic, clients, seconds):
+    samples, statuses, lock = [], {}, threading.Lock()
+    deadline = time.perf_counter() + seconds
+    threads = [threading.Thread(target=replay, args=(make_client(), f'load{i}', traffic, i, deadline,
+                                                     samples, statuses, lock))
+               for i in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    results = [dict(summarize([s[1] for s in samples], elapsed), name='all')]
+    for name in sorted({s[0] for s in samples}):
+        results.append(dict(summarize([s[1] for s in samples if s[0] == name], elapsed), name=name))
+    return results, {str(k): v for k, v in sorted(statuses.items(), key=str)}
+
+
+# --- TARGETS ---
+def wait_for_port(port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Nothing is listening on port {port}")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--traffic', default=TRAFFIC_FILE, help="JSONL file of requests to replay")
+    parser.add_argument('--clients', type=int, default=8, help="Concurrent virtual users")
+    parser.add_argument('--seconds', type=float, default=10)
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--url', help="Base URL of an already running app")
+    target.add_argument('--gunicorn', type=int, metavar='WORKERS', help="Start a local gunicorn with this many workers")
+    parser.add_argument('--out', help="Save the results to this JSON file")
+    parser.add_argument('--json', action='store_true', help="Print JSON instead of a table")
+    args = parser.parse_args()
+
+    traffic = read_traffic(args.traffic)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_url = f"sqlite:///{os.path.join(tmp, 'load.db')}"
+        server = None
+        if args.url:
+            name, make_client = 'url', lambda: HttpClient(args.url)
+        elif args.gunicorn:
+            port = free_port()
+            env = dict(os.environ, DATABASE_URL=db_url, BIND=f'127.0.0.1:{port}', WEB_CONCURRENCY=str(args.gunicorn))
+            subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'init-db'], env=env, check=True,
+                           stdout=subprocess.DEVNULL)
+            server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+                                      env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            wait_for_port(port)
+            name, make_client = f'gunicorn x{args.gunicorn}', lambda: HttpClient(f'http://127.0.0.1:{port}')
+        else:
+            os.environ['DATABASE_URL'] = db_url
+            from application import create_app, db
+            app = create_app()
+            with app.app_context():
+                db.create_all()
+            name, make_client = 'inprocess', lambda: InProcessClient(app)
+
+        try:
+            results, statuses = run_load(make_client, traffic, args.clients, args.seconds)
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+    payload = {'suite': 'load', 'target': name, 'clients': args.clients, 'seconds': args.seconds,
+               'traffic': os.path.basename(args.traffic), 'statuses': statuses,
+               'environment': environment(), 'results': results}
+    if args.out:
+        save(args.out, payload)
+    if args.json:
+        print(dumps(payload))
+        return
+    print(f"{name}: {args.clients} clients for {args.seconds:g}s, statuses {statuses}")
+    print_table(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""
+/api/predict latency while a login storm hits the same worker.
+
+Starts the app on a threaded WSGI server (one process = one gunicorn worker),
+then runs --storm threads that log in over and over (scrypt on every attempt)
+while a probe thread times /api/predict. Modes:
+  baseline -> no storm, for reference
+  inline   -> AUTH_POOL_WORKERS=0: the KDF runs on the request threads (old behaviour)
+  pooled   -> the bounded auth pool (AUTH_POOL_WORKERS / AUTH_POOL_QUEUE below)
+
+Each mode runs in its own forked process with a fresh SQLite file. With
+--gunicorn, each mode runs on ONE real worker started from gunicorn.conf.py
+(gthread) instead, i.e. the shipped deployment.
+
+Run from the project root:
+    python -m benchmarks.login_storm --storm 16 --seconds 10
+    python -m benchmarks.login_storm --storm 16 --seconds 10 --gunicorn
+"""
+import argparse
+import http.client
+import json
+import multiprocessing as mp
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+import numpy as np
+
+from benchmarks.loadgen import free_port, wait_for_port
+
+HOUSE = json.dumps({'overall_qual': 7, 'gr_liv_area': 1500, 'garage_cars': 2,
+                    'total_bsmt_sf': 1000, 'year_built': 2000})
+
+
+def request(port, method, path, body=None, headers=None):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    try:
+        conn.request(method, path, body=body, headers=headers or {})
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    finally:
+        conn.close()
+
+
+def serve(mode, workers, queue, db_path, ready, port_box):
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    from werkzeug.serving import make_server, WSGIRequestHandler
+    from application import create_app, db
+    from application.models import User
+    from werkzeug.security import generate_password_hash
+
+    app = create_app({'WTF_CSRF_ENABLED': False, 'AUTH_POOL_WORKERS': 0 if mode == 'inline' else workers,
+                      'AUTH_POOL_QUEUE': queue})
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(username='storm', password=generate_password_hash('pw')))
+        db.session.commit()
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+    port_box.value = server.server_port
+    ready.set()
+    server.serve_forever()
+
+
+def start_forked(mode, args, db_path):
+    """The app on a threaded werkzeug server in a forked process. Returns (port, stop)."""
+    ctx = mp.get_context('fork')
+    ready, port_box = ctx.Event(), ctx.Value('i', 0)
+    proc = ctx.Process(target=serve, args=(mode, args.workers, args.queue, db_path, ready, port_box), daemon=True)
+    proc.start()
+    ready.wait(60)
+
+    def stop():
+        proc.terminate()
+        proc.join()
+    return port_box.value, stop
+
+
+def start_gunicorn(mode, args, db_path):
+    """One gunicorn worker configured by gunicorn.conf.py. Returns (port, stop)."""
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_path}', BIND=f'127.0.0.1:{port}', WEB_CONCURRENCY='1')
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'init-db'], env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+    config = {'WTF_CSRF_ENABLED': False, 'AUTH_POOL_WORKERS': 0 if mode == 'inline' else args.workers,
+              'AUTH_POOL_QUEUE': args.queue}
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+                               f'application:create_app({config!r})'],
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for_port(port)
+    form = urlencode({'username': 'storm', 'password': 'pw', 'confirm_password': 'pw'})
+    request(port, 'POST', '/register', form, {'Content-Type': 'application/x-www-form-urlencoded'})
+
+    def stop():
+        server.terminate()
+        server.wait()
+    return port, stop
+
+
+def run_mode(mode, args):
+    start_server = start_gunicorn if args.gunicorn else start_forked
+    with tempfile.TemporaryDirectory() as tmp:
+        port, stop_server = start_server(mode, args, os.path.join(tmp, 'bench.db'))
+
+        stop = threading.Event()
+        statuses = {}
+        lock = threading.Lock()
+
+        def storm():
+            form = urlencode({'username': 'storm', 'password': 'pw'})
+            while not stop.is_set():
+                status = request(port, 'POST', '/login', form, {'Content-Type': 'application/x-www-form-urlencoded'})
+                with lock:
+                    statuses[status] = statuses.get(status, 0) + 1
+
+        threads = [threading.Thread(target=storm) for _ in range(args.storm if mode != 'baseline' else 0)]
+        for t in threads:
+            t.start()
+        time.sleep(0.5)  # let the storm build up
+
+        latencies = []
+        deadline = time.perf_counter() + args.seconds
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            request(port, 'POST', '/api/predict?save=0', HOUSE, {'Content-Type': 'application/json'})
+            latencies.append(time.perf_counter() - start)
+            time.sleep(args.interval)
+
+        stop.set()
+        for t in threads:
+            t.join()
+        stop_server()
+
+    ms = np.array(latencies) * 1000
+    return {'mode': mode, 'requests': len(ms), 'p50_ms': float(np.percentile(ms, 50)),
+            'p99_ms': float(np.percentile(ms, 99)), 'max_ms': float(ms.max()),
+            'logins_ok': statuses.get(302, 0), 'logins_429': statuses.get(429, 0)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--storm', type=int, default=16, help="Concurrent login loops")
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--interval', type=float, default=0.01, help="Pause between probe requests")
+    parser.add_argument('--workers', type=int, default=2, help="AUTH_POOL_WORKERS for the pooled mode")
+    parser.add_argument('--queue', type=int, default=8, help="AUTH_POOL_QUEUE for the pooled mode")
+    parser.add_argument('--gunicorn', action='store_true',
+                        help="Serve each mode from one gunicorn worker (gunicorn.conf.py) instead of werkzeug")
+    parser.add_argument('--json', action='store_true', help="Print JSON instead of a table")
+    args = parser.parse_args()
+
+    results = [run_mode(mode, args) for mode in ('baseline', 'inline', 'pooled')]
+
+    if args.json:
+        print(json.dumps({'storm': args.storm, 'server': 'gunicorn' if args.gunicorn else 'werkzeug',
+                          'results': results}, indent=2))
+        return
+
+    print(f"{args.storm} login threads, pool {args.workers} workers + {args.queue} queued, {os.cpu_count()} CPU(s)"
+          + (", one gunicorn worker" if args.gunicorn else ""))
+    print(f"{'mode':<10}{'predicts':>10}{'p50 (ms)':>10}{'p99 (ms)':>10}{'max (ms)':>10}{'logins':>8}{'429s':>8}")
+    for r in results:
+        print(f"{r['mode']:<10}{r['requests']:>10}{r['p50_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['max_ms']:>10.1f}"
+              f"{r['logins_ok']:>8}{r['logins_429']:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Per-worker memory and cold-start time of the model, with and without sharing.
+
+Simulates N gunicorn workers with fork() and compares:
+  pickle  -> every worker unpickles its own copy (the old behaviour)
+  mmap    -> every worker maps the artifact read-only (MODEL_MMAP=True)
+  preload -> the master loads it once before forking (preload_app = True)
+
+RSS counts shared pages in every worker; PSS splits them between the workers
+that share them, so PSS is the number that shows the real saving.
+
+Run from the project root (Linux only, uses /proc):
+    python -m benchmarks.model_memory --workers 4 --trees 200
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import tempfile
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from application.predictor import FEATURES
+
+DATA_FILE = 'AmesHousing_Cleaned.csv'
+
+
+def memory_kb():
+    """(rss_kb, pss_kb) of the current process."""
+    values = {}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                parts = line.split()
+                if parts[0] in ('Rss:', 'Pss:'):
+                    values[parts[0][:-1]] = int(parts[1])
+    except FileNotFoundError:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    values['Rss'] = int(line.split()[1])
+    return values.get('Rss', 0), values.get('Pss', values.get('Rss', 0))
+
+
+def build_model(path, trees):
+    """A model much 'richer' than LinearRegression, so the difference is visible."""
+    from sklearn.ensemble import RandomForestRegressor
+    df = pd.read_csv(DATA_FILE)
+    model = RandomForestRegressor(n_estimators=trees, min_samples_leaf=1, random_state=0, n_jobs=-1)
+    model.fit(df[FEATURES].to_numpy(), df['SalePrice'].to_numpy())
+    joblib.dump(model, path)  # uncompressed, so it can be memory-mapped
+    return os.path.getsize(path)
+
+
+def worker(mode, path, preloaded, barrier, results):
+    start = time.perf_counter()
+    if mode == 'preload':
+        model = preloaded
+    else:
+        model = joblib.load(path, mmap_mode='r' if mode == 'mmap' else None)
+    model.n_jobs = 1
+    model.predict(np.array([[7, 1500, 2, 1000, 2000]], dtype=float))  # touch the pages
+    cold_start = time.perf_counter() - start
+
+    barrier.wait()  # every worker alive at the same time -> meaningful PSS
+    rss, pss = memory_kb()
+    results.put({'cold_start_s': cold_start, 'rss_kb': rss, 'pss_kb': pss})
+    barrier.wait()
+
+
+def run_mode(mode, path, workers):
+    ctx = mp.get_context('fork')
+    preloaded = None
+    if mode == 'preload':
+        preloaded = joblib.load(path)
+
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(mode, path, preloaded, barrier, results)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    rows = [results.get(timeout=300) for _ in procs]
+    for p in procs:
+        p.join()
+
+    return {
+        'mode': mode,
+        'workers': workers,
+        'cold_start_ms_avg': 1000 * sum(r['cold_start_s'] for r in rows) / workers,
+        'rss_mb_avg': sum(r['rss_kb'] for r in rows) / workers / 1024,
+        'pss_mb_avg': sum(r['pss_kb'] for r in rows) / workers / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--trees', type=int, default=200)
+    parser.add_argument('--json', action='store_true', help="Print JSON instead of a table")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'model.pkl')
+        size = build_model(path, args.trees)
+        results = [run_mode(mode, path, args.workers) for mode in ('pickle', 'mmap', 'preload')]
+
+    if args.json:
+        print(json.dumps({'artifact_mb': size / 1e6, 'results': results}, indent=2))
+        return
+
+    print(f"Artifact: {size / 1e6:.1f} MB, {args.workers} workers")
+    print(f"{'mode':<10}{'cold start (ms)':>18}{'RSS/worker (MB)':>18}{'PSS/worker (MB)':>18}")
+    for r in results:
+        print(f"{r['mode']:<10}{r['cold_start_ms_avg']:>18.1f}{r['rss_mb_avg']:>18.1f}{r['pss_mb_avg']:>18.1f}")
+
+
+if __name__ == '__main__':
+    main()
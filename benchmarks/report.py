@@ -0,0 +1,114 @@
+"""
+Shared result format for benchmarks.suite and benchmarks.loadgen.
+
+Results are saved as JSON with sorted keys and rounded numbers, one file per
+run, so two runs (e.g. before/after a commit) can be diffed directly or with:
+    python -m benchmarks.report old.json new.json --threshold 0.2
+which exits with status 1 if any benchmark got slower by more than the threshold.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+
+import numpy as np
+
+# Higher is better for these, lower is better for everything else compared
+HIGHER_IS_BETTER = ('throughput_rps', 'rows_per_s')
+COMPARED = ('p50_ms', 'p95_ms', 'p99_ms') + HIGHER_IS_BETTER
+
+
+def summarize(latencies, seconds):
+    """Throughput and percentiles (ms) of a list of per-request latencies in seconds."""
+    ms = np.asarray(latencies, dtype=float) * 1000
+    if not len(ms):
+        return {'requests': 0, 'throughput_rps': 0.0, 'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0}
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {'requests': int(len(ms)), 'throughput_rps': len(ms) / seconds if seconds else 0.0,
+            'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99)}
+
+
+def environment():
+    """What the numbers were measured on, so a diff shows when machines differ."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'commit': commit, 'python': platform.python_version(), 'cpus': os.cpu_count(),
+            'machine': platform.machine()}
+
+
+def _rounded(value):
+    if isinstance(value, float):
+        return round(value, 3)
+    if isinstance(value, dict):
+        return {k: _rounded(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_rounded(v) for v in value]
+    return value
+
+
+def dumps(payload):
+    return json.dumps(_rounded(payload), indent=2, sort_keys=True)
+
+
+def save(path, payload):
+    with open(path, 'w') as f:
+        f.write(dumps(payload) + '\n')
+
+
+def compare(old, new, threshold=0.2):
+    """[(benchmark, metric, old, new, change)] for every metric worse than `threshold` (0.2 = 20%)."""
+    old_results = {r['name']: r for r in old['results']}
+    regressions = []
+    for result in new['results']:
+        before = old_results.get(result['name'])
+        if before is None:
+            continue
+        for metric in COMPARED:
+            if not before.get(metric) or metric not in result:
+                continue
+            change = (result[metric] - before[metric]) / before[metric]
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            if worse > threshold:
+                regressions.append((result['name'], metric, before[metric], result[metric], change))
+    return regressions
+
+
+def print_table(results):
+    print(f"{'benchmark':<34}{'requests':>10}{'req/s':>12}{'p50 (ms)':>10}{'p95 (ms)':>10}{'p99 (ms)':>10}")
+    for r in results:
+        print(f"{r['name']:<34}{r['requests']:>10}{r['throughput_rps']:>12.1f}"
+              f"{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}{r['p99_ms']:>10.3f}")
+
+
+def print_regressions(regressions, threshold):
+    if not regressions:
+        print(f"No regressions above {threshold:.0%}")
+        return
+    print(f"Regressions above {threshold:.0%}:")
+    for name, metric, before, after, change in regressions:
+        print(f"  {name:<34}{metric:<16}{before:>12.3f} -> {after:<12.3f}({change:+.0%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('old')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=0.2, help="Allowed slowdown (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    regressions = compare(old, new, args.threshold)
+    print_regressions(regressions, args.threshold)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Startup time: how long a fresh process takes to import and build the app.
+
+Each run is a new interpreter started with `python -X importtime` that does
+    from application import create_app; app = create_app()
+and then serves one request with the test client. Reported per run:
+  import_ms         -> `import application` (from -X importtime, cumulative)
+  create_app_ms     -> create_app() itself
+  first_request_ms  -> the first GET /login (builds nothing heavy)
+  first_predict_ms  -> the first POST /api/predict (loads the model on demand)
+plus the slowest modules imported before the first request. Startup must not import the heavy ML stack:
+if any of FORBIDDEN shows up before the first predict, or the median of
+import_ms + create_app_ms is above --max-ms, the run fails with status 1.
+
+Run from the project root:
+    python -m benchmarks.startup --runs 5 --max-ms 1500
+    python -m benchmarks.startup --out startup-new.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.report import environment, dumps, save
+
+# Only the first predict may import these
+FORBIDDEN = ('pandas', 'sklearn', 'scipy', 'joblib')
+
+CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+from application import create_app
+t1 = time.perf_counter()
+app = create_app({'WTF_CSRF_ENABLED': False})
+t2 = time.perf_counter()
+startup_modules = sorted(sys.modules)
+loaded = sorted(m for m in %(forbidden)r if m in sys.modules)
+client = app.test_client()
+t3 = time.perf_counter()
+client.get('/login')
+t4 = time.perf_counter()
+client.post('/api/predict?save=0', json={'overall_qual': 7, 'gr_liv_area': 1500, 'garage_cars': 2,
+                                         'total_bsmt_sf': 1000, 'year_built': 2000})
+t5 = time.perf_counter()
+print(json.dumps({'import_wall_ms': (t1 - t0) * 1000, 'create_app_ms': (t2 - t1) * 1000,
+                  'first_request_ms': (t4 - t3) * 1000, 'first_predict_ms': (t5 - t4) * 1000,
+                  'forbidden_loaded': loaded, 'startup_modules': startup_modules}))
+"""
+
+
+def parse_importtime(stderr):
+    """{module: (self_us, cumulative_us)} from `python -X importtime` output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = (int(self_us), int(cumulative))
+    return modules
+
+
+def measure(db_url):
+    env = dict(os.environ, DATABASE_URL=db_url)
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD % {'forbidden': FORBIDDEN}],
+                          env=env, capture_output=True, text=True, check=True)
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    startup_modules = set(result.pop('startup_modules'))
+    modules = {name: times for name, times in parse_importtime(proc.stderr).items() if name in startup_modules}
+    result['import_ms'] = modules.get('application', (0, 0))[1] / 1000
+    result['startup_ms'] = result['import_ms'] + result['create_app_ms']
+    return result, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help="Fresh processes to start")
+    parser.add_argument('--max-ms', type=float, help="Fail if the median startup_ms is above this")
+    parser.add_argument('--top', type=int, default=10, help="Slowest modules to list (by self time)")
+    parser.add_argument('--out', help="Save the results to this JSON file")
+    parser.add_argument('--json', action='store_true', help="Print JSON instead of a table")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_url = f"sqlite:///{os.path.join(tmp, 'startup.db')}"
+        subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'init-db'],
+                       env=dict(os.environ, DATABASE_URL=db_url), check=True, stdout=subprocess.DEVNULL)
+        runs = [measure(db_url) for _ in range(args.runs)]
+
+    keys = ('import_ms', 'create_app_ms', 'startup_ms', 'first_request_ms', 'first_predict_ms')
+    summary = {key: statistics.median(r[key] for r, _ in runs) for key in keys}
+    forbidden = sorted({m for r, _ in runs for m in r['forbidden_loaded']})
+    slowest = sorted(runs[-1][1].items(), key=lambda item: item[1][0], reverse=True)[:args.top]
+
+    failures = []
+    if forbidden:
+        failures.append(f"startup imported {', '.join(forbidden)}")
+    if args.max_ms is not None and summary['startup_ms'] > args.max_ms:
+        failures.append(f"startup took {summary['startup_ms']:.0f} ms, budget is {args.max_ms:g} ms")
+
+    payload = {'suite': 'startup', 'runs': args.runs, 'environment': environment(),
+               'results': [dict(summary, name='startup')], 'forbidden_loaded': forbidden,
+               'slowest_modules': [{'module': name, 'self_ms': s / 1000, 'cumulative_ms': c / 1000}
+                                   for name, (s, c) in slowest]}
+    if args.out:
+        save(args.out, payload)
+    if args.json:
+        print(dumps(payload))
+    else:
+        print(f"median of {args.runs} fresh processes")
+        for key in keys:
+            print(f"  {key:<18}{summary[key]:>10.1f}")
+        print("slowest modules (self ms, cumulative ms):")
+        for name, (s, c) in slowest:
+            print(f"  {name:<40}{s / 1000:>10.1f}{c / 1000:>10.1f}")
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
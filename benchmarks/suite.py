@@ -0,0 +1,201 @@
+"""
+Micro-benchmarks of the hot paths, for catching regressions between commits.
+
+  inference_single         -> predictor.predict_one(), one house at a time
+  inference_batch          -> predictor.predict_many() on --batch houses per call
+  history_insert           -> History rows saved one by one through add_entry()'s path
+                              (history_writer.submit, HISTORY_WRITE_MODE="sync")
+  history_query[N] <view>  -> GET /history for a user with N rows: the default
+                              page, sorted by price, and a range filter
+
+Every benchmark runs in its own forked process with a fresh SQLite file, so no
+run sees another run's cache or rows. Nothing touches the network.
+
+Run from the project root, save the results and compare them with an older run:
+    python -m benchmarks.suite --out bench-new.json
+    python -m benchmarks.report bench-old.json bench-new.json
+Use --sizes 10000 (or --quick) for a fast run; the 1M-row table takes a while to fill.
+"""
+import argparse
+import multiprocessing as mp
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from benchmarks.report import summarize, environment, dumps, save, print_table
+
+SIZES = (10_000, 100_000, 1_000_000)
+HISTORY_VIEWS = {
+    'default': '/history',
+    'sort_price': '/history?sort=price&order=asc',
+    'range': '/history?year_min=2000&price_max=150000',
+}
+INSERT_CHUNK = 50_000
+
+
+def random_houses(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([rng.integers(1, 11, n), rng.integers(500, 4000, n), rng.integers(0, 5, n),
+                            rng.integers(0, 3000, n), rng.integers(1900, 2011, n)]).astype(float)
+
+
+def boot(db_path):
+    """The app on a throwaway database with its tables created (must run in the child process)."""
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    from application import create_app, db
+    app = create_app({'WTF_CSRF_ENABLED': False, 'HISTORY_WRITE_MODE': 'sync'})
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def timed(fn, repeat):
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t0)
+    return latencies, time.perf_counter() - start
+
+
+# --- BENCHMARKS (each returns a list of results) ---
+def bench_inference(args):
+    boot(args.db_path)
+    from application.predictor import load_predictor
+    predictor = load_predictor()
+    rows = iter(random_houses(args.requests * 10).tolist())
+    latencies, seconds = timed(lambda: predictor.predict_one(next(rows)), args.requests * 10)
+    single = dict(summarize(latencies, seconds), name='inference_single')
+
+    X = random_houses(args.batch, seed=1)
+    latencies, seconds = timed(lambda: predictor.predict_many(X), args.requests)
+    batch = dict(summarize(latencies, seconds), name=f'inference_batch[{args.batch}]',
+                 rows_per_s=args.batch * args.requests / seconds)
+    return [single, batch]
+
+
+def bench_history_insert(args):
+    app = boot(args.db_path)
+    from application import db
+    from application.models import History, User
+    from application.writebehind import history_writer
+
+    houses = iter(random_houses(args.requests * 10).tolist())
+    with app.app_context():
+        user = User(username='bench', password='x')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+
+        def insert():
+            qual, area, cars, bsmt, year = next(houses)
+            history_writer.submit([History(overall_qual=int(qual), gr_liv_area=int(area), garage_cars=int(cars),
+                                           total_bsmt_sf=int(bsmt), year_built=int(year), prediction=150000.0,
+                                           predicted_on=datetime.now(), user_id=user_id)])
+
+        latencies, seconds = timed(insert, args.requests * 10)
+    return [dict(summarize(latencies, seconds), name='history_insert')]
+
+
+def fill_history(db, History, user_id, n):
+    X = random_houses(n, seed=2)
+    prices = 20000 + 25000 * X[:, 0] + 40 * X[:, 1]
+    start = datetime(2020, 1, 1)
+    for lo in range(0, n, INSERT_CHUNK):
+        db.session.execute(db.insert(History), [
+            {'overall_qual': int(q), 'gr_liv_area': int(a), 'garage_cars': int(c), 'total_bsmt_sf': int(b),
+             'year_built': int(y), 'prediction': float(p), 'predicted_on': start + timedelta(seconds=i),
+             'user_id': user_id}
+            for i, (q, a, c, b, y), p in zip(range(lo, n), X[lo:lo + INSERT_CHUNK].tolist(),
+                                             prices[lo:lo + INSERT_CHUNK].tolist())
+        ])
+        db.session.commit()
+
+
+def bench_history_query(args, size):
+    app = boot(args.db_path)
+    from application import db
+    from application.models import History, User
+
+    client = app.test_client()
+    client.post('/register', data={'username': 'bench', 'password': 'pw', 'confirm_password': 'pw'})
+    client.post('/login', data={'username': 'bench', 'password': 'pw'})
+    with app.app_context():
+        fill_history(db, History, User.query.filter_by(username='bench').one().id, size)
+
+    results = []
+    for view, url in HISTORY_VIEWS.items():
+        assert client.get(url).status_code == 200, "benchmark user is not logged in"  # also warms the cache
+        latencies, seconds = timed(lambda: client.get(url), args.requests)
+        results.append(dict(summarize(latencies, seconds), name=f'history_query[{size}] {view}'))
+    return results
+
+
+# --- RUNNER ---
+def child(name, size, args, queue):
+    try:
+        if name == 'inference':
+            queue.put(bench_inference(args))
+        elif name == 'history_insert':
+            queue.put(bench_history_insert(args))
+        else:
+            queue.put(bench_history_query(args, size))
+    except Exception as error:  # report it instead of hanging the parent
+        queue.put(error)
+
+
+def run(name, args, size=None):
+    ctx = mp.get_context('fork')
+    with tempfile.TemporaryDirectory() as tmp:
+        args.db_path = os.path.join(tmp, 'bench.db')
+        queue = ctx.Queue()
+        proc = ctx.Process(target=child, args=(name, size, args, queue))
+        proc.start()
+        results = queue.get(timeout=3600)
+        proc.join()
+    if isinstance(results, Exception):
+        raise results
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default=','.join(map(str, SIZES)), help="History table sizes to query")
+    parser.add_argument('--requests', type=int, default=200, help="Timed calls per benchmark")
+    parser.add_argument('--batch', type=int, default=1000, help="Houses per predict_many() call")
+    parser.add_argument('--only', choices=['inference', 'history_insert', 'history_query'], action='append',
+                        help="Run only these benchmarks (repeatable)")
+    parser.add_argument('--quick', action='store_true', help="Small sizes and few requests, for a smoke test")
+    parser.add_argument('--out', help="Save the results to this JSON file")
+    parser.add_argument('--json', action='store_true', help="Print JSON instead of a table")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(',') if s]
+    if args.quick:
+        sizes, args.requests = [min(sizes)], 20
+    selected = args.only or ['inference', 'history_insert', 'history_query']
+
+    results = []
+    if 'inference' in selected:
+        results += run('inference', args)
+    if 'history_insert' in selected:
+        results += run('history_insert', args)
+    if 'history_query' in selected:
+        for size in sizes:
+            results += run('history_query', args, size)
+
+    payload = {'suite': 'micro', 'environment': environment(), 'results': results}
+    if args.out:
+        save(args.out, payload)
+    if args.json:
+        print(dumps(payload))
+        return
+    print_table(results)
+
+
+if __name__ == '__main__':
+    main()
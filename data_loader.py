@@ -0,0 +1,238 @@
+"""
+Typed, columnar on-disk cache for the Ames housing CSVs.
+
+pd.read_csv() re-parses every row and re-infers the type of 80+ columns on
+each training run. The first load of a CSV converts it ONCE into one
+memory-mapped NumPy file per column; every later load just maps the columns
+it asks for, with the dtypes recorded at build time (no inference at all).
+
+Cache layout (next to the CSV by default):
+    .cache/
+      AmesHousing_Cleaned.json              <- source stamp + hash -> current build
+      AmesHousing_Cleaned-1a2b3c4d5e6f/
+        manifest.json                       <- row count, column names and dtypes
+        SalePrice.npy                       <- one file per column
+        Neighborhood.npy                    <- text columns: int32 category codes
+        ...                                    (labels are in manifest.json)
+
+The cache is rebuilt when the sha256 of the CSV changes. The hash is only
+computed when the file's size/mtime changed, so a normal load never reads
+the CSV at all.
+
+    from data_loader import load_frame
+    df = load_frame('AmesHousing_Cleaned.csv', columns=FEATURES + ['SalePrice'])
+
+Run `python data_loader.py` to (re)build the cache of every known CSV.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# --- CONFIGURATION ---
+CACHE_DIRNAME = '.cache'
+MANIFEST_FILE = 'manifest.json'
+FORMAT_VERSION = 1
+
+DATASETS = [
+    'AmesHousing_Cleaned.csv',
+    'dataset/AmesHousing.csv',
+    'dataset/AmesHousing_WebApp_Subset.csv',
+]
+
+# Explicit types for the columns the app relies on. Counts/areas that can be
+# missing stay float64 (NaN); everything else not listed here is typed once
+# when the cache is built and recorded in the manifest.
+DTYPES = {
+    'SalePrice': 'int64',
+    'OverallQual': 'int16',
+    'GrLivArea': 'int32',
+    'GarageCars': 'float64',
+    'TotalBsmtSF': 'float64',
+    'YearBuilt': 'int16',
+}
+
+
+# (Deliberately no `application` imports: that would start the whole web app.)
+def file_checksum(path):
+    """sha256 of a file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_atomic(path, text):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.tmp-')
+    with os.fdopen(fd, 'w') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def _cache_root(source, cache_dir=None):
+    return cache_dir or os.path.join(os.path.dirname(os.path.abspath(source)), CACHE_DIRNAME)
+
+
+def _stem(source):
+    return os.path.splitext(os.path.basename(source))[0]
+
+
+def _stamp(source):
+    st = os.stat(source)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _safe_name(column):
+    # 'YearRemod/Add' -> a valid file name
+    return column.replace('/', '_').replace(os.sep, '_')
+
+
+# --- BUILDING ---
+def build_cache(source, cache_dir=None, dtypes=None, checksum=None):
+    """
+    Parse the CSV once and write it as typed columns. Returns the build directory.
+    Written to a staging folder and renamed into place, like model versions.
+    """
+    root = _cache_root(source, cache_dir)
+    os.makedirs(root, exist_ok=True)
+    checksum = checksum or file_checksum(source)
+    dtypes = dict(DTYPES, **(dtypes or {}))
+
+    header = pd.read_csv(source, nrows=0).columns
+    df = pd.read_csv(source, dtype={c: t for c, t in dtypes.items() if c in header})
+
+    staging = tempfile.mkdtemp(dir=root, prefix='.staging-')
+    try:
+        columns = []
+        for name in df.columns:
+            series = df[name]
+            entry = {'name': name, 'file': _safe_name(name) + '.npy'}
+            if series.dtype == object:
+                # Text -> category codes (-1 = missing) + the labels
+                codes, labels = pd.factorize(series, sort=True)
+                values = codes.astype(np.int32)
+                entry.update(dtype='category', labels=labels.tolist())
+            else:
+                values = series.to_numpy()
+                entry['dtype'] = values.dtype.str
+            np.save(os.path.join(staging, entry['file']), values)
+            columns.append(entry)
+
+        manifest = {'format': FORMAT_VERSION, 'source': os.path.basename(source),
+                    'checksum': checksum, 'rows': len(df), 'columns': columns}
+        with open(os.path.join(staging, MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        build = os.path.join(root, f"{_stem(source)}-{checksum[:12]}")
+        if os.path.exists(build):
+            shutil.rmtree(build)
+        os.replace(staging, build)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    # Builds of older versions of the same CSV are no longer needed
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if name.startswith(_stem(source) + '-') and path != build and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+    return build
+
+
+def ensure_cache(source, cache_dir=None, dtypes=None, rebuild=False):
+    """Directory of an up-to-date build for `source`, (re)building it if needed."""
+    root = _cache_root(source, cache_dir)
+    index_path = os.path.join(root, _stem(source) + '.json')
+    stamp = _stamp(source)
+
+    try:
+        with open(index_path) as f:
+            index = json.load(f)
+    except (FileNotFoundError, ValueError):
+        index = {}
+
+    build = os.path.join(root, index.get('build', ''))
+    if rebuild:
+        checksum = file_checksum(source)
+    elif index.get('build') and os.path.exists(os.path.join(build, MANIFEST_FILE)):
+        if index.get('stamp') == stamp:
+            return build  # the common case: no hashing, no parsing
+        checksum = file_checksum(source)
+        if checksum == index.get('checksum'):
+            # Touched but not changed (e.g. git checkout): just refresh the stamp
+            _write_atomic(index_path, json.dumps(dict(index, stamp=stamp)))
+            return build
+    else:
+        checksum = file_checksum(source)
+
+    build = build_cache(source, cache_dir, dtypes, checksum)
+    _write_atomic(index_path, json.dumps({'stamp': stamp, 'checksum': checksum,
+                                          'build': os.path.basename(build)}))
+    return build
+
+
+# --- LOADING ---
+def _open(source, cache_dir=None):
+    build = ensure_cache(source, cache_dir)
+    with open(os.path.join(build, MANIFEST_FILE)) as f:
+        return build, json.load(f)
+
+
+def read_manifest(source, cache_dir=None):
+    return _open(source, cache_dir)[1]
+
+
+def load_columns(source, columns=None, cache_dir=None, mmap=True):
+    """
+    {name: ndarray} for the requested columns (all by default).
+    Numeric columns are read-only memory maps; text columns are category codes.
+    """
+    build, manifest = _open(source, cache_dir)
+    by_name = {c['name']: c for c in manifest['columns']}
+    wanted = list(columns) if columns is not None else list(by_name)
+    missing = [c for c in wanted if c not in by_name]
+    if missing:
+        raise KeyError(f"Missing columns in {manifest['source']}: {missing}")
+
+    return {name: np.load(os.path.join(build, by_name[name]['file']), mmap_mode='r' if mmap else None)
+            for name in wanted}
+
+
+def load_frame(source, columns=None, cache_dir=None, mmap=True):
+    """
+    Drop-in replacement for pd.read_csv(source)[columns], served from the cache.
+    Text columns come back as pandas Categoricals.
+    """
+    by_name = {c['name']: c for c in read_manifest(source, cache_dir)['columns']}
+    arrays = load_columns(source, columns, cache_dir, mmap)
+    data = {}
+    for name, values in arrays.items():
+        entry = by_name[name]
+        if entry['dtype'] == 'category':
+            data[name] = pd.Categorical.from_codes(values, categories=entry['labels'])
+        else:
+            data[name] = values
+    return pd.DataFrame(data, copy=False)
+
+
+def numeric_columns(source, cache_dir=None):
+    """Names of the non-text columns, in file order (no data is loaded)."""
+    return [c['name'] for c in read_manifest(source, cache_dir)['columns'] if c['dtype'] != 'category']
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build the columnar cache of the housing CSVs.")
+    parser.add_argument('sources', nargs='*', default=DATASETS)
+    parser.add_argument('--rebuild', action='store_true', help="Rebuild even if the CSV did not change")
+    args = parser.parse_args()
+
+    for source in args.sources:
+        build = ensure_cache(source, rebuild=args.rebuild)
+        manifest = read_manifest(source)
+        print(f"{source}: {manifest['rows']} rows x {len(manifest['columns'])} columns -> {build}")
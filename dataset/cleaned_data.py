@@ -1 +1,348 @@
-git push -u origin main
\ No newline at end of file
+"""
+Regenerates AmesHousing_Cleaned.csv and dataset/AmesHousing_WebApp_Subset.csv
+from dataset/AmesHousing.csv, with the rules of "cleaning dataset.ipynb".
+
+The output is byte-identical to the notebook's. The input is never loaded
+whole: every pass reads it in --chunksize row chunks, and all transforms are
+whole-column pandas/NumPy operations. The notebook's global steps become
+small summaries:
+  1. schema   -> the dtype pd.read_csv() would infer for each column over
+                 the whole file (merged per chunk: text > float > int)
+  2. stats    -> fill values (LotFrontage median, MasVnrType/Electrical mode)
+                 from per-chunk value counts, and whether each quality column
+                 ends up float (some value outside the Ex..Po scale)
+  3. clean    -> the cleaned CSV, written chunk by chunk, plus running sums
+                 for each numeric column's correlation with SalePrice
+  4. subset   -> the top correlated columns, read back from the cleaned CSV
+
+Each stage is cached under .cache/cleaning/<source>-<sha256 prefix>/ and is
+only recomputed when the source file or PIPELINE_VERSION changes, so a rerun
+on an unchanged source just copies the cached CSVs.
+
+Run from the project root:
+    python dataset/cleaned_data.py                # regenerate both CSVs
+    python dataset/cleaned_data.py --check        # exit 1 if they are out of date
+    python dataset/cleaned_data.py --chunksize 500 --no-cache
+"""
+import argparse
+import filecmp
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# --- CONFIGURATION ---
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE = os.path.join(ROOT, 'dataset', 'AmesHousing.csv')
+CLEANED = os.path.join(ROOT, 'AmesHousing_Cleaned.csv')
+SUBSET = os.path.join(ROOT, 'dataset', 'AmesHousing_WebApp_Subset.csv')
+CACHE_DIR = os.path.join(ROOT, '.cache', 'cleaning')
+CHUNKSIZE = 100_000
+
+# Bump when a rule below changes: every cached stage is then recomputed
+PIPELINE_VERSION = 1
+
+# 'Order' and 'PID' are just indexers/ID numbers, not useful for prediction
+DROP = ['Order', 'PID']
+
+# NA means the feature does not exist (no pool, no garage...): a category of its own
+FILL_NONE = ['PoolQC', 'MiscFeature', 'Alley', 'Fence', 'FireplaceQu',
+             'GarageType', 'GarageFinish', 'GarageQual', 'GarageCond',
+             'BsmtQual', 'BsmtCond', 'BsmtExposure', 'BsmtFinType1', 'BsmtFinType2']
+
+# ...and its size/count is 0
+FILL_ZERO = ['GarageYrBlt', 'GarageArea', 'GarageCars', 'BsmtFinSF1',
+             'BsmtFinSF2', 'BsmtUnfSF', 'TotalBsmtSF', 'BsmtFullBath',
+             'BsmtHalfBath', 'MasVnrArea']
+
+# Really missing: physical measurement -> median, few rows -> most common value
+FILL_MEDIAN = ['LotFrontage']
+FILL_MODE = ['MasVnrType', 'Electrical']
+
+# Ordinal quality scale. 'Ta' (not the data's 'TA') is kept as in the notebook:
+# unmatched values become 0, and changing that would change the published CSVs.
+QUALITY_MAP = {'Ex': 5, 'Gd': 4, 'Ta': 3, 'Fa': 2, 'Po': 1, 'None': 0}
+QUALITY_COLS = ['ExterQual', 'ExterCond', 'BsmtQual', 'BsmtCond',
+                'HeatingQC', 'KitchenQual', 'FireplaceQu',
+                'GarageQual', 'GarageCond', 'PoolQC']
+
+TARGET = 'SalePrice'
+TOP_FEATURES = 10
+
+# Merge order of per-chunk dtypes: a column is text if any chunk is text, etc.
+_DTYPE_RANK = {'int64': 0, 'float64': 1, 'object': 2}
+
+
+def file_checksum(path):
+    """sha256 of a file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_chunks(path, chunksize, **kwargs):
+    return pd.read_csv(path, chunksize=chunksize, **kwargs)
+
+
+def normalize_columns(columns):
+    # 'Lot Frontage' -> 'LotFrontage'
+    return [c.replace(' ', '') for c in columns]
+
+
+# --- STAGE 1: SCHEMA ---
+def infer_schema(source, chunksize=CHUNKSIZE):
+    """{raw column: dtype} as one pd.read_csv() of the whole file would infer them."""
+    schema = {}
+    for chunk in read_chunks(source, chunksize):
+        for column, dtype in chunk.dtypes.items():
+            kind = 'object' if dtype == object else 'float64' if dtype.kind == 'f' else 'int64'
+            if _DTYPE_RANK[kind] > _DTYPE_RANK.get(schema.get(column), -1):
+                schema[column] = kind
+    return schema
+
+
+def typed_chunks(source, schema, chunksize, columns=None):
+    """The source in chunks, every chunk with the whole-file dtypes and normalized names."""
+    usecols = None if columns is None else [c for c in schema if c.replace(' ', '') in columns]
+    for chunk in read_chunks(source, chunksize, dtype=schema, usecols=usecols):
+        chunk.columns = normalize_columns(chunk.columns)
+        yield chunk
+
+
+def fill_known(df):
+    """Steps that need no statistics: drop IDs, 'None' categories, zero counts/areas."""
+    df = df.drop(columns=[c for c in DROP if c in df.columns])
+    df = df.fillna({c: 'None' for c in FILL_NONE if c in df.columns})
+    return df.fillna({c: 0 for c in FILL_ZERO if c in df.columns})
+
+
+# --- STAGE 2: STATS ---
+def compute_stats(source, schema, chunksize=CHUNKSIZE):
+    """Fill values for FILL_MEDIAN / FILL_MODE and the output dtype of each quality column."""
+    names = set(normalize_columns(schema))
+    wanted = [c for c in FILL_MEDIAN + FILL_MODE + QUALITY_COLS if c in names]
+    counts = {c: pd.Series(dtype='int64') for c in FILL_MEDIAN + FILL_MODE if c in names}
+    unmatched = {c: False for c in QUALITY_COLS if c in names}
+
+    for chunk in typed_chunks(source, schema, chunksize, wanted):
+        chunk = fill_known(chunk)
+        for column in counts:
+            counts[column] = counts[column].add(chunk[column].value_counts(), fill_value=0)
+        for column in unmatched:
+            unmatched[column] = unmatched[column] or not chunk[column].isin(QUALITY_MAP.keys()).all()
+
+    fills = {}
+    for column in FILL_MEDIAN:
+        if column in counts:
+            fills[column] = exact_median(counts[column])
+    for column in FILL_MODE:
+        if column in counts:
+            fills[column] = exact_mode(counts[column])
+    return {'fills': fills,
+            'quality_dtypes': {c: 'float64' if flag else 'int64' for c, flag in unmatched.items()}}
+
+
+def exact_median(counts):
+    """Series.median() of the values behind a value_counts() Series."""
+    counts = counts[counts > 0].sort_index()
+    total = int(counts.sum())
+    if not total:
+        return None
+    ends = counts.cumsum().to_numpy()
+    values = counts.index.to_numpy(dtype=float)
+    low = values[np.searchsorted(ends, (total - 1) // 2, side='right')]
+    high = values[np.searchsorted(ends, total // 2, side='right')]
+    return float(np.mean([low, high]))
+
+
+def exact_mode(counts):
+    """Series.mode()[0]: the most common value, the smallest one on a tie."""
+    counts = counts[counts > 0]
+    if counts.empty:
+        return None
+    value = min(counts.index[counts == counts.max()])
+    return value.item() if isinstance(value, np.generic) else value
+
+
+# --- STAGE 3: CLEAN ---
+def clean_chunk(df, stats):
+    df = fill_known(df)
+    df = df.fillna({c: v for c, v in stats['fills'].items() if v is not None})
+    for column, dtype in stats['quality_dtypes'].items():
+        # Unexpected values (here: 'TA') map to NaN, then 0
+        df[column] = df[column].map(QUALITY_MAP).fillna(0).astype(dtype)
+    return df
+
+
+class TargetCorrelation:
+    """
+    Running Pearson correlation of every numeric column with TARGET, over
+    pairwise-complete rows like DataFrame.corr(). Values are shifted by the
+    first chunk's means so the sums of squares stay well conditioned.
+    """
+
+    def __init__(self):
+        self.columns = None
+        self.shift = None
+        self.sums = None
+
+    def update(self, df):
+        numeric = df.select_dtypes(include=[np.number])
+        if self.columns is None:
+            self.columns = list(numeric.columns)
+            self.shift = np.nan_to_num(numeric.mean().to_numpy(dtype=float))
+            self.sums = np.zeros((6, len(self.columns)))
+        x = numeric[self.columns].to_numpy(dtype=float) - self.shift
+        y = x[:, [self.columns.index(TARGET)]]
+        mask = ~np.isnan(x) & ~np.isnan(y)
+        x, y = np.where(mask, x, 0.0), np.where(mask, y, 0.0)
+        self.sums += [mask.sum(axis=0), x.sum(axis=0), y.sum(axis=0),
+                      (x * x).sum(axis=0), (y * y).sum(axis=0), (x * y).sum(axis=0)]
+
+    def result(self):
+        n, sx, sy, sxx, syy, sxy = self.sums
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cov = sxy - sx * sy / n
+            var = (sxx - sx * sx / n) * (syy - sy * sy / n)
+            corr = np.where(var > 0, cov / np.sqrt(var), np.nan)
+        return dict(zip(self.columns, np.clip(corr, -1.0, 1.0).tolist()))
+
+
+def write_cleaned(source, schema, stats, dest, chunksize=CHUNKSIZE):
+    """Clean the source into `dest` chunk by chunk. Returns ({column: corr with TARGET}, {column: dtype})."""
+    correlation = TargetCorrelation()
+    dtypes = {}
+    with open(dest, 'w', newline='', encoding='utf-8') as f:
+        for i, chunk in enumerate(typed_chunks(source, schema, chunksize)):
+            chunk = clean_chunk(chunk, stats)
+            correlation.update(chunk)
+            dtypes = {c: str(t) for c, t in chunk.dtypes.items()}
+            chunk.to_csv(f, header=(i == 0), index=False, lineterminator='\n')
+    return correlation.result(), dtypes
+
+
+def top_features(correlations, k=TOP_FEATURES):
+    """The k columns most correlated with TARGET (TARGET itself first), like the notebook."""
+    return pd.Series(correlations, dtype=float).sort_values(ascending=False).head(k).index.tolist()
+
+
+# --- STAGE 4: SUBSET ---
+def write_subset(cleaned, features, dtypes, dest, chunksize=CHUNKSIZE):
+    """The `features` columns of the cleaned CSV, in that order, with their cleaned dtypes."""
+    # Only 'None' is a category in the cleaned file: keep it as text, not NaN
+    read = dict(dtype={c: dtypes[c] for c in features}, usecols=features,
+                keep_default_na=False, na_values=[''])
+    with open(dest, 'w', newline='', encoding='utf-8') as f:
+        for i, chunk in enumerate(read_chunks(cleaned, chunksize, **read)):
+            chunk[features].to_csv(f, header=(i == 0), index=False, lineterminator='\n')
+
+
+# --- PIPELINE ---
+class StageCache:
+    """One folder per source checksum; JSON results and CSVs written atomically."""
+
+    def __init__(self, root, source, checksum, enabled=True):
+        stem = os.path.splitext(os.path.basename(source))[0]
+        self.dir = os.path.join(root, f"{stem}-{checksum[:12]}-v{PIPELINE_VERSION}")
+        self.enabled = enabled
+        self.hits, self.misses = [], []
+        os.makedirs(self.dir, exist_ok=True)
+
+    def path(self, name):
+        return os.path.join(self.dir, name)
+
+    def json(self, name, compute):
+        path = self.path(name + '.json')
+        if self.enabled and os.path.exists(path):
+            self.hits.append(name)
+            with open(path) as f:
+                return json.load(f)
+        self.misses.append(name)
+        value = compute()
+        fd, tmp = tempfile.mkstemp(dir=self.dir, prefix='.tmp-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(value, f, indent=2)
+        os.replace(tmp, path)
+        return value
+
+    def file(self, name, build):
+        """Path of a cached file, calling build(tmp_path) first if it is missing."""
+        path = self.path(name)
+        if self.enabled and os.path.exists(path):
+            self.hits.append(name)
+            return path
+        self.misses.append(name)
+        fd, tmp = tempfile.mkstemp(dir=self.dir, prefix='.tmp-')
+        os.close(fd)
+        try:
+            build(tmp)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return path
+
+
+def run(source=SOURCE, cleaned=CLEANED, subset=SUBSET, chunksize=CHUNKSIZE, cache_dir=CACHE_DIR,
+        use_cache=True, check=False):
+    """
+    Run the four stages (cached ones are skipped) and copy the results to `cleaned`
+    and `subset`. With check=True nothing is written; returns the list of outputs
+    that differ from what would be generated. Otherwise returns a summary dict.
+    """
+    cache = StageCache(cache_dir, source, file_checksum(source), enabled=use_cache)
+    schema = cache.json('schema', lambda: infer_schema(source, chunksize))
+    stats = cache.json('stats', lambda: compute_stats(source, schema, chunksize))
+
+    result = {}
+    if not os.path.exists(cache.path('clean.json')) and os.path.exists(cache.path('cleaned.csv')):
+        # The correlations are only computed while writing the cleaned CSV
+        os.remove(cache.path('cleaned.csv'))
+
+    def build_cleaned(tmp):
+        result['correlations'], result['dtypes'] = write_cleaned(source, schema, stats, tmp, chunksize)
+
+    cleaned_file = cache.file('cleaned.csv', build_cleaned)
+    meta = cache.json('clean', lambda: {'correlations': result['correlations'], 'dtypes': result['dtypes']})
+    features = top_features(meta['correlations'])
+    subset_file = cache.file('subset.csv', lambda tmp: write_subset(cleaned_file, features, meta['dtypes'],
+                                                                    tmp, chunksize))
+
+    outputs = [(cleaned_file, cleaned), (subset_file, subset)]
+    if check:
+        return [dest for built, dest in outputs
+                if not os.path.exists(dest) or not filecmp.cmp(built, dest, shallow=False)]
+    for built, dest in outputs:
+        shutil.copyfile(built, dest)
+    return {'features': features, 'fills': stats['fills'], 'cached': cache.hits, 'computed': cache.misses}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--source', default=SOURCE)
+    parser.add_argument('--cleaned', default=CLEANED, help="Where to write the full cleaned dataset")
+    parser.add_argument('--subset', default=SUBSET, help="Where to write the web-app subset")
+    parser.add_argument('--chunksize', type=int, default=CHUNKSIZE, help="Rows read per chunk")
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    parser.add_argument('--no-cache', action='store_true', help="Recompute every stage")
+    parser.add_argument('--check', action='store_true', help="Only compare with the existing CSVs (exit 1 if different)")
+    args = parser.parse_args()
+
+    outcome = run(args.source, args.cleaned, args.subset, args.chunksize, args.cache_dir,
+                  use_cache=not args.no_cache, check=args.check)
+    if args.check:
+        for dest in outcome:
+            print(f"Out of date: {dest}")
+        print("Up to date." if not outcome else "Run without --check to regenerate.")
+        sys.exit(1 if outcome else 0)
+    print(f"Top {TOP_FEATURES} features: {outcome['features']}")
+    print(f"Fill values: {outcome['fills']}")
+    print(f"Stages computed: {outcome['computed'] or 'none'}, from cache: {outcome['cached'] or 'none'}")
+    print(f"Wrote {args.cleaned} and {args.subset}")
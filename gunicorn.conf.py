@@ -0,0 +1,41 @@
+# Gunicorn settings for production
+# Run with: gunicorn -c gunicorn.conf.py app:app
+# (create the tables first: flask --app app init-db)
+import os
+from flask import Config
+
+bind = os.getenv('BIND', '0.0.0.0:5000')
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+
+
+def _auth_slots():
+    """AUTH_POOL_WORKERS + AUTH_POOL_QUEUE from config.cfg: the requests a login storm may hold."""
+    config = Config(os.path.dirname(os.path.abspath(__file__)))
+    config.from_pyfile(os.path.join('application', 'config.cfg'))
+    return config['AUTH_POOL_WORKERS'] + config['AUTH_POOL_QUEUE']
+
+
+# Threaded workers. A sync worker serves one request at a time, so a login hashing
+# its password would hold the whole process and the auth pool's 429 could never fire.
+# Each worker gets a thread for every auth slot plus PREDICT_THREADS that only
+# logins beyond the pool's limit (answered 429 at once) can compete for.
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', _auth_slots() + int(os.getenv('PREDICT_THREADS', '4'))))
+
+# Import the app ONCE in the master, before forking.
+preload_app = True
+
+
+def when_ready(server):
+    # create_app() loads nothing on its own: load the model and the comparables
+    # index here, in the master, so workers share their read-only pages instead
+    # of each unpickling a copy; with MODEL_MMAP the arrays live in the OS page cache anyway.
+    server.app.wsgi().extensions['ml'].preload()
+
+
+def post_fork(server, worker):
+    # Database connections opened in the master must not be shared with the
+    # workers: drop them from the pool (without closing the master's sockets).
+    from application import db
+    with server.app.wsgi().app_context():
+        db.engine.dispose(close=False)
@@ -1,35 +1,37 @@
-import pandas as pd
+import json
 import joblib
 import sqlite3
 from sklearn.linear_model import LinearRegression
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error, r2_score
+from data_loader import load_frame, numeric_columns
 
 # --- CONFIGURATION ---
 DATA_FILE = 'AmesHousing_Cleaned.csv'  # Ensure this file is in your root folder
 MODEL_FILE = 'housing_model.pkl'
+REGISTRY_DIR = 'models'
 DB_FILE = 'housing.db'
 
 def train_model():
-    print("--- 1. Loading Data ---")
-    try:
-        df = pd.read_csv(DATA_FILE)
-        print(f"Loaded {len(df)} rows from {DATA_FILE}")
-    except FileNotFoundError:
-        print(f"ERROR: {DATA_FILE} not found. Please upload it!")
-        return
-
     # --- FEATURE SELECTION ---
     # We use the 5 features we decided on + the Target (SalePrice)
     # Ensure these column names MATCH your CSV exactly!
     features = ['OverallQual', 'GrLivArea', 'GarageCars', 'TotalBsmtSF', 'YearBuilt']
     target = 'SalePrice'
 
-    # Check if columns exist
-    missing_cols = [col for col in features + [target] if col not in df.columns]
-    if missing_cols:
-        print(f"ERROR: Missing columns in CSV: {missing_cols}")
-        print("Available columns:", df.columns.tolist())
+    print("--- 1. Loading Data ---")
+    try:
+        # Only the columns we need, from the typed columnar cache of the CSV
+        # (built on first use, rebuilt automatically when the file changes)
+        df = load_frame(DATA_FILE, columns=features + [target])
+        print(f"Loaded {len(df)} rows from {DATA_FILE}")
+    except FileNotFoundError:
+        print(f"ERROR: {DATA_FILE} not found. Please upload it!")
+        return
+    except KeyError as error:
+        # Missing columns in the CSV
+        print(f"ERROR: {error.args[0]}")
+        print("Available numeric columns:", numeric_columns(DATA_FILE))
         return
 
     X = df[features]
@@ -52,11 +54,42 @@ def train_model():
     print(f"  MAE: ${mae:,.2f}")
     print(f"  R2 Score: {r2:.4f}")
 
+    # --- PREDICTION INTERVALS ---
+    # The spread of the errors on the held-out houses. Stored with the model, so
+    # an 80%/95% range at prediction time is just price + low, price + high.
+    from application.predictor import residual_intervals, sidecar_path, file_checksum
+    intervals = residual_intervals(y_test - y_pred)
+    for level, (low, high) in intervals.items():
+        print(f"  {level}% interval: {low:+,.0f} / {high:+,.0f}")
+
     # --- SAVE MODEL ---
     print("--- 3. Saving Model ---")
     joblib.dump(model, MODEL_FILE)
+    metrics = {'mae': float(mae), 'r2': float(r2), 'n_train': len(X_train), 'n_test': len(X_test)}
+    with open(sidecar_path(MODEL_FILE), 'w') as f:
+        json.dump({'checksum': file_checksum(MODEL_FILE), 'features': features,
+                   'metrics': metrics, 'intervals': intervals}, f, indent=2)
     print(f"SUCCESS: Model saved to {MODEL_FILE}")
 
+    # --- REGISTER MODEL ---
+    # New version in the model registry; running web workers hot-reload it.
+    # The X^T X / X^T y statistics of the training rows go with it, so
+    # "flask models retrain" can later add realised sale prices without a full refit.
+    from application.registry import ModelRegistry
+    from application.incremental import SufficientStats, STATS_ARTIFACT
+    stats = SufficientStats(len(features)).update(X_train, y_train)
+    version = ModelRegistry(REGISTRY_DIR).publish(model, metrics=metrics, features=features,
+                                                  artifacts={STATS_ARTIFACT: stats.to_arrays()},
+                                                  extra={'intervals': intervals})
+    print(f"SUCCESS: Registered and activated model version {version}")
+
+    # --- COMPARABLE SALES INDEX ---
+    # KD-tree of the same houses, saved next to the model for /predict's "Comparable Sales"
+    from application.comparables import ComparablesIndex, COMPARABLES_FILE
+    ComparablesIndex.from_csv(DATA_FILE).save(COMPARABLES_FILE)
+    print(f"SUCCESS: Comparable sales index saved to {COMPARABLES_FILE}")
+    return model, metrics
+
 def setup_database():
     print("\n--- 4. Setting up Database ---")
     conn = sqlite3.connect(DB_FILE)
@@ -0,0 +1,224 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from sklearn.ensemble import GradientBoostingRegressor
+from sklearn.impute import SimpleImputer
+from sklearn.linear_model import LinearRegression, Ridge, Lasso
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from sklearn.model_selection import KFold
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+
+from data_loader import load_columns, numeric_columns
+
+# --- CONFIGURATION ---
+DATA_FILE = 'AmesHousing_Cleaned.csv'
+REGISTRY_DIR = 'models'
+TARGET = 'SalePrice'
+
+# The 5 inputs the web form collects. Only candidates trained on exactly these
+# can be served; the others are on the leaderboard to show what more inputs would buy.
+SERVABLE_FEATURES = ['OverallQual', 'GrLivArea', 'GarageCars', 'TotalBsmtSF', 'YearBuilt']
+
+FEATURE_SETS = {
+    'form5': SERVABLE_FEATURES,
+    'size12': SERVABLE_FEATURES + ['1stFlrSF', '2ndFlrSF', 'GarageArea', 'LotArea',
+                                   'FullBath', 'TotRmsAbvGrd', 'YearRemod/Add'],
+    'numeric': None,  # every numeric column in the CSV (filled in at load time)
+}
+
+# (model kind, params) -> estimator. Kinds are plain strings so tasks pickle cheaply.
+def build_estimator(kind, params):
+    if kind == 'linear':
+        return LinearRegression()
+    if kind == 'ridge':
+        return make_pipeline(StandardScaler(), Ridge(alpha=params['alpha']))
+    if kind == 'lasso':
+        return make_pipeline(StandardScaler(), Lasso(alpha=params['alpha'], max_iter=50000))
+    if kind == 'gbr':
+        return GradientBoostingRegressor(n_estimators=params['n_estimators'], max_depth=params['max_depth'],
+                                         learning_rate=0.05, subsample=0.8, random_state=42)
+    raise ValueError(f"Unknown model kind: {kind}")
+
+MODELS = [
+    ('linear', {}),
+    ('ridge', {'alpha': 1.0}),
+    ('ridge', {'alpha': 10.0}),
+    ('lasso', {'alpha': 10.0}),
+    ('lasso', {'alpha': 100.0}),
+    ('gbr', {'n_estimators': 300, 'max_depth': 3}),
+]
+
+
+def default_candidates(feature_sets=FEATURE_SETS, models=MODELS):
+    """Every model on every feature set."""
+    candidates = []
+    for set_name in feature_sets:
+        for kind, params in models:
+            label = kind + ''.join(f"_{k}={v}" for k, v in params.items())
+            candidates.append({'name': f"{label}@{set_name}", 'kind': kind, 'params': params, 'feature_set': set_name})
+    return candidates
+
+
+def make_model(candidate, X):
+    """Estimator for a candidate; columns with gaps get a median imputer in front."""
+    model = build_estimator(candidate['kind'], candidate['params'])
+    if np.isnan(X).any():
+        model = make_pipeline(SimpleImputer(strategy='median'), model)
+    return model
+
+
+# --- WORKER PROCESS ---
+# The dataset is sent to each worker ONCE (initializer), not with every task.
+_DATA = {}
+
+def _init_worker(X, y, columns):
+    _DATA['X'], _DATA['y'], _DATA['columns'] = X, y, columns
+    # One BLAS thread per process, otherwise N processes x M threads fight for the cores
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(1)
+    except ImportError:
+        pass
+
+
+def _run_fold(candidate, features, train_idx, test_idx):
+    cols = [_DATA['columns'].index(f) for f in features]
+    X = _DATA['X'][:, cols]
+    y = _DATA['y']
+
+    model = make_model(candidate, X)
+    start = time.process_time()  # CPU time of this task only
+    model.fit(X[train_idx], y[train_idx])
+    pred = model.predict(X[test_idx])
+    return {
+        'name': candidate['name'],
+        'rmse': float(np.sqrt(mean_squared_error(y[test_idx], pred))),
+        'mae': float(mean_absolute_error(y[test_idx], pred)),
+        'r2': float(r2_score(y[test_idx], pred)),
+        'seconds': time.process_time() - start,
+    }
+
+
+# --- PIPELINE ---
+def load_dataset(path=DATA_FILE):
+    # Numeric columns straight from the columnar cache (no CSV parsing, no text columns)
+    numeric = [c for c in numeric_columns(path) if c != TARGET]
+    arrays = load_columns(path, numeric + [TARGET])
+    X = np.column_stack([arrays[c].astype(np.float64) for c in numeric])
+    feature_sets = dict(FEATURE_SETS, numeric=numeric)
+    return X, arrays[TARGET].astype(np.float64), numeric, feature_sets
+
+
+def cross_validate(X, y, columns, feature_sets, candidates, splits, workers):
+    """Score every (candidate, fold) pair on a pool of `workers` processes. Returns (scores, wall_seconds)."""
+    start = time.perf_counter()
+    scores = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(X, y, columns)) as pool:
+        futures = [pool.submit(_run_fold, c, feature_sets[c['feature_set']], train, test)
+                   for c in candidates for train, test in splits]
+        for future in as_completed(futures):
+            result = future.result()
+            scores.setdefault(result['name'], []).append(result)
+    return scores, time.perf_counter() - start
+
+
+def run_model_selection(data_file=DATA_FILE, candidates=None, folds=5, workers=None,
+                        publish=True, registry_dir=REGISTRY_DIR, verbose=True, measure_speedup=False):
+    """
+    k-fold CV of every candidate, with all (candidate, fold) pairs running in parallel
+    on a process pool of `workers` processes (default: one per core).
+    measure_speedup=True also runs the same tasks on ONE process to report the real speedup.
+    Returns (leaderboard, winner_version_or_None, timing).
+    """
+    X, y, columns, feature_sets = load_dataset(data_file)
+    candidates = candidates or default_candidates(feature_sets)
+    splits = list(KFold(n_splits=folds, shuffle=True, random_state=42).split(X))
+    workers = workers or os.cpu_count()
+
+    if verbose:
+        print(f"--- Model selection: {len(candidates)} candidates x {folds} folds on {workers} workers ---")
+
+    scores, wall = cross_validate(X, y, columns, feature_sets, candidates, splits, workers)
+    cpu = sum(r['seconds'] for rows in scores.values() for r in rows)
+
+    # --- LEADERBOARD ---
+    leaderboard = []
+    for c in candidates:
+        rows = scores[c['name']]
+        leaderboard.append({
+            'name': c['name'],
+            'kind': c['kind'],
+            'params': c['params'],
+            'feature_set': c['feature_set'],
+            'n_features': len(feature_sets[c['feature_set']]),
+            'servable': feature_sets[c['feature_set']] == SERVABLE_FEATURES,
+            'rmse': float(np.mean([r['rmse'] for r in rows])),
+            'rmse_std': float(np.std([r['rmse'] for r in rows])),
+            'mae': float(np.mean([r['mae'] for r in rows])),
+            'r2': float(np.mean([r['r2'] for r in rows])),
+        })
+    leaderboard.sort(key=lambda row: row['rmse'])
+
+    # CPU time / wall clock is how busy the pool kept the cores, not how much faster it was
+    timing = {'wall_seconds': wall, 'task_seconds': cpu, 'workers': workers,
+              'busy_cores': cpu / wall if wall else 0.0}
+    if measure_speedup:
+        _, serial = cross_validate(X, y, columns, feature_sets, candidates, splits, workers=1)
+        timing.update(serial_wall_seconds=serial, speedup=serial / wall if wall else 0.0)
+
+    if verbose:
+        print_leaderboard(leaderboard)
+        print(f"Wall clock {wall:.1f}s on {workers} workers, CPU time {cpu:.1f}s ({timing['busy_cores']:.1f} cores busy)")
+        if measure_speedup:
+            print(f"One worker took {timing['serial_wall_seconds']:.1f}s -> {timing['speedup']:.1f}x speedup")
+
+    # --- WINNER ---
+    version = None
+    servable = [row for row in leaderboard if row['servable']]
+    if publish and servable:
+        best = servable[0]
+        features = feature_sets[best['feature_set']]
+        cols = [columns.index(f) for f in features]
+        model = make_model(best, X[:, cols])
+        model.fit(X[:, cols], y)
+
+        from application.registry import ModelRegistry
+        from application.predictor import normal_intervals
+        metrics = {'cv_rmse': best['rmse'], 'cv_mae': best['mae'], 'cv_r2': best['r2'], 'folds': folds}
+        version = ModelRegistry(registry_dir).publish(
+            model, metrics=metrics, features=features,
+            extra={'candidate': best['name'], 'leaderboard': leaderboard[:20],
+                   'intervals': normal_intervals(best['rmse'])})
+        if verbose:
+            print(f"SUCCESS: Published {best['name']} as model version {version}")
+
+    return leaderboard, version, timing
+
+
+def print_leaderboard(leaderboard):
+    print(f"{'#':>3}  {'candidate':<40}{'RMSE':>12}{'+/-':>10}{'MAE':>12}{'R2':>8}  serve")
+    for i, row in enumerate(leaderboard, 1):
+        print(f"{i:>3}  {row['name']:<40}{row['rmse']:>12,.0f}{row['rmse_std']:>10,.0f}"
+              f"{row['mae']:>12,.0f}{row['r2']:>8.4f}  {'yes' if row['servable'] else '-'}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Pick the best model with k-fold CV on a process pool.")
+    parser.add_argument('--workers', type=int, default=None, help="Processes to use (default: all cores)")
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--no-publish', action='store_true', help="Only print the leaderboard")
+    parser.add_argument('--leaderboard', help="Also write the leaderboard to this JSON file")
+    parser.add_argument('--measure-speedup', action='store_true',
+                        help="Run the CV a second time on one worker and report the real speedup")
+    args = parser.parse_args()
+
+    board, _, timing = run_model_selection(folds=args.folds, workers=args.workers, publish=not args.no_publish,
+                                           measure_speedup=args.measure_speedup)
+    if args.leaderboard:
+        with open(args.leaderboard, 'w') as f:
+            json.dump({'leaderboard': board, 'timing': timing}, f, indent=2)
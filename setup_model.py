@@ -1,31 +1,33 @@
-import pandas as pd
+import json
 import joblib
 from sklearn.linear_model import LinearRegression
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error, r2_score
+from data_loader import load_frame
 
 # --- CONFIGURATION ---
 DATA_FILE = 'AmesHousing_Cleaned.csv'
 MODEL_FILE = 'housing_model.pkl'
+REGISTRY_DIR = 'models'
 
 def train_model():
+    # --- FEATURE SELECTION ---
+    # The 5 features + Target
+    features = ['OverallQual', 'GrLivArea', 'GarageCars', 'TotalBsmtSF', 'YearBuilt']
+    target = 'SalePrice'
+
     print("--- 1. Loading Data ---")
     try:
-        df = pd.read_csv(DATA_FILE)
+        # Only the columns we need, from the typed columnar cache of the CSV
+        # (built on first use, rebuilt automatically when the file changes)
+        df = load_frame(DATA_FILE, columns=features + [target])
         print(f"Loaded {len(df)} rows from {DATA_FILE}")
     except FileNotFoundError:
         print(f"ERROR: {DATA_FILE} not found. Please upload it!")
         return
-
-    # --- FEATURE SELECTION ---
-    # The 5 features + Target
-    features = ['OverallQual', 'GrLivArea', 'GarageCars', 'TotalBsmtSF', 'YearBuilt']
-    target = 'SalePrice'
-
-    # Check for missing columns to prevent crashes
-    missing_cols = [col for col in features + [target] if col not in df.columns]
-    if missing_cols:
-        print(f"ERROR: Missing columns in CSV: {missing_cols}")
+    except KeyError as error:
+        # Missing columns in the CSV
+        print(f"ERROR: {error.args[0]}")
         return
 
     X = df[features]
@@ -48,10 +50,47 @@ def train_model():
     print(f"  MAE: ${mae:,.2f}")
     print(f"  R2 Score: {r2:.4f}")
 
+    # --- PREDICTION INTERVALS ---
+    # The spread of the errors on the held-out houses. Stored with the model, so
+    # an 80%/95% range at prediction time is just price + low, price + high.
+    from application.predictor import residual_intervals, sidecar_path, file_checksum
+    intervals = residual_intervals(y_test - y_pred)
+    for level, (low, high) in intervals.items():
+        print(f"  {level}% interval: {low:+,.0f} / {high:+,.0f}")
+
     # --- SAVE MODEL ---
     print("--- 3. Saving Model ---")
     joblib.dump(model, MODEL_FILE)
+    metrics = {'mae': float(mae), 'r2': float(r2), 'n_train': len(X_train), 'n_test': len(X_test)}
+    with open(sidecar_path(MODEL_FILE), 'w') as f:
+        json.dump({'checksum': file_checksum(MODEL_FILE), 'features': features,
+                   'metrics': metrics, 'intervals': intervals}, f, indent=2)
     print(f"SUCCESS: Model saved to {MODEL_FILE}")
 
+    # --- REGISTER MODEL ---
+    # New version in the model registry; running web workers hot-reload it.
+    # The X^T X / X^T y statistics of the training rows go with it, so
+    # "flask models retrain" can later add realised sale prices without a full refit.
+    from application.registry import ModelRegistry
+    from application.incremental import SufficientStats, STATS_ARTIFACT
+    stats = SufficientStats(len(features)).update(X_train, y_train)
+    version = ModelRegistry(REGISTRY_DIR).publish(model, metrics=metrics, features=features,
+                                                  artifacts={STATS_ARTIFACT: stats.to_arrays()},
+                                                  extra={'intervals': intervals})
+    print(f"SUCCESS: Registered and activated model version {version}")
+
+    # --- COMPARABLE SALES INDEX ---
+    # KD-tree of the same houses, saved next to the model for /predict's "Comparable Sales"
+    from application.comparables import ComparablesIndex, COMPARABLES_FILE
+    ComparablesIndex.from_csv(DATA_FILE).save(COMPARABLES_FILE)
+    print(f"SUCCESS: Comparable sales index saved to {COMPARABLES_FILE}")
+    return model, metrics
+
 if __name__ == "__main__":
-    train_model()
\ No newline at end of file
+    import sys
+    if '--select' in sys.argv:
+        # Cross-validate several candidate models in parallel and publish the best one
+        from model_selection import run_model_selection
+        run_model_selection()
+    else:
+        train_model()
\ No newline at end of file
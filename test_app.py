@@ -1,19 +1,30 @@
 import pytest
-from application import app, db
+import json
+from application import create_app, db
 # [FIX] Changed 'Entry' to 'History'
 from application.models import User, History 
 
+
 @pytest.fixture
-def client():
-    app.config['TESTING'] = True
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
-    app.config['WTF_CSRF_ENABLED'] = False # Disable CSRF for easier testing
-    
+def app(tmp_path):
+    # Each test gets its own app and a fresh SQLite file under tmp_path
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/t.db',
+        'TESTING': True,
+        'WTF_CSRF_ENABLED': False,  # Disable CSRF for easier testing
+    })
+
     with app.app_context():
         db.create_all()
-        yield app.test_client()
+        yield app
         db.session.remove()
-        db.drop_all()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
 
 def test_register(client):
     """Test that registration works"""
@@ -24,6 +35,7 @@ def test_register(client):
     }, follow_redirects=True)
     assert b"Account created" in response.data
 
+
 def test_login(client):
     """Test that login works"""
     # Create user first
@@ -40,7 +52,8 @@ def test_login(client):
     }, follow_redirects=True)
     assert b"Welcome back" in response.data
 
-def test_add_prediction(client):
+
+def test_add_prediction(client, app):
     """Test that a prediction is saved to History"""
     # 1. Login
     client.post('/register', data={
@@ -65,7 +78,8 @@ def test_add_prediction(client):
         assert History.query.count() == 1
         assert History.query.first().overall_qual == 7
 
-def test_update_account(client):
+
+def test_update_account(client, app):
     """Test that a user can change their username"""
     # 1. Login
     client.post('/register', data={
@@ -88,7 +102,8 @@ def test_update_account(client):
         user = User.query.first()
         assert user.username == 'NewName'
 
-def test_delete_account(client):
+
+def test_delete_account(client, app):
     """Test account deletion"""
     # 1. Login
     client.post('/register', data={
@@ -106,7 +121,8 @@ def test_delete_account(client):
     with app.app_context():
         assert User.query.count() == 0
 
-def test_history_filter_and_sort(client):
+
+def test_history_filter_and_sort(client, app):
     """Test that we can filter by Quality and Sort by Price"""
     # 1. Login
     client.post('/register', data={'username': 'SortUser', 'password': 'pw', 'confirm_password': 'pw'}, follow_redirects=True)
@@ -149,4 +165,1001 @@ def test_history_filter_and_sort(client):
     pos_expensive = html.find("500,000.00")
     pos_cheap = html.find("100,000.00")
     
-    assert pos_expensive < pos_cheap  # Expensive must be first
\ No newline at end of file
+    assert pos_expensive < pos_cheap  # Expensive must be first
+
+
+def test_api_predict_batch(client, app):
+    """Test that /api/predict scores a list in order and reports bad rows"""
+    house = {'overall_qual': 7, 'gr_liv_area': 1500, 'garage_cars': 2, 'total_bsmt_sf': 1000, 'year_built': 2000}
+    bad = dict(house, overall_qual=11, year_built='abc')
+
+    response = client.post('/api/predict', json=[house, bad, house])
+    assert response.status_code == 200
+    data = response.get_json()
+
+    assert data['count'] == 3 and data['valid'] == 2
+    assert [r['index'] for r in data['results']] == [0, 1, 2]
+    assert data['results'][0]['prediction'] == data['results'][2]['prediction']
+    assert set(data['results'][1]['errors']) == {'overall_qual', 'year_built'}
+
+    # 80% / 95% ranges around every valid price
+    low, high = data['results'][0]['interval']['80']
+    assert low < data['results'][0]['prediction'] < high
+    assert data['results'][0]['interval']['95'][0] <= low and 'interval' not in data['results'][1]
+
+    # Infinity (JSON or text) is a row error, not a 500
+    body = '[{"overall_qual": 7, "gr_liv_area": Infinity, "garage_cars": 2, "total_bsmt_sf": "inf", "year_built": 2000}]'
+    response = client.post('/api/predict', data=body, content_type='application/json')
+    assert response.status_code == 200
+    assert set(response.get_json()['results'][0]['errors']) == {'gr_liv_area', 'total_bsmt_sf'}
+
+    # A single object works too, and anonymous calls never write History
+    response = client.post('/api/predict', json=house)
+    assert response.get_json()['results'][0]['prediction'] > 0
+    with app.app_context():
+        assert History.query.count() == 0
+
+
+def test_api_predict_saves_history_and_limits(client, app):
+    """Test History saving (and ?save=0) for logged-in users, plus the batch limit"""
+    client.post('/register', data={'username': 'ApiUser', 'password': 'pw', 'confirm_password': 'pw'}, follow_redirects=True)
+    client.post('/login', data={'username': 'ApiUser', 'password': 'pw'}, follow_redirects=True)
+    house = {'overall_qual': 5, 'gr_liv_area': 1200, 'garage_cars': 1, 'total_bsmt_sf': 800, 'year_built': 1995}
+
+    response = client.post('/api/predict', json=[house, house])
+    assert response.get_json()['saved'] == 2
+    client.post('/api/predict?save=0', json=[house])
+    with app.app_context():
+        assert History.query.count() == 2
+
+    app.config['API_MAX_BATCH'] = 2
+    try:
+        response = client.post('/api/predict', json=[house] * 3)
+        assert response.status_code == 413
+    finally:
+        app.config['API_MAX_BATCH'] = 5000
+
+
+def test_api_predict_stream_ndjson_and_csv(client):
+    """Test that the streaming endpoint scores NDJSON and CSV bodies row by row"""
+    ndjson = '\n'.join([
+        '{"id": "a", "overall_qual": 7, "gr_liv_area": 1500, "garage_cars": 2, "total_bsmt_sf": 1000, "year_built": 2000}',
+        'not json',
+        '{"id": "c", "overall_qual": 0, "gr_liv_area": 1500, "garage_cars": 2, "total_bsmt_sf": 1000, "year_built": 2000}',
+    ])
+    response = client.post('/api/predict/stream?chunk_size=2', data=ndjson, content_type='application/x-ndjson')
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert [r['index'] for r in rows] == [0, 1, 2]
+    assert rows[0]['id'] == 'a' and rows[0]['prediction'] > 0
+    assert 'record' in rows[1]['errors']
+    assert 'overall_qual' in rows[2]['errors']
+
+    csv_body = "OverallQual,GrLivArea,GarageCars,TotalBsmtSF,YearBuilt\n6,1656,2.0,1080.0,1960\n"
+    response = client.post('/api/predict/stream', data=csv_body, content_type='text/csv')
+    assert json.loads(response.data)['prediction'] > 0
+
+
+def test_score_stream_is_lazy(app):
+    """Test that the pipeline only pulls one chunk at a time (bounded memory)"""
+    from itertools import count, islice
+    from application.services import ml
+    from application.scoring import score_stream
+
+    house = {'overall_qual': 5, 'gr_liv_area': 1200, 'garage_cars': 1, 'total_bsmt_sf': 800, 'year_built': 1995}
+    pulled = []
+
+    def endless():
+        for i in count():
+            pulled.append(i)
+            yield house
+
+    results = list(islice(score_stream(ml.model_manager.get(), endless(), chunk_size=100), 150))
+    assert len(results) == 150
+    assert len(pulled) == 200  # exactly two chunks were read, not the whole (infinite) input
+
+
+def test_create_app_is_lazy(tmp_path):
+    """Test that building the app neither prints, touches the database nor imports the ML stack"""
+    import os
+    import subprocess
+    import sys
+    code = ("import sys\n"
+            "from application import create_app\n"
+            "create_app()\n"
+            "print(sorted(m for m in ('pandas', 'sklearn', 'scipy', 'joblib') if m in sys.modules))\n")
+    db_file = tmp_path / 'lazy.db'
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                            env={**os.environ, 'DATABASE_URL': f'sqlite:///{db_file}'})
+    assert result.stdout == '[]\n'
+    assert not db_file.exists()
+
+
+def test_create_app_instances_are_independent(tmp_path):
+    """Test that every app gets its own components instead of rebinding shared ones to the last app"""
+    from application.services import ml
+    from application.writebehind import history_writer
+    a = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/a.db'})
+    b = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/b.db', 'HISTORY_WRITE_MODE': 'off'})
+
+    for name in ('ml', 'metrics', 'http_cache', 'kdf_pool', 'history_writer', 'identity_cache'):
+        assert a.extensions[name] is not b.extensions[name]
+    with a.app_context():
+        assert ml.config is a.config and history_writer.mode == 'sync'
+    with b.app_context():
+        assert ml.config is b.config and history_writer.mode == 'off'
+
+
+def test_score_cli(tmp_path, app):
+    """Test the offline 'flask score' command on a CSV shaped like AmesHousing_Cleaned.csv"""
+    src = tmp_path / 'houses.csv'
+    src.write_text("OverallQual,GrLivArea,GarageCars,TotalBsmtSF,YearBuilt,SalePrice\n"
+                   "6,1656,2.0,1080.0,1960,215000\n"
+                   "5,896,1.0,882.0,1872,105000\n")
+    out = tmp_path / 'scores.jsonl'
+
+    result = app.test_cli_runner().invoke(args=['score', str(src), '-o', str(out), '--chunk-size', '1'])
+    assert result.exit_code == 0, result.output
+
+    rows = [json.loads(line) for line in out.read_text().splitlines()]
+    assert rows[0]['prediction'] > 0
+    assert 'year_built' in rows[1]['errors']
+
+
+def test_history_write_behind_batching(client, app):
+    """Test that 'batched' mode queues predictions and writes them in one flush"""
+    from datetime import datetime
+    from application.writebehind import history_writer
+
+    client.post('/register', data={'username': 'BatchUser', 'password': 'pw', 'confirm_password': 'pw'}, follow_redirects=True)
+    client.post('/login', data={'username': 'BatchUser', 'password': 'pw'}, follow_redirects=True)
+    house = {'overall_qual': 6, 'gr_liv_area': 1400, 'garage_cars': 2, 'total_bsmt_sf': 900, 'year_built': 1985}
+
+    old = (history_writer.mode, history_writer.batch_size, history_writer.flush_interval)
+    history_writer.mode, history_writer.batch_size, history_writer.flush_interval = 'batched', 1000, 60
+    try:
+        client.post('/predict', data=house, follow_redirects=True)
+        client.post('/api/predict', json=[house, house])
+
+        # Nothing committed yet, everything is waiting in the queue
+        with app.app_context():
+            assert History.query.count() == 0
+        assert history_writer.stats()['queue_depth'] == 3
+
+        assert history_writer.flush() == 3
+        stats = history_writer.stats()
+        assert stats['queue_depth'] == 0 and stats['flushes'] >= 1
+        assert stats['flush_seconds_last'] > 0
+        with app.app_context():
+            assert History.query.count() == 3
+
+        # A page view writes only its own user's queued rows
+        other = {'predicted_on': datetime.utcnow(), 'overall_qual': 5, 'gr_liv_area': 900, 'garage_cars': 1,
+                 'total_bsmt_sf': 500, 'year_built': 1970, 'prediction': 1.0, 'model_version': None}
+        with app.app_context():
+            db.session.add(User(username='OtherBatchUser', password='x'))
+            db.session.commit()
+            other_id = User.query.filter_by(username='OtherBatchUser').one().id
+        with history_writer._lock:
+            history_writer._buffer.append(dict(other, user_id=other_id))
+        client.post('/predict', data=house, follow_redirects=True)
+        client.get('/history')
+        with app.app_context():
+            assert History.query.count() == 4
+        assert history_writer.stats()['queue_depth'] == 1
+
+        # One bad row (NULL prediction) does not take the rest of the batch with it
+        client.post('/api/predict', json=[house, house])
+        with history_writer._lock:
+            history_writer._buffer.append(dict(other, user_id=other_id, prediction=None))
+        assert history_writer.flush() == 3
+        assert history_writer.stats()['failed'] == 1
+        with app.app_context():
+            assert History.query.count() == 7
+
+        # 'off' mode stores nothing
+        history_writer.mode = 'off'
+        client.post('/api/predict', json=house)
+        with app.app_context():
+            assert History.query.count() == 7
+    finally:
+        history_writer.mode, history_writer.batch_size, history_writer.flush_interval = old
+
+
+def test_history_writer_registers_close_at_exit_once(app, monkeypatch):
+    """Test that re-running init_app() does not stack atexit handlers"""
+    import atexit
+    from application.writebehind import HistoryWriter
+
+    registered = []
+    monkeypatch.setattr(atexit, 'register', registered.append)
+    writer = HistoryWriter(app)
+    writer.init_app(app)
+    writer.init_app(app)
+    assert registered == [writer.close]
+
+
+def test_history_keyset_pagination(client, app):
+    """Test that /history pages through rows with cursors, without gaps or repeats"""
+    import re
+    from datetime import datetime, timedelta
+
+    client.post('/register', data={'username': 'PageUser', 'password': 'pw', 'confirm_password': 'pw'}, follow_redirects=True)
+    client.post('/login', data={'username': 'PageUser', 'password': 'pw'}, follow_redirects=True)
+
+    with app.app_context():
+        user = User.query.filter_by(username='PageUser').first()
+        # Prices 1..7, two rows share the same price to exercise the id tie-breaker
+        prices = [1, 2, 3, 3, 5, 6, 7]
+        db.session.add_all([
+            History(overall_qual=5, gr_liv_area=1000 + i, garage_cars=1, total_bsmt_sf=800, year_built=1990,
+                    prediction=price * 1000.0, predicted_on=datetime(2024, 1, 1) + timedelta(days=i), user_id=user.id)
+            for i, price in enumerate(prices)
+        ])
+        db.session.commit()
+
+    app.config['HISTORY_PAGE_SIZE'] = 3
+    try:
+        seen = []
+        url = '/history?sort=price&order=asc'
+        while url:
+            html = client.get(url).data.decode()
+            seen += re.findall(r'(\d+) sqft</td>\s*<td>\d+ cars', html)
+            match = re.search(r'href="([^"]*after=[^"]*)"', html)
+            url = match.group(1).replace('&amp;', '&') if match else None
+
+        # Every row exactly once, in price order
+        assert seen == ['1000', '1001', '1002', '1003', '1004', '1005', '1006']
+
+        # A crafted cursor (wrong value type) is ignored: first page, not a 500
+        import base64
+        for value in ({'a': 1}, [1], '2024-01-01', True):
+            token = base64.urlsafe_b64encode(json.dumps([value, 5]).encode()).decode()
+            response = client.get(f'/history?sort=price&order=asc&after={token}')
+            assert response.status_code == 200 and '1000 sqft' in response.data.decode()
+        token = base64.urlsafe_b64encode(json.dumps([3000, 5]).encode()).decode()
+        assert client.get(f'/history?sort=date&after={token}').status_code == 200
+    finally:
+        app.config['HISTORY_PAGE_SIZE'] = 50
+
+
+def test_history_page_query_uses_index(client, app):
+    """Test that a sorted history page is served by the composite (user_id, column, id) index"""
+    from application.history_query import filtered_query, sort_spec, apply_sort
+
+    with app.app_context():
+        sort_key, column, descending = sort_spec({'sort': 'price'})
+        query = apply_sort(filtered_query(1, {}), column, descending).limit(50)
+        sql = str(query.statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+        plan = ' '.join(str(row) for row in db.session.execute(db.text('EXPLAIN QUERY PLAN ' + sql)))
+
+        assert 'ix_history_user_prediction' in plan
+        assert 'TEMP B-TREE' not in plan  # no sort step, rows come out of the index in order
+
+
+def test_init_db_adds_missing_indexes(client, app):
+    """Test that 'flask init-db' adds columns/indexes to a database created before they existed"""
+    with app.app_context():
+        db.session.execute(db.text('DROP INDEX ix_history_user_prediction'))
+        db.session.execute(db.text('ALTER TABLE history DROP COLUMN model_version'))
+        db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=['init-db'])
+    assert 'Created index ix_history_user_prediction' in result.output
+    assert 'Added column model_version to history' in result.output
+
+    # Running it again changes nothing
+    result = app.test_cli_runner().invoke(args=['init-db'])
+    assert 'up to date' in result.output
+
+
+def test_history_range_filters_and_summary(client, app):
+    """Test min/max filters and the SQL summary (houses built 1990-2000 under $200k)"""
+    from application.history_query import filtered_query, summarize
+    from datetime import datetime
+
+    client.post('/register', data={'username': 'RangeUser', 'password': 'pw', 'confirm_password': 'pw'}, follow_redirects=True)
+    client.post('/login', data={'username': 'RangeUser', 'password': 'pw'}, follow_redirects=True)
+
+    with app.app_context():
+        user = User.query.filter_by(username='RangeUser').first()
+        rows = [(5, 1985, 150000.0), (5, 1995, 120000.0), (7, 1998, 180000.0), (7, 1999, 250000.0), (8, 2005, 190000.0)]
+        db.session.add_all([
+            History(overall_qual=q, gr_liv_area=1500, garage_cars=2, total_bsmt_sf=900, year_built=y,
+                    prediction=p, predicted_on=datetime(2024, 1, 1), user_id=user.id)
+            for q, y, p in rows
+        ])
+        db.session.commit()
+
+        args = {'year_min': '1990', 'year_max': '2000', 'price_max': '200000'}
+        summary = summarize(filtered_query(user.id, args))
+        assert summary['count'] == 2
+        assert summary['mean'] == pytest.approx(150000.0)
+        assert (summary['min'], summary['max']) == (120000.0, 180000.0)
+        assert [(b['quality'], b['count']) for b in summary['by_quality']] == [(5, 1), (7, 1)]
+
+    response = client.get('/history?year_min=1990&year_max=2000&price_max=200000')
+    html = response.data.decode()
+    assert '120,000.00' in html and '180,000.00' in html
+    assert '150,000.00' not in html and '250,000.00' not in html and '190,000.00' not in html
+
+
+def test_history_summary_uses_covering_index(client, app):
+    """Test that the per-quality summary is answered from the (user_id, overall_qual, prediction) index"""
+    from application.history_query import filtered_query
+
+    with app.app_context():
+        query = filtered_query(1, {}).with_entities(
+            History.overall_qual, db.func.count(), db.func.avg(History.prediction)
+        ).group_by(History.overall_qual)
+        sql = str(query.statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+        plan = ' '.join(str(row) for row in db.session.execute(db.text('EXPLAIN QUERY PLAN ' + sql)))
+        assert 'COVERING INDEX ix_history_user_qual_prediction' in plan
+
+
+def _login_with_history(client, username, n_rows):
+    """Helper: register + login a user and bulk insert n_rows History rows (prices 0..n-1)"""
+    from datetime import datetime
+    client.post('/register', data={'username': username, 'password': 'pw', 'confirm_password': 'pw'}, follow_redirects=True)
+    client.post('/login', data={'username': username, 'password': 'pw'}, follow_redirects=True)
+    with client.application.app_context():
+        user_id = User.query.filter_by(username=username).first().id
+        db.session.execute(db.insert(History), [
+            {'overall_qual': 1 + i % 10, 'gr_liv_area': 1000 + i, 'garage_cars': i % 4, 'total_bsmt_sf': 800,
+             'year_built': 1990 + i % 30, 'prediction': float(i), 'predicted_on': datetime(2024, 1, 1), 'user_id': user_id}
+            for i in range(n_rows)
+        ])
+        db.session.commit()
+    return user_id
+
+
+def test_history_export_formats(client):
+    """Test that /history/export honours filters + sort in CSV, NDJSON and Parquet"""
+    import csv, io
+    _login_with_history(client, 'ExportUser', 20)
+
+    response = client.get('/history/export?quality=3&sort=price&order=desc')
+    assert response.mimetype == 'text/csv'
+    assert 'attachment' in response.headers['Content-Disposition']
+    rows = list(csv.DictReader(io.StringIO(response.data.decode())))
+    assert [float(r['prediction']) for r in rows] == [12.0, 2.0]
+
+    response = client.get('/history/export?format=ndjson&price_min=18')
+    rows = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert sorted(r['prediction'] for r in rows) == [18.0, 19.0]
+
+    assert client.get('/history/export?format=xml').status_code == 400
+
+    import pyarrow.parquet as pq
+    response = client.get('/history/export?format=parquet&sort=price&order=asc')
+    table = pq.read_table(io.BytesIO(response.data))
+    assert table.num_rows == 20
+    assert table.column('prediction').to_pylist() == [float(i) for i in range(20)]
+
+
+def test_history_export_streams_large_history(client, monkeypatch):
+    """
+    Test that a large export streams: the first bytes are sent after one batch of
+    the query is read, and memory stays at a few batches, not the full row count.
+    """
+    import tracemalloc
+    from application import routes
+    n_rows = 50_000
+    _login_with_history(client, 'BigExporter', n_rows)
+
+    batches_read, iter_row_batches = [], routes.iter_row_batches
+    def counting_batches(query, batch_size):
+        for batch in iter_row_batches(query, batch_size):
+            batches_read.append(len(batch))
+            yield batch
+    monkeypatch.setattr(routes, 'iter_row_batches', counting_batches)
+
+    tracemalloc.start()
+    response = client.get('/history/export')
+    chunks = iter(response.response)
+    first = next(chunks)
+    read_before_first_chunk = len(batches_read)
+
+    total_bytes, lines = len(first), first.count(b'\n')
+    for chunk in chunks:
+        total_bytes += len(chunk)
+        lines += chunk.count(b'\n')
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    response.close()
+
+    assert lines == n_rows + 1  # header + every row
+    assert read_before_first_chunk <= 1 and len(batches_read) > 10  # first bytes long before the end
+    assert peak < total_bytes / 2  # never buffered the whole file
+
+
+def test_history_records_model_version(client, app):
+    """Test that every saved prediction remembers which model version produced it"""
+    from application.services import ml
+
+    client.post('/register', data={'username': 'VersionUser', 'password': 'pw', 'confirm_password': 'pw'}, follow_redirects=True)
+    client.post('/login', data={'username': 'VersionUser', 'password': 'pw'}, follow_redirects=True)
+    client.post('/predict', data={'overall_qual': 7, 'gr_liv_area': 1500, 'garage_cars': 2,
+                                  'total_bsmt_sf': 1000, 'year_built': 2000}, follow_redirects=True)
+
+    with app.app_context():
+        entry = History.query.first()
+        assert entry.model_version is not None
+        assert entry.model_version == ml.model_manager.version
+
+
+def test_incremental_retrain_matches_full_refit(client, app, tmp_path):
+    """Test that recorded sale prices update the model in chunks and give the same weights as a full refit"""
+    import numpy as np
+    import pandas as pd
+    from datetime import datetime, timedelta
+    from sklearn.linear_model import LinearRegression
+    from application.registry import ModelRegistry
+    from application.incremental import SufficientStats, retrain_incremental, STATS_ARTIFACT
+    from application.predictor import FEATURES
+
+    # Base model: trained on the CSV, with its statistics saved next to it
+    df = pd.read_csv('AmesHousing_Cleaned.csv').dropna(subset=FEATURES)
+    X_base, y_base = df[FEATURES].to_numpy(float)[:1000], df['SalePrice'].to_numpy(float)[:1000]
+    registry = ModelRegistry(str(tmp_path / 'models'))
+    registry.publish(LinearRegression().fit(X_base, y_base), features=FEATURES,
+                     artifacts={STATS_ARTIFACT: SufficientStats().update(X_base, y_base).to_arrays()})
+
+    # Realised prices: two through the API, the rest inserted directly
+    user_id = _login_with_history(client, 'SalesUser', 2)
+    with app.app_context():
+        ids = [entry.id for entry in History.query.order_by(History.id)]
+    assert client.post(f'/api/history/{ids[0]}/sale', json={'sale_price': 181000}).status_code == 200
+    assert client.post(f'/api/history/{ids[1]}/sale', json={'sale_price': 95500.5}).status_code == 200
+    assert client.post(f'/api/history/{ids[1]}/sale', json={'sale_price': 1}).status_code == 409
+    assert client.post(f'/api/history/{ids[1]}/sale', json={'sale_price': 'lots'}).status_code == 400
+    assert client.post('/api/history/999999/sale', json={'sale_price': 1}).status_code == 404
+
+    def record_sales(rows, start):
+        with app.app_context():
+            db.session.execute(db.insert(History), [
+                {'overall_qual': int(r[0]), 'gr_liv_area': int(r[1]), 'garage_cars': int(r[2]),
+                 'total_bsmt_sf': int(r[3]), 'year_built': int(r[4]), 'prediction': 0.0,
+                 'sale_price': float(price), 'sale_recorded_on': start + timedelta(seconds=i), 'sale_learned': False,
+                 'predicted_on': datetime(2024, 1, 1), 'user_id': user_id}
+                for i, (r, price) in enumerate(rows)])
+            db.session.commit()
+
+    def refit():
+        with app.app_context():
+            sold = (History.query.filter(History.sale_price.isnot(None))
+                    .with_entities(History.overall_qual, History.gr_liv_area, History.garage_cars,
+                                   History.total_bsmt_sf, History.year_built, History.sale_price).all())
+        data = np.array(sold, dtype=float)
+        return LinearRegression().fit(np.vstack([X_base, data[:, :5]]), np.concatenate([y_base, data[:, 5]]))
+
+    def weights(version):
+        model, _ = registry.load_model(version)
+        return np.append(model.coef_, model.intercept_)
+
+    new = df.iloc[1000:1500]
+    record_sales(zip(new[FEATURES].to_numpy(), new['SalePrice']), datetime(2030, 1, 1))
+    with app.app_context():
+        version, rows = retrain_incremental(registry, chunk_size=64)
+    assert rows == 502 and registry.active_version() == version
+    expected = refit()
+    np.testing.assert_allclose(weights(version), np.append(expected.coef_, expected.intercept_), rtol=1e-8)
+
+    # Nothing new -> no new version; more sales -> only those are read
+    with app.app_context():
+        assert retrain_incremental(registry) == (None, 0)
+    more = df.iloc[1500:1600]
+    record_sales(zip(more[FEATURES].to_numpy(), more['SalePrice']), datetime(2031, 1, 1))
+    with app.app_context():
+        version2, rows = retrain_incremental(registry, chunk_size=64)
+    assert rows == 100
+    assert registry.metadata(version2)['incremental']['base_version'] == version
+    expected = refit()
+    np.testing.assert_allclose(weights(version2), np.append(expected.coef_, expected.intercept_), rtol=1e-8)
+
+    # A sale committed late, stamped before the last retrain ran, is still learned
+    late = df.iloc[1600:1610]
+    record_sales(zip(late[FEATURES].to_numpy(), late['SalePrice']), datetime(2020, 1, 1))
+    with app.app_context():
+        version3, rows = retrain_incremental(registry)
+        assert History.query.filter(History.sale_learned.is_(False)).count() == 0
+    assert rows == 10
+    expected = refit()
+    np.testing.assert_allclose(weights(version3), np.append(expected.coef_, expected.intercept_), rtol=1e-8)
+
+
+def test_comparables_on_predict_and_api(client):
+    """Test that /predict lists similar sold houses and ?comparables=K adds them to API results"""
+    client.post('/register', data={'username': 'CompUser', 'password': 'pw', 'confirm_password': 'pw'}, follow_redirects=True)
+    client.post('/login', data={'username': 'CompUser', 'password': 'pw'}, follow_redirects=True)
+    response = client.post('/predict', data={'overall_qual': 7, 'gr_liv_area': 1500, 'garage_cars': 2,
+                                             'total_bsmt_sf': 1000, 'year_built': 2000}, follow_redirects=True)
+    assert b"Comparable Sales" in response.data
+    assert b"80% range" in response.data and b"95% range" in response.data
+
+    house = {'overall_qual': 7, 'gr_liv_area': 1500, 'garage_cars': 2, 'total_bsmt_sf': 1000, 'year_built': 2000}
+    data = client.post('/api/predict?save=0&comparables=3', json=[house, dict(house, overall_qual=99)]).get_json()
+    similar = data['results'][0]['comparables']
+    assert len(similar) == 3
+    assert [c['distance'] for c in similar] == sorted(c['distance'] for c in similar)
+    assert {'sale_price', 'neighborhood', 'overall_qual'} <= set(similar[0])
+    assert 'comparables' not in data['results'][1]
+
+    # Off by default
+    assert 'comparables' not in client.post('/api/predict', json=house).get_json()['results'][0]
+
+
+def test_load_user_identity_cache(client, app):
+    """Test that authenticated requests skip the User SELECT while cached, and that account changes invalidate it"""
+    from sqlalchemy import event
+    from application.identity import identity_cache
+
+    client.post('/register', data={'username': 'CacheUser', 'password': 'pw', 'confirm_password': 'pw'}, follow_redirects=True)
+    client.post('/login', data={'username': 'CacheUser', 'password': 'pw'}, follow_redirects=True)
+
+    statements = []
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    def queries_for(url):
+        statements.clear()
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', count)
+            try:
+                assert client.get(url).status_code == 200
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', count)
+        return len(statements)
+
+    # /predict (GET) needs no data at all: the only query was load_user()
+    cached = queries_for('/predict')
+    ttl, identity_cache.ttl = identity_cache.ttl, 0
+    try:
+        uncached = queries_for('/predict')
+    finally:
+        identity_cache.ttl = ttl
+    assert cached == 0 and uncached == 1
+
+    # Updating the account through the cached user writes to the DB and drops the stale entry
+    client.post('/account', data={'username': 'RenamedUser', 'password': '', 'confirm_password': ''},
+                follow_redirects=True)
+    with app.app_context():
+        assert User.query.filter_by(username='RenamedUser').count() == 1
+    assert b'RenamedUser' in client.get('/account').data
+
+    client.post('/account/delete', follow_redirects=True)
+    assert identity_cache.stats()['size'] == 0
+    with app.app_context():
+        assert User.query.count() == 0
+
+
+def test_auth_pool_rejects_when_saturated(client, app):
+    """Test that login/register answer 429 at once while every password-hashing slot is busy"""
+    import threading, time
+    from application.authpool import kdf_pool
+
+    client.post('/register', data={'username': 'PoolUser', 'password': 'pw', 'confirm_password': 'pw'}, follow_redirects=True)
+    old = {key: app.config[key] for key in ('AUTH_POOL_WORKERS', 'AUTH_POOL_QUEUE')}
+    app.config.update(AUTH_POOL_WORKERS=1, AUTH_POOL_QUEUE=0)
+    kdf_pool.init_app(app)
+    release = threading.Event()
+    blocker = threading.Thread(target=kdf_pool.run, args=(release.wait,))
+    try:
+        blocker.start()
+        while kdf_pool.stats()['in_flight'] < 1:
+            time.sleep(0.001)
+
+        start = time.perf_counter()
+        response = client.post('/login', data={'username': 'PoolUser', 'password': 'pw'})
+        assert response.status_code == 429 and response.headers['Retry-After'] == '1'
+        assert time.perf_counter() - start < 0.1  # rejected, not queued behind the KDF
+        assert client.post('/register', data={'username': 'Other', 'password': 'pw',
+                                              'confirm_password': 'pw'}).status_code == 429
+        assert kdf_pool.stats()['rejected'] >= 2
+
+        release.set()
+        blocker.join()
+        response = client.post('/login', data={'username': 'PoolUser', 'password': 'pw'}, follow_redirects=True)
+        assert b"Welcome back" in response.data
+    finally:
+        release.set()
+        app.config.update(old)
+        kdf_pool.init_app(app)
+
+
+def test_auth_pool_reconfigure_with_hash_in_flight(app):
+    """Test that init_app() retires the old executor and in-flight hashes release the slot they took"""
+    import threading, time
+    from application.authpool import KDFPool
+
+    pool = KDFPool(app)
+    release = threading.Event()
+    errors = []
+
+    def hash_in_flight():
+        try:
+            pool.run(release.wait)
+        except Exception as error:
+            errors.append(error)
+
+    blocker = threading.Thread(target=hash_in_flight)
+    blocker.start()
+    while pool.stats()['in_flight'] < 1:
+        time.sleep(0.001)
+    old_executor = pool._executor
+    pool.init_app(app)
+    release.set()
+    blocker.join()
+
+    assert errors == []
+    assert old_executor._shutdown and pool._executor is None
+    assert pool.stats()['in_flight'] == 0
+    assert pool.run(sum, [1, 2]) == 3
+    pool._executor.shutdown()
+
+
+def test_db_profiles_and_concurrent_writes(client, app, tmp_path):
+    """Test that DB_PROFILE picks pool/pragma settings and that sqlite-wal takes concurrent writes without lock errors"""
+    import threading
+    from sqlalchemy import create_engine, insert, func, select
+    from application import dbprofile
+
+    # The app's own SQLite engine runs with the auto-selected sqlite-wal profile
+    assert app.config['DB_PROFILE_ACTIVE'] == 'sqlite-wal'
+    with app.app_context():
+        assert db.session.execute(db.text('PRAGMA journal_mode')).scalar() == 'wal'
+
+    name, settings = dbprofile.resolve('auto', 'postgresql://u:p@db/ames')
+    options = dbprofile.engine_options(settings)
+    assert name == 'postgres' and options['pool_size'] == 10 and options['pool_pre_ping']
+    assert options['connect_args']['options'] == '-c statement_timeout=30000'
+    assert 'query_cache_size' not in options  # prepared statements are asyncpg-only
+    assert dbprofile.engine_options(settings, is_async=True)['connect_args']['prepared_statement_cache_size'] == 500
+    assert dbprofile.resolve('postgres', 'postgresql://db/ames', {'pool_size': 3})[1]['pool_size'] == 3
+    with pytest.raises(ValueError):
+        dbprofile.resolve('sqlite-wal', 'postgresql://db/ames')
+
+    # Every pooled connection gets the pragmas, and concurrent read-then-insert
+    # transactions all commit without "database is locked" (the speed-up itself is
+    # measured by benchmarks/db_write.py)
+    _, settings = dbprofile.resolve('sqlite-wal', f'sqlite:///{tmp_path}/wal.db')
+    engine = create_engine(f'sqlite:///{tmp_path}/wal.db', **dbprofile.engine_options(settings))
+    dbprofile.install_pragmas(engine, settings)
+    db.metadata.create_all(engine)
+    row = {'overall_qual': 7, 'gr_liv_area': 1500, 'garage_cars': 2, 'total_bsmt_sf': 1000,
+           'year_built': 2000, 'prediction': 200000.0, 'user_id': 1}
+    pragmas, errors = [], []
+
+    def writer():
+        try:
+            with engine.begin() as conn:
+                pragmas.append((conn.exec_driver_sql('PRAGMA journal_mode').scalar(),
+                                conn.exec_driver_sql('PRAGMA synchronous').scalar(),
+                                conn.exec_driver_sql('PRAGMA busy_timeout').scalar()))
+            for _ in range(25):
+                with engine.begin() as conn:
+                    conn.execute(select(func.count()).select_from(History.__table__)).scalar()
+                    conn.execute(insert(History.__table__), row)
+        except Exception as e:  # "database is locked" would land here
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    with engine.connect() as conn:
+        written = conn.execute(select(func.count()).select_from(History.__table__)).scalar()
+    engine.dispose()
+    assert not errors and written == 100
+    assert pragmas == [('wal', 1, 5000)] * 4  # synchronous=NORMAL is 1
+
+
+def test_user_stats_maintained_incrementally(client, app):
+    """Test that per-user stats follow every insert/delete path and that rebuild-stats repairs drift"""
+    from sqlalchemy import event, func
+    from application.models import UserStats, QualityStats
+    from application.userstats import user_totals, user_buckets
+    from application.writebehind import history_writer
+
+    client.post('/register', data={'username': 'StatsUser', 'password': 'pw', 'confirm_password': 'pw'}, follow_redirects=True)
+    client.post('/login', data={'username': 'StatsUser', 'password': 'pw'}, follow_redirects=True)
+    small = {'overall_qual': 4, 'gr_liv_area': 900, 'garage_cars': 1, 'total_bsmt_sf': 500, 'year_built': 1960}
+    big = {'overall_qual': 9, 'gr_liv_area': 2800, 'garage_cars': 3, 'total_bsmt_sf': 1800, 'year_built': 2008}
+
+    def check():
+        with app.app_context():
+            user_id = User.query.filter_by(username='StatsUser').one().id
+            count, mean, low, high = db.session.query(
+                func.count(), func.avg(History.prediction), func.min(History.prediction), func.max(History.prediction)
+            ).filter(History.user_id == user_id).one()
+            last = History.query.filter_by(user_id=user_id).order_by(History.predicted_on.desc(), History.id.desc()).first()
+            stats = user_totals(db.session, user_id)
+            expected_buckets = db.session.query(
+                History.overall_qual, func.count(), func.avg(History.prediction),
+                func.min(History.prediction), func.max(History.prediction)
+            ).filter(History.user_id == user_id).group_by(History.overall_qual).order_by(History.overall_qual).all()
+            buckets = user_buckets(db.session, user_id)
+        assert stats['count'] == count
+        assert [(q, n, lo, hi) for q, n, _, lo, hi in buckets] == [(q, n, lo, hi) for q, n, _, lo, hi in expected_buckets]
+        assert [mean for *_, mean, _, _ in buckets] == pytest.approx([mean for *_, mean, _, _ in expected_buckets])
+        if count:
+            assert stats['mean'] == pytest.approx(mean) and (stats['min'], stats['max']) == (low, high)
+            assert stats['last_prediction'] == last.prediction
+        return stats
+
+    client.post('/predict', data=small, follow_redirects=True)    # sync, one row
+    client.post('/api/predict', json=[big, small])                # sync, one batch
+    old = (history_writer.mode, history_writer.batch_size, history_writer.flush_interval)
+    history_writer.mode, history_writer.batch_size, history_writer.flush_interval = 'batched', 1000, 60
+    try:
+        client.post('/api/predict', json=[small, small])
+        assert b'Your Predictions' in client.get('/account').data  # flushes the queue first
+    finally:
+        history_writer.mode, history_writer.batch_size, history_writer.flush_interval = old
+    stats = check()
+    assert stats['count'] == 5
+
+    # Removing the highest price looks up the new maximum
+    with app.app_context():
+        top = History.query.order_by(History.prediction.desc()).first().id
+    client.get(f'/delete_history/{top}', follow_redirects=True)
+    assert check()['count'] == 4
+    with app.app_context():
+        first = History.query.order_by(History.id).first().id
+    client.get(f'/delete_history/{first}', follow_redirects=True)
+    assert check()['count'] == 3
+
+    # The unfiltered /history summary (totals and per quality) comes from the stored stats
+    statements = []
+    count = lambda *args: statements.append(args[2])
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', count)
+        try:
+            page = client.get('/history').data.decode()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count)
+    assert '<div class="summary-value">3</div>' in page
+    assert not [sql for sql in statements if 'GROUP BY' in sql]
+
+    runner = app.test_cli_runner()
+    assert '0 were out of date' in runner.invoke(args=['rebuild-stats']).output
+    with app.app_context():
+        db.session.query(UserStats).update({'prediction_count': 99})
+        db.session.query(QualityStats).update({'prediction_max': 1.0})
+        db.session.commit()
+    assert '1 were out of date' in runner.invoke(args=['rebuild-stats']).output
+    check()
+
+    client.post('/account/delete', follow_redirects=True)
+    with app.app_context():
+        assert UserStats.query.count() == 0 and QualityStats.query.count() == 0
+
+
+def test_http_caching(client, app):
+    """Test ETag/304 on /history and the index page, and fingerprinted long-lived static URLs"""
+    import re
+    from sqlalchemy import event
+    from application.httpcache import http_cache
+
+    # Index: one cached rendering, 304 when the browser sends its ETag back
+    first = client.get('/')
+    etag = first.headers['ETag']
+    assert first.status_code == 200 and client.get('/').data == first.data
+    assert client.get('/', headers={'If-None-Match': etag}).status_code == 304
+    assert http_cache.stats()['page_hits'] >= 1
+
+    # Static files: ?v=<hash> URLs are cached for a year, the plain URL is not
+    css = re.search(r'href="(/static/css/styles\.css\?v=\w+)"', first.get_data(as_text=True)).group(1)
+    response = client.get(css)
+    assert response.cache_control.max_age == 31536000 and response.cache_control.immutable
+    response.close()
+    response = client.get('/static/css/styles.css')
+    assert response.cache_control.max_age is None
+    response.close()
+
+    # /history: unchanged -> 304 after a single primary-key lookup, no page queries or rendering
+    client.post('/register', data={'username': 'CacheUser', 'password': 'pw', 'confirm_password': 'pw'}, follow_redirects=True)
+    client.post('/login', data={'username': 'CacheUser', 'password': 'pw'}, follow_redirects=True)
+    house = {'overall_qual': 6, 'gr_liv_area': 1400, 'garage_cars': 2, 'total_bsmt_sf': 900, 'year_built': 1985}
+    client.post('/api/predict', json=[house, house])
+    page = client.get('/history')
+    etag = page.headers['ETag']
+    assert page.status_code == 200 and page.last_modified is not None
+    assert 'private' in page.headers['Cache-Control']
+
+    statements = []
+    count = lambda *args: statements.append(args[2])
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', count)
+        try:
+            response = client.get('/history', headers={'If-None-Match': etag})
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count)
+    assert response.status_code == 304 and response.data == b''
+    assert len(statements) == 1 and 'user_stats' in statements[0]
+
+    # A new prediction changes the ETag
+    client.post('/api/predict', json=house)
+    response = client.get('/history', headers={'If-None-Match': etag})
+    assert response.status_code == 200 and response.headers['ETag'] != etag
+
+    # Pending flash messages are always rendered (and never answered with a 304)
+    with app.app_context():
+        entry_id = History.query.first().id
+    client.get(f'/delete_history/{entry_id}')
+    etag = response.headers['ETag']
+    response = client.get('/history', headers={'If-None-Match': etag})
+    assert response.status_code == 200 and b'Record deleted successfully' in response.data
+    assert 'ETag' not in response.headers
+
+
+def test_metrics_endpoint(client, monkeypatch):
+    """Test that /metrics exposes stage histograms, DB query counts and cache gauges, and that a timer takes no lock"""
+    from application.metrics import metrics
+
+    client.post('/register', data={'username': 'MetricsUser', 'password': 'pw', 'confirm_password': 'pw'}, follow_redirects=True)
+    client.post('/login', data={'username': 'MetricsUser', 'password': 'pw'}, follow_redirects=True)
+    client.post('/predict', data={'overall_qual': 7, 'gr_liv_area': 1500, 'garage_cars': 2,
+                                  'total_bsmt_sf': 1000, 'year_built': 2000}, follow_redirects=True)
+    client.get('/history')
+
+    # Monitoring routes answer only with the configured bearer token
+    assert client.get('/metrics').status_code == 404
+    assert client.get('/api/stats').status_code == 404
+    client.application.config['METRICS_TOKEN'] = 'scrape-secret'
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 404
+    auth = {'Authorization': 'Bearer scrape-secret'}
+    assert 'last_error' in client.get('/api/stats', headers=auth).get_json()['model']
+
+    response = client.get('/metrics', headers=auth)
+    assert response.status_code == 200 and response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    for stage in ('form_validation', 'model_predict', 'history_write', 'history_query', 'render'):
+        assert f'app_stage_seconds_count{{stage="{stage}"}}' in text
+    assert 'app_request_seconds_bucket{endpoint="main.predict",le="+Inf"}' in text
+    assert 'app_prediction_cache_hits ' in text and 'app_identity_cache_hits ' in text
+    queries = [line for line in text.splitlines() if line.startswith('app_db_queries_total ')]
+    assert queries and int(queries[0].split()[1]) > 0
+
+    # Cumulative buckets end at the total count
+    histograms, _ = metrics.collect()
+    values = histograms[('app_stage_seconds', 'model_predict')]
+    assert sum(values[:-1]) >= 1
+
+    # A view that raises is still counted, as a 5xx with its latency
+    def boom(*args, **kwargs):
+        raise RuntimeError('boom')
+    monkeypatch.setattr('application.routes.render_template', boom)
+    with pytest.raises(RuntimeError):
+        client.get('/account')
+    monkeypatch.undo()
+    text = client.get('/metrics', headers=auth).get_data(as_text=True)
+    assert 'app_responses_total{status="5xx"} 1' in text
+    assert 'app_request_seconds_count{endpoint="main.account"} 1' in text
+
+    # Cheap enough to leave on: once a thread has its shard, recording takes no lock
+    # (holding the only lock would deadlock it) and only writes to that shard
+    shard = metrics._shard()
+    with metrics._shards_lock:
+        for _ in range(1000):
+            with metrics.stage('overhead_check'):
+                pass
+    assert sum(shard.histograms[('app_stage_seconds', 'overhead_check')][:-1]) == 1000
+
+    # Thread-per-request servers: shards of finished threads are folded in, not kept
+    import threading
+    from application.metrics import Metrics
+    counting = Metrics()
+    for _ in range(3):
+        threads = [threading.Thread(target=counting.inc, args=('app_test_total',)) for _ in range(20)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    assert len(counting._shards) == 0
+    assert counting.collect()[1]['app_test_total'] == 60
+
+
+def _asgi_request(asgi, method, path, body=b'', content_type=None, cookies=None):
+    """Helper: one request through an ASGI app; returns (status, headers, body) and updates `cookies`"""
+    import asyncio
+    path, _, query = path.partition('?')
+    headers = [(b'host', b'localhost')]
+    if content_type:
+        headers.append((b'content-type', content_type.encode()))
+    if cookies:
+        headers.append((b'cookie', '; '.join(f'{k}={v}' for k, v in cookies.items()).encode()))
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query.encode(),
+             'headers': headers, 'http_version': '1.1', 'scheme': 'http', 'server': ('localhost', 80)}
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(asgi(scope, receive, send))
+    start = sent[0]
+    response_headers = [(k.decode(), v.decode()) for k, v in start['headers']]
+    for name, value in response_headers:
+        if name == 'set-cookie' and cookies is not None:
+            key, _, val = value.split(';', 1)[0].partition('=')
+            cookies[key] = val
+    return start['status'], response_headers, b''.join(m.get('body', b'') for m in sent[1:])
+
+
+def test_asgi_mode(client, app):
+    """Test the ASGI mode: /predict, /api/predict and /history natively on the async engine, the rest via WSGI"""
+    import asyncio
+    from urllib.parse import urlencode
+    pytest.importorskip('aiosqlite')
+    from application.asgi import AsgiApp
+
+    asgi = AsgiApp(app, threads=2)
+    cookies = {}
+    form = 'application/x-www-form-urlencoded'
+    # Register/login are not native: they go through the Flask WSGI app
+    _asgi_request(asgi, 'POST', '/register', urlencode({'username': 'AsyncUser', 'password': 'pw',
+                                                        'confirm_password': 'pw'}).encode(), form, cookies)
+    status, _, _ = _asgi_request(asgi, 'POST', '/login', urlencode({'username': 'AsyncUser', 'password': 'pw'}).encode(),
+                                 form, cookies)
+    assert status == 302
+    if asgi.engine is None:
+        pytest.skip("test database has no async driver")
+    assert asgi.stats()['fallback'] == 2
+    assert asgi.wsgi_executor._threads and not asgi.executor._threads  # the fallback has its own pool
+
+    status, _, body = _asgi_request(asgi, 'POST', '/predict', urlencode({
+        'overall_qual': 7, 'gr_liv_area': 1500, 'garage_cars': 2, 'total_bsmt_sf': 1000, 'year_built': 2000
+    }).encode(), form, cookies)
+    assert status == 200 and b"Success! Estimated Value" in body
+
+    status, _, body = _asgi_request(asgi, 'POST', '/api/predict', json.dumps([
+        {'overall_qual': 5, 'gr_liv_area': 1100, 'garage_cars': 1, 'total_bsmt_sf': 800, 'year_built': 1960},
+        {'overall_qual': 'bad'}
+    ]).encode(), 'application/json', cookies)
+    data = json.loads(body)
+    assert status == 200 and data['valid'] == 1 and data['saved'] == 1 and 'interval' in data['results'][0]
+
+    status, _, body = _asgi_request(asgi, 'GET', '/history', cookies=cookies)
+    assert status == 200 and b'1500 sqft' in body and b'1100 sqft' in body
+    assert asgi.stats()['native'] == 3
+    with app.app_context():
+        assert History.query.count() == 2
+        # The async insert updates the stored stats in the same transaction
+        from application.models import UserStats, QualityStats
+        user_id = History.query.first().user_id
+        assert db.session.get(UserStats, user_id).prediction_count == 2
+        assert db.session.get(QualityStats, (user_id, 7)).prediction_count == 1
+
+    house = urlencode({'overall_qual': 6, 'gr_liv_area': 1200, 'garage_cars': 1, 'total_bsmt_sf': 700,
+                       'year_built': 1990}).encode()
+
+    # A failed insert flashes the error only, not "Success!" as well
+    async def broken_insert(rows):
+        raise RuntimeError("disk full")
+    asgi.insert_history, insert_history = broken_insert, asgi.insert_history
+    status, _, body = _asgi_request(asgi, 'POST', '/predict', house, form, cookies)
+    asgi.insert_history = insert_history
+    assert b"Database Error: disk full" in body and b"Success! Estimated" not in body
+
+    # HISTORY_WRITE_MODE=batched: rows are queued, and /history writes this user's queue first
+    writer = app.extensions['history_writer']
+    writer.mode, writer.flush_interval = 'batched', 60
+    try:
+        status, _, body = _asgi_request(asgi, 'POST', '/predict', house, form, cookies)
+        assert b"Success! Estimated Value" in body and writer.stats()['queue_depth'] == 1
+        with app.app_context():
+            assert History.query.count() == 2
+        status, _, body = _asgi_request(asgi, 'GET', '/history', cookies=cookies)
+        assert b'1200 sqft' in body and writer.stats()['queue_depth'] == 0
+    finally:
+        writer.mode = 'sync'
+
+    # Logged out: /history falls back to Flask-Login's redirect
+    status, headers, _ = _asgi_request(asgi, 'GET', '/history')
+    assert status == 302 and '/login' in dict(headers)['location']
+    asyncio.run(asgi.shutdown())
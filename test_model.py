@@ -3,6 +3,7 @@ import pandas as pd
 import joblib
 import os
 
+
 # --- TEST 1: Existence Check ---
 def test_model_file_exists():
     """
@@ -11,6 +12,7 @@ def test_model_file_exists():
     """
     assert os.path.exists('housing_model.pkl')
 
+
 # --- TEST 2: Loading Check ---
 def test_model_loading():
     """
@@ -24,6 +26,7 @@ def test_model_loading():
     # Ensure it's the right type (sklearn object)
     assert hasattr(model, 'predict')
 
+
 # --- TEST 3: Prediction Consistency ---
 def test_prediction_shape_and_type():
     """
@@ -42,4 +45,448 @@ def test_prediction_shape_and_type():
     # Check result
     assert len(prediction) == 1
     assert isinstance(prediction[0], float)
-    assert prediction[0] > 0  # Price should be positive
\ No newline at end of file
+    assert prediction[0] > 0  # Price should be positive
+
+
+# --- TEST 4: Fast Predictor matches sklearn ---
+def test_predictor_matches_sklearn():
+    """
+    The NumPy/pure-Python predictor used by the routes must give the
+    same prices as model.predict on a DataFrame.
+    """
+    import numpy as np
+    from application.predictor import load_predictor, FEATURES
+
+    model = joblib.load('housing_model.pkl')
+    predictor = load_predictor('housing_model.pkl')
+
+    rng = np.random.default_rng(0)
+    X = np.column_stack([
+        rng.integers(1, 11, 200),
+        rng.integers(1, 5000, 200),
+        rng.integers(0, 4, 200),
+        rng.integers(0, 3000, 200),
+        rng.integers(1900, 2027, 200),
+    ])
+    expected = model.predict(pd.DataFrame(X, columns=FEATURES))
+
+    np.testing.assert_allclose(predictor.predict_many(X), expected, rtol=1e-12)
+    for row, exp in zip(X.tolist(), expected):
+        assert predictor.predict_one(row) == pytest.approx(exp, rel=1e-12)
+
+    # The interface itself cannot be instantiated, only predictors that implement it
+    from application.predictor import Predictor
+    with pytest.raises(TypeError):
+        Predictor()
+
+
+# --- TEST 5: Feature order is enforced ---
+def test_predictor_rejects_wrong_feature_order():
+    """A model trained with columns in a different order must not be served."""
+    from sklearn.linear_model import LinearRegression
+    from application.predictor import make_predictor, FEATURES
+
+    shuffled = list(reversed(FEATURES))
+    X = pd.DataFrame([[1, 2, 3, 4, 5], [2, 3, 4, 5, 7], [0, 1, 1, 2, 3]], columns=shuffled)
+    model = LinearRegression().fit(X, [1.0, 2.0, 3.0])
+
+    with pytest.raises(ValueError):
+        make_predictor(model)
+
+
+# --- TEST 6: Prediction cache ---
+class _CountingPredictor:
+    """Tiny fake model that counts how many rows it really scored."""
+    features = ('a', 'b', 'c', 'd', 'e')
+
+    def __init__(self, version='v1'):
+        self.version = version
+        self.calls = 0
+
+    def predict_one(self, row):
+        self.calls += 1
+        return float(sum(row))
+
+    def predict_many(self, X):
+        import numpy as np
+        self.calls += len(X)
+        return np.asarray(X, dtype=float).sum(axis=1)
+
+
+def test_prediction_cache_hits_misses_evictions():
+    """Repeated feature tuples are served from the LRU; the oldest entry is evicted first."""
+    from application.cache import PredictionCache, CachedPredictor
+
+    inner = _CountingPredictor()
+    cached = CachedPredictor(inner, PredictionCache(maxsize=2, ttl=60))
+
+    assert cached.predict_one([5, 1500, 2, 800, 1995]) == 4302.0
+    assert cached.predict_one([5.0, 1500, 2, 800, 1995]) == 4302.0  # same normalized key
+    cached.predict_one([6, 1500, 2, 800, 1995])
+    cached.predict_one([7, 1500, 2, 800, 1995])  # evicts the first tuple
+
+    stats = cached.cache.stats()
+    assert inner.calls == 3
+    assert (stats['hits'], stats['misses'], stats['evictions']) == (1, 3, 1)
+
+    # Batch path: only the rows that are not cached go to the model
+    out = cached.predict_many([[7, 1500, 2, 800, 1995], [8, 1500, 2, 800, 1995]])
+    assert out.tolist() == [4304.0, 4305.0]
+    assert inner.calls == 4
+
+    # Fractional inputs are not truncated into another house's key
+    assert cached.predict_one([7.5, 1500, 2, 800, 1995]) == 4304.5
+
+    # Large batches skip the cache and go straight to the model
+    from application.cache import MAX_CACHED_BATCH
+    lookups = cached.cache.stats()['misses'] + cached.cache.stats()['hits']
+    out = cached.predict_many([[7, 1500, 2, 800, 1995]] * (MAX_CACHED_BATCH + 1))
+    assert out.tolist() == [4304.0] * (MAX_CACHED_BATCH + 1)
+    assert cached.cache.stats()['misses'] + cached.cache.stats()['hits'] == lookups
+
+
+def test_prediction_cache_invalidated_on_model_reload():
+    """Swapping in a new model version must clear the cached prices."""
+    from application.cache import PredictionCache, CachedPredictor
+
+    cached = CachedPredictor(_CountingPredictor('v1'), PredictionCache(maxsize=100, ttl=60))
+    cached.predict_one([5, 1500, 2, 800, 1995])
+
+    new_model = _CountingPredictor('v2')
+    cached.swap(new_model)
+    assert cached.cache.stats()['size'] == 0
+    cached.predict_one([5, 1500, 2, 800, 1995])
+    assert new_model.calls == 1
+
+
+def test_shared_cache_between_workers(tmp_path):
+    """Two caches (= two gunicorn workers) share hits through the SQLite backend."""
+    from application.cache import PredictionCache, SharedCacheBackend, CachedPredictor
+
+    path = str(tmp_path / 'cache.db')
+    worker_a = CachedPredictor(_CountingPredictor(), PredictionCache(ttl=60, shared=SharedCacheBackend(path)))
+    worker_b = CachedPredictor(_CountingPredictor(), PredictionCache(ttl=60, shared=SharedCacheBackend(path)))
+
+    worker_a.predict_one([5, 1500, 2, 800, 1995])
+    assert worker_b.predict_one([5, 1500, 2, 800, 1995]) == 4302.0
+    assert worker_b.inner.calls == 0
+    assert worker_b.cache.stats()['shared_hits'] == 1
+
+
+def test_model_reload_keeps_other_workers_shared_cache(tmp_path):
+    """A worker starting up or reloading its model does not wipe the shared cache of the others."""
+    from application.cache import PredictionCache, SharedCacheBackend, CachedPredictor
+    from application.registry import ModelRegistry, ModelManager
+
+    path = str(tmp_path / 'cache.db')
+    registry = ModelRegistry(str(tmp_path / 'models'))
+    v1 = registry.publish(_fit_linear(100))
+    worker_a = CachedPredictor(_CountingPredictor(v1), PredictionCache(ttl=60, shared=SharedCacheBackend(path)))
+    worker_a.predict_one([5, 1500, 2, 800, 1995])
+
+    worker_b = ModelManager(registry, cache=PredictionCache(ttl=60, shared=SharedCacheBackend(path)), check_interval=0)
+    assert worker_b.get().predict_one([5, 1500, 2, 800, 1995]) == 4302.0  # served from worker A's entry
+    registry.publish(_fit_linear(200))
+    worker_b.get()
+    assert worker_a.cache.shared.get(worker_a.cache.make_key(v1, [5, 1500, 2, 800, 1995])) == 4302.0
+
+
+# --- TEST 7: Model registry + hot reload ---
+def _fit_linear(scale):
+    from sklearn.linear_model import LinearRegression
+    from application.predictor import FEATURES
+    X = pd.DataFrame([[5, 1000, 1, 500, 1990], [6, 1500, 2, 800, 2000], [7, 2000, 2, 900, 1995],
+                      [8, 2500, 3, 1200, 2010], [4, 800, 0, 0, 1950], [9, 3000, 3, 1500, 2020]], columns=FEATURES)
+    y = X['GrLivArea'] * scale + 1000
+    return LinearRegression().fit(X, y)
+
+
+def test_registry_publish_and_hot_reload(tmp_path):
+    """A newly activated version is swapped in; requests holding the old one are unaffected."""
+    from application.registry import ModelRegistry, ModelManager
+
+    registry = ModelRegistry(str(tmp_path / 'models'))
+    v1 = registry.publish(_fit_linear(100), metrics={'r2': 0.9})
+    manager = ModelManager(registry, check_interval=0)
+
+    in_flight = manager.get()
+    assert in_flight.version == v1
+    assert registry.metadata(v1)['metrics'] == {'r2': 0.9}
+    assert len(registry.metadata(v1)['checksum']) == 64
+
+    v2 = registry.publish(_fit_linear(200))
+    new = manager.get()
+    assert new.version == v2 and v1 != v2
+    assert manager.stats()['reloads'] == 2
+
+    row = [5, 1000, 1, 500, 1990]
+    assert in_flight.predict_one(row) == pytest.approx(101000)  # old request still uses v1
+    assert new.predict_one(row) == pytest.approx(201000)
+
+    # Roll back
+    registry.activate(v1)
+    assert manager.get().version == v1
+
+
+def test_model_manager_first_load_blocks_concurrent_requests(tmp_path):
+    """Requests arriving while the first model is still loading wait for it instead of getting None."""
+    import threading, time
+    from application.registry import ModelRegistry, ModelManager
+
+    class SlowRegistry(ModelRegistry):
+        def load(self, version):
+            time.sleep(0.2)
+            return super().load(version)
+
+    registry = SlowRegistry(str(tmp_path / 'models'))
+    v1 = registry.publish(_fit_linear(100))
+    manager = ModelManager(registry, check_interval=60)
+
+    results = [None] * 4
+    def request(i):
+        results[i] = manager.get()
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert [p.version if p is not None else None for p in results] == [v1] * 4
+    assert manager.stats()['reloads'] == 1
+
+
+def test_registry_rejects_corrupted_artifact(tmp_path):
+    """A version whose checksum does not match is never served; the old model keeps running."""
+    from application.registry import ModelRegistry, ModelManager
+
+    registry = ModelRegistry(str(tmp_path / 'models'))
+    v1 = registry.publish(_fit_linear(100))
+    manager = ModelManager(registry, check_interval=0)
+    manager.get()
+
+    v2 = registry.publish(_fit_linear(200), activate=False)
+    with open(tmp_path / 'models' / v2 / 'model.pkl', 'ab') as f:
+        f.write(b'garbage')
+    registry.activate(v2)
+
+    assert manager.get().version == v1
+    assert manager.stats()['reload_errors'] == 1
+
+
+def test_registry_rejects_corrupted_coefficients(tmp_path):
+    """The memory-mapped coef.npy of a linear model is checked as well."""
+    import pytest
+    from application.registry import ModelRegistry
+
+    registry = ModelRegistry(str(tmp_path / 'models'))
+    version = registry.publish(_fit_linear(100))
+    with open(tmp_path / 'models' / version / 'coef.npy', 'ab') as f:
+        f.write(b'garbage')
+
+    with pytest.raises(ValueError, match='coef.npy'):
+        registry.load(version)
+
+
+def test_registry_rejects_other_feature_orders(tmp_path):
+    """Only models on FEATURES, in that order, are published or served."""
+    import json
+    from sklearn.linear_model import LinearRegression
+    from application.registry import ModelRegistry, ModelManager
+    from application.predictor import FEATURES
+
+    registry = ModelRegistry(str(tmp_path / 'models'))
+    reordered = list(reversed(FEATURES))
+    with pytest.raises(ValueError):
+        registry.publish(LinearRegression().fit(pd.DataFrame([[1, 2, 3, 4, 5], [2, 3, 4, 5, 7]], columns=reordered),
+                                                [1.0, 2.0]), features=reordered)
+    with pytest.raises(ValueError):
+        registry.publish(LinearRegression().fit([[1, 2, 3, 4, 5, 6], [2, 3, 4, 5, 6, 8]], [1.0, 2.0]))
+
+    # A version whose metadata says another order is never swapped in
+    v1 = registry.publish(_fit_linear(100))
+    manager = ModelManager(registry, check_interval=0)
+    manager.get()
+    v2 = registry.publish(_fit_linear(200), activate=False)
+    meta_path = tmp_path / 'models' / v2 / 'meta.json'
+    meta = json.loads(meta_path.read_text())
+    meta_path.write_text(json.dumps(dict(meta, features=reordered)))
+    registry.activate(v2)
+
+    assert manager.get().version == v1
+    assert 'features' in manager.stats()['last_error']
+
+
+# --- TEST 8: Memory-mapped artifacts ---
+def test_registry_loads_linear_model_memory_mapped(tmp_path):
+    """Linear models are served from a mapped coef.npy, with the same prices as the pickle."""
+    import numpy as np
+    from application.registry import ModelRegistry
+    from application.predictor import make_predictor
+
+    model = _fit_linear(100)
+    registry = ModelRegistry(str(tmp_path / 'models'), mmap=True)
+    version = registry.publish(model)
+
+    predictor = registry.load(version)
+    # A read-only view on the mapped file, not a private copy
+    assert not predictor.coef.flags.owndata
+    assert not predictor.coef.flags.writeable
+
+    X = np.array([[5, 1000, 1, 500, 1990], [7, 2222, 3, 1000, 2005]])
+    np.testing.assert_allclose(predictor.predict_many(X), make_predictor(model).predict_many(X), rtol=1e-12)
+
+
+# --- TEST 9: Parallel model selection ---
+def test_model_selection_publishes_servable_winner(tmp_path):
+    """CV runs on a process pool, the leaderboard is sorted and the best 5-feature model is published."""
+    import numpy as np
+    from model_selection import run_model_selection, SERVABLE_FEATURES
+    from application.registry import ModelRegistry
+    from application.predictor import LinearPredictor
+
+    candidates = [
+        {'name': 'linear@form5', 'kind': 'linear', 'params': {}, 'feature_set': 'form5'},
+        {'name': 'ridge@form5', 'kind': 'ridge', 'params': {'alpha': 10.0}, 'feature_set': 'form5'},
+        {'name': 'ridge@size12', 'kind': 'ridge', 'params': {'alpha': 10.0}, 'feature_set': 'size12'},
+    ]
+    registry_dir = str(tmp_path / 'models')
+    board, version, timing = run_model_selection(candidates=candidates, folds=3, workers=2,
+                                                 registry_dir=registry_dir, verbose=False, measure_speedup=True)
+
+    assert [row['rmse'] for row in board] == sorted(row['rmse'] for row in board)
+    assert {row['name'] for row in board} == {c['name'] for c in candidates}
+    assert timing['workers'] == 2
+    # Speedup is measured against a real one-worker run, not derived from CPU time
+    assert timing['speedup'] == timing['serial_wall_seconds'] / timing['wall_seconds']
+
+    registry = ModelRegistry(registry_dir)
+    meta = registry.metadata(version)
+    assert meta['features'] == SERVABLE_FEATURES
+    assert meta['candidate'] in ('linear@form5', 'ridge@form5')
+    assert 'cv_rmse' in meta['metrics']
+
+    # Scaler + ridge is folded into plain weights, so it is served by the fast path
+    predictor = registry.load(version)
+    model, _ = registry.load_model(version)
+    X = np.array([[5, 1500, 2, 800, 1995], [8, 2500, 3, 1500, 2010]], dtype=float)
+    assert isinstance(predictor, LinearPredictor)
+    np.testing.assert_allclose(predictor.predict_many(X), model.predict(X), rtol=1e-9)
+
+
+# --- TEST 10: Columnar dataset cache ---
+def test_dataset_cache_matches_read_csv_and_rebuilds_on_change(tmp_path):
+    """Cached columns equal pd.read_csv, only requested columns load, and editing the CSV rebuilds."""
+    import numpy as np
+    from data_loader import load_frame, load_columns, read_manifest
+
+    source = tmp_path / 'data.csv'
+    cache_dir = str(tmp_path / 'cache')
+    pd.read_csv('AmesHousing_Cleaned.csv').head(200).to_csv(source, index=False)
+    expected = pd.read_csv(source)
+
+    df = load_frame(str(source), cache_dir=cache_dir)
+    for column in expected.columns:
+        if expected[column].dtype == object:
+            assert df[column].astype(object).fillna('').tolist() == expected[column].fillna('').tolist()
+        else:
+            np.testing.assert_array_equal(df[column].to_numpy(dtype=float), expected[column].to_numpy(dtype=float))
+
+    # Explicit dtypes, and columns are read-only memory maps
+    arrays = load_columns(str(source), ['OverallQual', 'SalePrice'], cache_dir=cache_dir)
+    assert list(arrays) == ['OverallQual', 'SalePrice']
+    assert arrays['OverallQual'].dtype == np.int16
+    assert isinstance(arrays['SalePrice'], np.memmap)
+
+    # Same content, new mtime -> no rebuild
+    checksum = read_manifest(str(source), cache_dir=cache_dir)['checksum']
+    os.utime(source)
+    assert read_manifest(str(source), cache_dir=cache_dir)['checksum'] == checksum
+
+    # Changed content -> rebuilt, old build removed
+    expected.loc[0, 'SalePrice'] = 1
+    expected.to_csv(source, index=False)
+    assert load_columns(str(source), ['SalePrice'], cache_dir=cache_dir)['SalePrice'][0] == 1
+    assert len([name for name in os.listdir(cache_dir) if os.path.isdir(os.path.join(cache_dir, name))]) == 1
+
+
+# --- TEST 11: Comparable sales index ---
+def test_comparables_index_matches_brute_force_and_persists(tmp_path):
+    """KD-tree neighbours equal a full scan, and the saved index is rebuilt only when the CSV changes."""
+    import numpy as np
+    from application.comparables import ComparablesIndex, load_comparables
+    from application.predictor import FEATURES
+
+    rng = np.random.default_rng(0)
+    X = np.column_stack([rng.integers(1, 11, 5000), rng.integers(500, 4000, 5000), rng.integers(0, 4, 5000),
+                         rng.integers(0, 2000, 5000), rng.integers(1900, 2010, 5000)]).astype(float)
+    index = ComparablesIndex(X, {'sale_price': np.arange(5000)})
+
+    queries = X[:50] + rng.normal(0, 5, (50, 5))
+    _, rows = index.query(queries, k=4)
+    Z, Q = (X - index.mean) / index.scale, (queries - index.mean) / index.scale
+    brute = np.argsort(((Q[:, None, :] - Z[None, :, :]) ** 2).sum(axis=2), axis=1)[:, :4]
+    np.testing.assert_array_equal(rows, brute)
+
+    # Built from the CSV, saved, then loaded as-is until the CSV changes
+    csv, path = tmp_path / 'houses.csv', str(tmp_path / 'comparables.pkl')
+    pd.read_csv('AmesHousing_Cleaned.csv').head(300).to_csv(csv, index=False)
+    first = load_comparables(path, str(csv))
+    assert os.path.exists(path) and len(first) == 300
+    assert load_comparables(path, str(csv)).checksum == first.checksum
+    assert first.lookup([7, 1500, 2, 1000, 2000], 2)[0].keys() >= {'sale_price', 'neighborhood', 'distance'}
+
+    pd.read_csv('AmesHousing_Cleaned.csv').head(200).to_csv(csv, index=False)
+    assert len(load_comparables(path, str(csv))) == 200
+
+
+# --- TEST 12: Prediction intervals ---
+def test_prediction_intervals_stored_with_model(tmp_path):
+    """Residual quantiles travel with the model; batch bounds equal single bounds and cover the held-out houses."""
+    import numpy as np
+    from sklearn.linear_model import LinearRegression
+    from sklearn.model_selection import train_test_split
+    from application.predictor import FEATURES, residual_intervals, load_predictor
+    from application.registry import ModelRegistry
+
+    df = pd.read_csv('AmesHousing_Cleaned.csv').dropna(subset=FEATURES)
+    X_fit, X_rest, y_fit, y_rest = train_test_split(df[FEATURES].to_numpy(float), df['SalePrice'].to_numpy(float),
+                                                    test_size=0.5, random_state=0)
+    # Quantiles from one half of the held-out rows, coverage checked on the other half
+    X_cal, X_test, y_cal, y_test = train_test_split(X_rest, y_rest, test_size=0.5, random_state=0)
+    model = LinearRegression().fit(X_fit, y_fit)
+    intervals = residual_intervals(y_cal - model.predict(X_cal))
+    assert set(intervals) == {'80', '95'}
+
+    registry = ModelRegistry(str(tmp_path / 'models'))
+    predictor = registry.load(registry.publish(model, features=FEATURES, extra={'intervals': intervals}))
+    assert predictor.intervals == intervals
+
+    prices = predictor.predict_many(X_test)
+    bands = predictor.interval_many(prices)
+    assert bands['95'].shape == (len(prices), 2)
+    assert tuple(bands['80'][3]) == predictor.interval_one(prices[3])['80']
+    assert np.all(bands['95'][:, 0] <= bands['80'][:, 0]) and np.all(bands['80'][:, 1] <= bands['95'][:, 1])
+    # ~730 unseen houses: sampling error alone is about 2 points, so allow 3 times that
+    for level in ('80', '95'):
+        covered = (bands[level][:, 0] <= y_test) & (y_test <= bands[level][:, 1])
+        assert abs(covered.mean() - int(level) / 100) < 0.06
+
+    # housing_model.pkl gets its intervals from housing_model.json
+    assert set(load_predictor('housing_model.pkl').intervals) == {'80', '95'}
+
+
+# --- TEST 13: Cleaning pipeline ---
+def test_cleaning_pipeline_reproduces_committed_csvs(tmp_path):
+    """Chunked cleaning gives the committed CSVs byte for byte; a rerun only copies cached stages."""
+    import filecmp
+    from dataset.cleaned_data import run
+
+    paths = dict(cleaned=str(tmp_path / 'cleaned.csv'), subset=str(tmp_path / 'subset.csv'),
+                 cache_dir=str(tmp_path / 'cache'))
+    first = run(chunksize=257, **paths)
+    assert first['cached'] == [] and first['features'][0] == 'SalePrice'
+    assert filecmp.cmp(paths['cleaned'], 'AmesHousing_Cleaned.csv', shallow=False)
+    assert filecmp.cmp(paths['subset'], 'dataset/AmesHousing_WebApp_Subset.csv', shallow=False)
+
+    assert run(chunksize=257, **paths)['computed'] == []
+    assert run(chunksize=257, check=True, **paths) == []